@@ -0,0 +1,50 @@
+"""Micro benchmarks for hot paths of the server.
+
+Run a benchmark as a module from the project root e.g::
+
+    python -m benchmarks.bench_local_times
+
+The benchmarks import `fhir_server` so the same environment variables as the
+test suite (`DATABASE_URL`, `APP_SETTINGS`, ...) need to be set.
+"""
+
+import os
+import timeit
+from contextlib import contextmanager
+
+
+def measure(func, number=1000, repeat=5):
+    """Best time per call in microseconds."""
+    timer = timeit.Timer(func)
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def report(title, results):
+    """Print benchmark results as `name: time per call` rows."""
+    print(title)
+    print("-" * len(title))
+    width = max(len(name) for name in results)
+    for name, usec in results.items():
+        print("{0:<{1}}  {2:>12.2f} us/call".format(name, width, usec))
+    print()
+
+
+@contextmanager
+def database():
+    """Push an app context bound to the database in `APP_SETTINGS`.
+
+    Benchmarks that write rows should remove them before the context exits.
+    """
+    from fhir_server.app import create_app, db
+    from fhir_server.elements.base.pg_types import register_pg_types
+
+    app = create_app()
+    app.config.from_object(os.environ["APP_SETTINGS"])
+
+    with app.app_context():
+        register_pg_types(db.session)
+        db.create_all()
+        try:
+            yield db
+        finally:
+            db.session.rollback()
@@ -0,0 +1,139 @@
+"""Cost of binding a value of each `fhir_*` composite type.
+
+Compares the previous `PgComposite.bind_processor`, which looked up the
+fields and the types of the nested composites for every value, with the
+plans compiled once per type. The validators are skipped as they are the
+same for both, and a copy of the value is bound each time as the previous
+implementation modifies the dicts it is given.
+"""
+import copy
+from unittest.mock import patch
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy_utils import CompositeArray
+from sqlalchemy_utils.types.pg_composite import registered_composites
+
+import fhir_server.resources  # noqa: F401 registers all the composite types
+from fhir_server.elements.base.complex_mixin import PgComposite
+from benchmarks import measure, report
+
+DIALECT = postgresql.dialect()
+ITEMS = 3
+
+
+def nested_composite_array(column, values):
+    if not isinstance(column.type.item_type, PgComposite):
+        return values
+
+    if values is None:
+        return None
+
+    fields = {col.name: col for col in column.type.item_type.columns}
+    new_value = []
+    for field, data in fields.items():
+        for i, val in enumerate(values):
+            if isinstance(values[i], tuple):
+                values[i] = dict(values[i]._asdict())
+
+            if values[i]:
+                if not (field in values[i].keys()):
+                    values[i][field] = None
+
+            if isinstance(data.type, PgComposite):
+                values[i][field] = nested_composite(data, values[i][field])
+
+    for i, val in enumerate(values):
+        if val:
+            for k, v in enumerate(val):
+                if isinstance(val[v], list):
+                    val[v] = nested_composite_array(fields[v], val[v])
+
+        if values[i]:
+            new_value.append(column.type.item_type.type_cls(**values[i]))
+
+    return new_value or None
+
+
+def nested_composite(column, values):
+    if values is None:
+        return None
+
+    fields = {col.name: col for col in column.type.columns}
+    for field, data in fields.items():
+        if not (field in values.keys()):
+            values[field] = None
+
+        if isinstance(data.type, CompositeArray):
+            values[field] = nested_composite_array(data, values[field])
+
+        elif isinstance(data.type, PgComposite):
+            values[field] = nested_composite(data, values[field])
+    return (column.type).type_cls(**values)
+
+
+def recursive_bind(composite, value):
+    """The previous `PgComposite.bind_processor`."""
+    processed_value = []
+    for column in composite.columns:
+        field = value.get(column.name)
+        if isinstance(column.type, TypeDecorator):
+            processed_value.append(column.type.process_bind_param(field, DIALECT))
+        elif isinstance(column.type, PgComposite):
+            processed_value.append(nested_composite(column, field))
+        elif isinstance(column.type, CompositeArray):
+            processed_value.append(nested_composite_array(column, field))
+        else:
+            processed_value.append(field)
+    return composite.type_cls(*processed_value)
+
+
+def sample(composite, depth=0):
+    """A value of the type with its nested composites populated."""
+    value = {"id": "id-{0}".format(depth)}
+    if depth > 3:
+        return value
+
+    for column in composite.columns:
+        if isinstance(column.type, PgComposite):
+            value[column.name] = sample(column.type, depth + 1)
+        elif isinstance(column.type, CompositeArray) and isinstance(
+            column.type.item_type, PgComposite
+        ):
+            value[column.name] = [
+                sample(column.type.item_type, depth + 1) for i in range(ITEMS)
+            ]
+    return value
+
+
+def main():
+    results = {}
+    total_recursive = total_compiled = 0
+    with patch.object(PgComposite, "validate_col_data", lambda self, values: values):
+        for name in sorted(registered_composites):
+            composite = registered_composites[name]
+            if not isinstance(composite, PgComposite):
+                continue
+
+            value = sample(composite)
+            bind = composite.bind_processor(DIALECT)
+            assert bind(copy.deepcopy(value)) == recursive_bind(
+                composite, copy.deepcopy(value)
+            )
+
+            recursive = measure(
+                lambda: recursive_bind(composite, copy.deepcopy(value)), number=200
+            )
+            compiled = measure(lambda: bind(copy.deepcopy(value)), number=200)
+            results["recursive, " + name] = recursive
+            results["compiled, " + name] = compiled
+            total_recursive += recursive
+            total_compiled += compiled
+
+    results["recursive, all types"] = total_recursive
+    results["compiled, all types"] = total_compiled
+    report("bind of a composite value", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Cost of binding the extensions of a resource.
+
+Compares the previous validation of an extension value, `jsonschema.validate`
+with the schema built for every value, with the validator compiled at import
+and with the bulk validation of `ExtensionArray`.
+"""
+from jsonschema import validate
+from sqlalchemy.dialects import postgresql
+
+from fhir_server.elements.extension import ElementExtension, ExtensionArray
+from fhir_server.elements.opentype import (
+    EXTENSION_SCHEMA,
+    OpenType,
+    validate_extension_values,
+)
+from benchmarks import measure, report
+
+DIALECT = postgresql.dialect()
+EXTENSIONS = 40
+
+VALUES = [
+    {"valueString": "string val"},
+    {"valueInteger": 7},
+    {"valueCodeableConcept": {"text": "text"}},
+    {"url": "http://example.org/fhir/nested", "extension": []},
+]
+
+
+def extensions():
+    return [
+        {
+            "url": "http://example.org/fhir/extension-{0}".format(i),
+            "value": VALUES[i % len(VALUES)],
+        }
+        for i in range(EXTENSIONS)
+    ]
+
+
+def validate_each(values):
+    """The previous validation of each value on its own."""
+    for value in values:
+        validate(value, dict(EXTENSION_SCHEMA))
+
+
+def main():
+    values = [extension["value"] for extension in extensions()]
+    bind_item = ElementExtension().bind_processor(DIALECT)
+    bind_array = ExtensionArray(ElementExtension()).bind_processor(DIALECT)
+    opentype = OpenType()
+
+    results = {
+        "jsonschema.validate per value": measure(lambda: validate_each(values)),
+        "compiled validator per value": measure(
+            lambda: [opentype.process_bind_param(value, DIALECT) for value in values]
+        ),
+        "compiled validator in bulk": measure(
+            lambda: validate_extension_values(values)
+        ),
+        "bind per extension": measure(
+            lambda: [bind_item(extension) for extension in extensions()]
+        ),
+        "bind ExtensionArray": measure(lambda: bind_array(extensions())),
+    }
+    report("{0} extensions of a resource".format(EXTENSIONS), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Read latency of `CRUDMixin.get_by_id`.
+
+Compares the previous three query read (live row, history row and deleted
+base row) with the single query that resolves the status in SQL, for a live,
+a deleted and a missing resource.
+"""
+from sqlalchemy.sql.expression import text
+
+from fhir_server.resources import Organization
+from fhir_server.utils.crud import unpack_resource_helper
+from benchmarks import database, measure, report
+
+LIVE_ID = "bench-get-by-id-live"
+DELETED_ID = "bench-get-by-id-deleted"
+MISSING_ID = "bench-get-by-id-missing"
+
+
+def three_queries(db, cls, id, include_deleted=False):
+    result = cls.query.filter_by(id=id, is_deleted=include_deleted).first()
+
+    qq_history = text(
+        "SELECT * FROM \"{0}_history\" WHERE (id::text='{1}'::text)".format(
+            cls.__tablename__, id
+        )
+    )
+    history_model = db.session.execute(qq_history).first()
+    base_deleted = cls.query.filter_by(id=id, is_deleted=True).first()
+
+    if result:
+        return result, 200
+    elif history_model or base_deleted:
+        return unpack_resource_helper(cls, history_model), 410
+    return None, 404
+
+
+def cleanup(db):
+    table = Organization.__tablename__
+    for name in [table + "_history", table]:
+        db.session.execute(
+            text("DELETE FROM \"{0}\" WHERE id LIKE 'bench-get-by-id-%'".format(name))
+        )
+    db.session.commit()
+
+
+def main():
+    with database() as db:
+        cleanup(db)
+        Organization.create(id=LIVE_ID, name="Live Organization", active=True)
+        deleted = Organization.create(id=DELETED_ID, name="Deleted", active=True)
+        deleted.delete()
+
+        results = {}
+        try:
+            for name, id in [
+                ("live", LIVE_ID),
+                ("deleted", DELETED_ID),
+                ("missing", MISSING_ID),
+            ]:
+                assert three_queries(db, Organization, id)[1] == (
+                    Organization.get_by_id(id)[1]
+                )
+                results["three queries, " + name] = measure(
+                    lambda: three_queries(db, Organization, id), number=200
+                )
+                results["single query, " + name] = measure(
+                    lambda: Organization.get_by_id(id), number=200
+                )
+        finally:
+            cleanup(db)
+
+    report("get_by_id", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Flush time of an update of 10k resources.
+
+Compares the "orm" history backend, a history object built per resource in
+`before_flush`, with the "sql" backend writing the history rows of the flush
+with one INSERT ... SELECT.
+"""
+import time
+
+from sqlalchemy.sql.expression import text
+
+from fhir_server.resources import Organization
+from fhir_server.utils import history_tables
+from benchmarks import database, report
+
+ROWS = 10000
+
+
+def cleanup(db):
+    table = Organization.__tablename__
+    for name in [table + "_history", table]:
+        db.session.execute(
+            text("DELETE FROM \"{0}\" WHERE id LIKE 'bench-history-%'".format(name))
+        )
+    db.session.commit()
+
+
+def update_all(db, organizations, name):
+    """Seconds taken to flush a new name for all the organizations."""
+    for organization in organizations:
+        organization.name = name
+
+    start = time.perf_counter()
+    db.session.flush()
+    elapsed = time.perf_counter() - start
+
+    db.session.commit()
+    return elapsed
+
+
+def main():
+    results = {}
+    with database() as db:
+        cleanup(db)
+        organizations = [
+            Organization(id="bench-history-{0}".format(i), name="Organization")
+            for i in range(ROWS)
+        ]
+        db.session.add_all(organizations)
+        db.session.commit()
+
+        backend = history_tables.HISTORY_BACKEND
+        try:
+            for round, name in enumerate(["orm", "sql"] * 2):
+                history_tables.HISTORY_BACKEND = name
+                organizations = Organization.query.filter(
+                    Organization.id.like("bench-history-%")
+                ).all()
+                elapsed = update_all(db, organizations, "Update {0}".format(round))
+                key = "{0}, {1} rows".format(name, ROWS)
+                results[key] = min(results.get(key, elapsed), elapsed) * 1e6 / ROWS
+        finally:
+            history_tables.HISTORY_BACKEND = backend
+            cleanup(db)
+
+    report("history writes per updated resource", results)
+
+
+if __name__ == "__main__":
+    main()
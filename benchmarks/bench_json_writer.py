@@ -0,0 +1,95 @@
+"""Cost of writing a searchset Bundle of 100 Patients as JSON.
+
+Compares `JSON_RESPONSE_WRITER = "clean_dict"`, a cleaned copy of the
+response encoded by `json.dumps`, with `json_writer`: the pure Python writer
+it used to be and the cleaning walk feeding the C encoder it is now. The
+peak memory of a materialized Bundle is compared with the Bundle streamed
+one entry at a time, as `make_stream_resp` does with the "direct" writer.
+"""
+import json
+import tracemalloc
+from unittest.mock import patch
+
+from fhir_server.api import json_writer
+from fhir_server.api.response import clean_dict, json_default
+from fhir_server.resources import Patient
+from benchmarks import database, measure, report
+from benchmarks.bench_serializer import PATIENT, cleanup
+
+ENTRIES = 100
+
+
+def python_writer(data):
+    """The previous `json_writer.dumps`."""
+    out = []
+    json_writer._write_value(data, out)
+    return "".join(out).encode("utf-8")
+
+
+def bundle(resources):
+    return {
+        "resourceType": "Bundle",
+        "type": "searchset",
+        "total": len(resources),
+        "entry": [{"resource": resource, "search": None} for resource in resources],
+    }
+
+
+def stream(resources):
+    """Write the entries one at a time, each chunk is sent then dropped."""
+    for data in resources:
+        json_writer.dumps({"resource": data})
+
+
+def peak_memory(write):
+    """Peak bytes allocated while `write` runs."""
+    tracemalloc.start()
+    write()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    with database() as db:
+        cleanup(db)
+        try:
+            # Valueset lookups are not part of what is measured
+            with patch("fhir_server.resources.resource.vv"):
+                for i in range(ENTRIES):
+                    Patient.create(id="bench-serializer-%s" % i, **PATIENT)
+
+            patients = Patient.query.filter(Patient.id.like("bench-serializer-%")).all()
+            resources = []
+            for patient in patients:
+                data = patient._to_dict()
+                data["resourceType"] = "Patient"
+                resources.append(data)
+        finally:
+            cleanup(db)
+
+    assert json_writer.dumps(bundle(resources)) == python_writer(bundle(resources))
+    results = {
+        "clean_dict + json.dumps": measure(
+            lambda: json.dumps(clean_dict(bundle(resources)), default=json_default),
+            number=50,
+        ),
+        "pure Python json_writer": measure(
+            lambda: python_writer(bundle(resources)), number=50
+        ),
+        "json_writer.dumps": measure(
+            lambda: json_writer.dumps(bundle(resources)), number=50
+        ),
+    }
+    report("searchset Bundle of %s Patients" % ENTRIES, results)
+
+    materialized = peak_memory(
+        lambda: json.dumps(clean_dict(bundle(resources)), default=json_default)
+    )
+    streamed = peak_memory(lambda: stream(resources))
+    print("materialized Bundle: peak {0:.1f} KiB".format(materialized / 1024))
+    print("streamed entries: peak {0:.1f} KiB".format(streamed / 1024))
+
+
+if __name__ == "__main__":
+    main()
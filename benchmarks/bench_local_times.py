@@ -0,0 +1,54 @@
+"""Per value cost of `validate_local_times`.
+
+Compares localizing a datetime in every timezone (the previous
+implementation) with the precomputed transition index.
+"""
+from datetime import datetime
+
+import pytz
+
+from fhir_server.elements import primitives
+from benchmarks import measure, report
+
+VALUES = {
+    "plain datetime": datetime(2016, 8, 4, 15, 13, 29),
+    "dst transition day": datetime(2016, 10, 30, 12, 30, 0),
+    "ambiguous datetime": datetime(2002, 10, 27, 1, 30, 0),
+}
+
+
+def localize_in_all_timezones(value):
+    for zone in pytz.all_timezones:
+        tz = pytz.timezone(zone)
+        try:
+            tz.localize(value, is_dst=None)
+        except Exception:
+            raise pytz.exceptions.AmbiguousTimeError(
+                "Ambiguous Time Error for %s" % value
+            )
+
+
+def run(func, value):
+    def call():
+        try:
+            func(value)
+        except pytz.exceptions.AmbiguousTimeError:
+            pass
+
+    return call
+
+
+def main():
+    results = {}
+    for name, value in VALUES.items():
+        results["all timezones, " + name] = measure(
+            run(localize_in_all_timezones, value), number=20
+        )
+        results["transition index, " + name] = measure(
+            run(primitives.validate_local_times, value), number=2000
+        )
+    report("validate_local_times", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Flush time of an update of 10k resources by narrative strategy.
+
+Updates a field that is not in the summary of the resources. The "eager"
+strategy regenerates, binds and validates the narrative of every resource,
+"cached" keeps the stored narrative when it is unchanged and "lazy" does
+not store it.
+"""
+import time
+
+from sqlalchemy.sql.expression import text
+
+from fhir_server.configs import constants
+from fhir_server.resources import Organization
+from benchmarks import database, report
+
+ROWS = 10000
+
+
+def cleanup(db):
+    table = Organization.__tablename__
+    for name in [table + "_history", table]:
+        db.session.execute(
+            text("DELETE FROM \"{0}\" WHERE id LIKE 'bench-narrative-%'".format(name))
+        )
+    db.session.commit()
+
+
+def update_all(db, organizations, active):
+    """Seconds taken to flush a new `active` for all the organizations."""
+    for organization in organizations:
+        organization.active = active
+
+    start = time.perf_counter()
+    db.session.flush()
+    elapsed = time.perf_counter() - start
+
+    db.session.commit()
+    return elapsed
+
+
+def main():
+    results = {}
+    with database() as db:
+        cleanup(db)
+        organizations = [
+            Organization(id="bench-narrative-{0}".format(i), name="Organization")
+            for i in range(ROWS)
+        ]
+        db.session.add_all(organizations)
+        db.session.commit()
+
+        strategy = constants.NARRATIVE_STRATEGY
+        try:
+            for round, name in enumerate(["eager", "cached", "lazy"] * 2):
+                constants.NARRATIVE_STRATEGY = name
+                organizations = Organization.query.filter(
+                    Organization.id.like("bench-narrative-%")
+                ).all()
+                elapsed = update_all(db, organizations, round % 2 == 0)
+                key = "{0}, {1} rows".format(name, ROWS)
+                results[key] = min(results.get(key, elapsed), elapsed) * 1e6 / ROWS
+        finally:
+            constants.NARRATIVE_STRATEGY = strategy
+            cleanup(db)
+
+    report("narrative per updated resource", results)
+
+
+if __name__ == "__main__":
+    main()
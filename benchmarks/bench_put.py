@@ -0,0 +1,94 @@
+"""Latency and memory of a PUT of a large StructureDefinition.
+
+Compares setting every versioned attribute with the "active_history" flag on,
+loading the old value of each attribute as it is set, with the flag off,
+reading the previous version from the database row at flush time.
+"""
+import time
+import tracemalloc
+
+from sqlalchemy.sql.expression import text
+
+from fhir_server.resources import StructureDefinition
+from fhir_server.utils.history_tables import HISTORY_BACKEND
+from benchmarks import database, report
+
+ID = "bench-put"
+CODES = 5000
+ROUNDS = 5
+
+
+def cleanup(db):
+    table = StructureDefinition.__tablename__
+    for name in [table + "_history", table]:
+        db.session.execute(
+            text("DELETE FROM \"{0}\" WHERE id LIKE 'bench-put%'".format(name))
+        )
+    db.session.commit()
+
+
+def structure_definition(round):
+    return {
+        "url": "http://example.org/fhir/StructureDefinition/bench",
+        "name": "Bench {0}".format(round),
+        "status": "draft",
+        "kind": "resource",
+        "abstract": False,
+        "code": [
+            {"system": "http://loinc.org", "code": "{0}-{1}".format(i, round)}
+            for i in range(CODES)
+        ],
+        "mapping": [
+            {"identity": "map-{0}".format(i), "name": "Mapping {0}".format(round)}
+            for i in range(CODES // 10)
+        ],
+    }
+
+
+def set_active_history(active):
+    for prop in StructureDefinition.__mapper__.iterate_properties:
+        getattr(StructureDefinition, prop.key).impl.active_history = active
+
+
+def put(db, round):
+    """Seconds and peak bytes of one update, as the PUT endpoint runs it."""
+    db.session.expire_all()
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    instance, status_code = StructureDefinition.get_by_id(ID)
+    instance.update(**structure_definition(round))
+
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    timings, memory = {}, {}
+    with database() as db:
+        cleanup(db)
+        StructureDefinition.create(id=ID, **structure_definition(0))
+
+        try:
+            for round, active in enumerate([True, False] * ROUNDS, 1):
+                set_active_history(active)
+                elapsed, peak = put(db, round)
+
+                key = "{0}, {1} backend".format(
+                    "active history" if active else "row image", HISTORY_BACKEND
+                )
+                timings[key] = min(timings.get(key, elapsed), elapsed) * 1e6
+                memory[key] = min(memory.get(key, peak), peak)
+        finally:
+            set_active_history(False)
+            cleanup(db)
+
+    report("PUT of a StructureDefinition with {0} codes".format(CODES), timings)
+    for key, peak in memory.items():
+        print("{0}: peak {1:.1f} KiB".format(key, peak / 1024))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Cost of deep search pages.
+
+Fills the Organization table with `BENCH_ROWS` rows (1M by default) and
+compares, for a page deep into the results:
+
+* the previous `count()` + OFFSET `paginate()` pair of queries,
+* the single query with a `count(*) OVER ()` total,
+* keyset (cursor) paging with an estimated and with no total.
+"""
+import os
+
+from sqlalchemy.sql.expression import text
+
+from fhir_server.resources import Organization
+from benchmarks import database, measure, report
+
+ROWS = int(os.environ.get("BENCH_ROWS", 1000000))
+PER_PAGE = 10
+PAGE = ROWS // PER_PAGE - 1
+
+
+def count_and_paginate(page):
+    query = Organization.query.filter_by(is_deleted=False)
+    count = query.count()
+    return query.paginate(page, PER_PAGE, False).items, count
+
+
+def fill(db):
+    db.session.execute(
+        text(
+            'INSERT INTO "{0}" (id, name, active, is_deleted, resource_version) '
+            "SELECT 'bench-search-' || lpad(i::text, 8, '0'), 'Organization ' || i, "
+            "true, false, 1 FROM generate_series(1, :rows) AS i".format(
+                Organization.__tablename__
+            )
+        ),
+        {"rows": ROWS},
+    )
+    db.session.execute(text('ANALYZE "{0}"'.format(Organization.__tablename__)))
+    db.session.commit()
+
+
+def cleanup(db):
+    db.session.execute(
+        text(
+            "DELETE FROM \"{0}\" WHERE id LIKE 'bench-search-%'".format(
+                Organization.__tablename__
+            )
+        )
+    )
+    db.session.commit()
+
+
+def main():
+    with database() as db:
+        cleanup(db)
+        fill(db)
+
+        # The id of the last resource on the page before the measured one
+        cursor = "bench-search-{0:08d}".format((PAGE - 1) * PER_PAGE)
+
+        results = {}
+        try:
+            results["count() + paginate(), page %s" % PAGE] = measure(
+                lambda: count_and_paginate(PAGE), number=3, repeat=3
+            )
+            results["count(*) OVER (), page %s" % PAGE] = measure(
+                lambda: Organization.search(per_page=PER_PAGE, page=PAGE),
+                number=3,
+                repeat=3,
+            )
+            results["cursor, _total=estimate"] = measure(
+                lambda: Organization.search(
+                    per_page=PER_PAGE, cursor=cursor, total="estimate"
+                ),
+                number=50,
+            )
+            results["cursor, _total=none"] = measure(
+                lambda: Organization.search(
+                    per_page=PER_PAGE, cursor=cursor, total="none"
+                ),
+                number=50,
+            )
+        finally:
+            cleanup(db)
+
+    report("search, %s rows" % ROWS, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Cost of serializing a Bundle of 100 Patients.
+
+Compares the previous `ElementSerializer._to_dict`, which introspected every
+instance with `getmembers` and test encoded every field with `json.dumps`,
+with the serializer compiled once per resource from the mapper's columns.
+"""
+import datetime
+import uuid
+from inspect import getmembers, ismethod
+from unittest.mock import patch
+
+from flask import json
+from sqlalchemy.sql.expression import text
+
+from fhir_server.resources import Patient
+from benchmarks import database, measure, report
+
+ENTRIES = 100
+
+PATIENT = {
+    "active": True,
+    "gender": "male",
+    "birthDate": "1990-11-11",
+    "identifier": [
+        {
+            "system": "http://ids",
+            "use": "official",
+            "value": "value111",
+            "period": {"start": "2011-05-24", "end": "2011-06-24"},
+        }
+    ],
+    "name": [
+        {
+            "family": ["family", "family2"],
+            "given": ["given", "given2"],
+            "text": "family given",
+            "use": "official",
+            "period": {"start": "2011-05-24", "end": "2011-06-24"},
+        }
+    ],
+    "telecom": [
+        {
+            "system": "phone",
+            "use": "work",
+            "value": "+254712122988",
+            "period": {"start": "2011-05-24", "end": "2011-06-24"},
+        }
+    ],
+    "address": [
+        {
+            "use": "work",
+            "type": "postal",
+            "line": ["line1", "line2"],
+            "city": "city",
+            "country": "KEN",
+            "period": {"start": "2011-05-24", "end": "2011-06-24"},
+        }
+    ],
+}
+
+
+def unpack_tuple(values):
+    if isinstance(values, str):
+        return values
+    elif isinstance(values, datetime.date):
+        return values.isoformat()
+    return iter_dict({name: getattr(values, name) for name in values._fields})
+
+
+def iter_dict(values):
+    for key, val in values.items():
+        if isinstance(val, tuple):
+            values[key] = unpack_tuple(val)
+        elif isinstance(val, list):
+            for k, v in enumerate(val):
+                val[k] = unpack_tuple(v)
+        elif isinstance(val, datetime.date):
+            values[key] = val.isoformat()
+    return values
+
+
+def introspected_to_dict(instance):
+    """The previous `_to_dict`, less its in place mutation of the instance."""
+    fields = {}
+    for field in [
+        x
+        for x, y in getmembers(instance)
+        if not (ismethod(y))
+        and not x.startswith("_")
+        and not x.startswith("query")
+        and not x.startswith("references")
+        and x
+        not in [
+            "updated_at",
+            "is_deleted",
+            "deleted_at",
+            "resource_version",
+            "created_at",
+            "metadata",
+        ]
+    ]:
+        values = getattr(instance, field)
+        if isinstance(values, datetime.date):
+            values = values.isoformat()
+        elif isinstance(values, uuid.UUID):
+            values = str(values)
+        if isinstance(values, list):
+            values = [
+                unpack_tuple(val) if isinstance(val, tuple) else val for val in values
+            ]
+        if str(values).startswith("fhir_"):
+            values = iter_dict(values._asdict())
+
+        try:
+            json.dumps(values)
+            fields[field] = values
+        except TypeError:
+            fields[field] = None
+
+    return fields
+
+
+def cleanup(db):
+    table = Patient.__tablename__
+    for name in [table + "_history", table]:
+        db.session.execute(
+            text("DELETE FROM \"{0}\" WHERE id LIKE 'bench-serializer-%'".format(name))
+        )
+    db.session.commit()
+
+
+def main():
+    with database() as db:
+        cleanup(db)
+        try:
+            # Valueset lookups are not part of what is measured
+            with patch("fhir_server.resources.resource.vv"):
+                for i in range(ENTRIES):
+                    Patient.create(id="bench-serializer-%s" % i, **PATIENT)
+
+            patients = Patient.query.filter(Patient.id.like("bench-serializer-%")).all()
+            assert len(patients) == ENTRIES
+
+            results = {
+                "getmembers + json.dumps": measure(
+                    lambda: [introspected_to_dict(p) for p in patients], number=5
+                ),
+                "compiled serializer": measure(
+                    lambda: [p._to_dict() for p in patients], number=50
+                ),
+            }
+        finally:
+            cleanup(db)
+
+    report("Bundle of %s Patients" % ENTRIES, results)
+
+
+if __name__ == "__main__":
+    main()
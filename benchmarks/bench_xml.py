@@ -0,0 +1,93 @@
+"""Throughput of XML responses.
+
+Compares `_response_to_xml` (`@value` wrapping, `xmltodict.unparse` then an
+`ElementTree` parse and `tostring` round trip) with the single pass
+`api.xml_writer`, for a single Patient and a Bundle of 100 Patients.
+
+Both paths rebuild their input from JSON on every call since the previous
+path modifies it; the cost of that copy alone is reported too.
+"""
+import json
+
+from fhir_server.api import xml_writer
+from fhir_server.api.response import _response_to_xml, clean_dict
+from benchmarks import measure, report
+
+ENTRIES = 100
+
+PATIENT = {
+    "resourceType": "Patient",
+    "id": "bench-xml",
+    "meta": {"versionId": "1", "lastUpdated": "2016-08-04T15:13:29+00:00"},
+    "text": {
+        "status": "generated",
+        "div": '<div xmlns="http://www.w3.org/1999/xhtml">Patient</div>',
+    },
+    "active": True,
+    "gender": "male",
+    "birthDate": "1990-11-11",
+    "deceasedBoolean": False,
+    "identifier": [
+        {
+            "system": "http://ids",
+            "use": "official",
+            "value": "value111",
+            "period": {"start": "2011-05-24", "end": "2011-06-24"},
+            "assigner": None,
+        }
+    ],
+    "name": [
+        {
+            "family": ["family", "family2"],
+            "given": ["given", "given2"],
+            "text": "family given",
+            "use": "official",
+            "period": {"start": "2011-05-24", "end": None},
+        }
+    ],
+    "telecom": [
+        {"system": "phone", "use": "work", "value": "+254712122988", "rank": 2}
+    ],
+    "address": [
+        {
+            "use": "work",
+            "type": "postal",
+            "line": ["line1", "line2"],
+            "city": "city",
+            "country": "KEN",
+            "period": {},
+        }
+    ],
+    "photo": None,
+    "extension": None,
+}
+
+RESOURCE = json.dumps(PATIENT)
+BUNDLE = json.dumps(
+    {
+        "resourceType": "Bundle",
+        "total": ENTRIES,
+        "entry": [{"resource": PATIENT} for _ in range(ENTRIES)],
+        "type": "searchset",
+    }
+)
+
+
+def main():
+    results = {}
+    for name, data, number in [
+        ("Patient", RESOURCE, 500),
+        ("Bundle of %s Patients" % ENTRIES, BUNDLE, 5),
+    ]:
+        results["copy only, " + name] = measure(lambda: json.loads(data), number=number)
+        results["xmltodict + ElementTree, " + name] = measure(
+            lambda: _response_to_xml(clean_dict(json.loads(data))), number=number
+        )
+        results["xml_writer, " + name] = measure(
+            lambda: xml_writer.dumps(json.loads(data)), number=number
+        )
+    report("XML responses", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,14 @@
-from flask import redirect, request
+from dateutil import parser
+from flask import current_app, make_response, redirect, request, send_file, url_for
 
-from fhir_server.api import api_v1
+from fhir_server.api import api_v1, json_writer
 from fhir_server.api import response as Response
+from fhir_server.api.bundle import BundleError, process_bundle
+from fhir_server.helpers.export import ExportError
 from fhir_server.operations import BaseOperations
+from fhir_server.resources import all_resources
+
+EXPORT_FORMATS = ["application/fhir+ndjson", "application/ndjson", "ndjson"]
 
 # from .views import resource_list
 
@@ -14,6 +20,149 @@ def base_endpoint():
     return redirect("/")
 
 
+@api_v1.route("/", methods=["POST"])
+def base_bundle_endpoint():
+    """Process a batch or transaction Bundle.
+
+    A transaction is written in one database transaction and fails as a
+    whole. The entries of a batch succeed or fail on their own.
+    """
+    request_args = dict(request.args)
+    location = request.full_path
+    mime_type = request_args.get("_format") or "text/html"
+
+    try:
+        bundle = process_bundle(request.data)
+    except BundleError as e:
+        return Response.log_operation_outcome(
+            [location],
+            code="invalid",
+            diagnostics=e,
+            expression=[e.expression] if e.expression else None,
+            status_code=e.status_code,
+            mime_type=mime_type,
+        )
+
+    return Response.make_bundle_resp(
+        bundle, code=200, mime_type=mime_type, location=request.base_url
+    )
+
+
+@api_v1.route("/$export", methods=["GET"])
+def base_export_endpoint():
+    """Kick off a bulk export of all the resource types or of `_type`.
+
+    Follows the FHIR Bulk Data pattern: the export runs in the background
+    and the `Content-Location` of the `202 Accepted` response is polled
+    for its progress and, once it is done, the manifest of its files.
+    """
+    location = request.full_path
+    resource_names = [resource.__tablename__ for resource in all_resources]
+
+    err = None
+    if "respond-async" not in request.headers.get("Prefer", ""):
+        err = "A bulk export requires the `Prefer: respond-async` header"
+    elif request.args.get("_outputFormat", EXPORT_FORMATS[0]) not in EXPORT_FORMATS:
+        err = "{0} is not a supported _outputFormat".format(
+            request.args.get("_outputFormat")
+        )
+
+    types = request.args.get("_type")
+    if types:
+        unknown = [name for name in types.split(",") if name not in resource_names]
+        if unknown:
+            err = "{0} are unknown resource types".format(unknown)
+        resource_names = [name for name in resource_names if name in types.split(",")]
+
+    since = request.args.get("_since")
+    try:
+        since = since and parser.parse(since).isoformat()
+    except (ValueError, OverflowError):
+        err = "{0} is not a valid _since instant".format(since)
+
+    if err:
+        return Response.log_operation_outcome(
+            [location], code="invalid", diagnostics=err, mime_type=["json"]
+        )
+
+    job_id = current_app.exporter.kick_off(resource_names, request.url, since=since)
+
+    api_response = make_response(b"", 202)
+    api_response.headers["Content-Location"] = url_for(
+        "api_v1.base_export_status", job_id=job_id, _external=True
+    )
+    return api_response
+
+
+@api_v1.route("/$export-poll-status/<job_id>", methods=["GET", "DELETE"])
+def base_export_status(job_id):
+    """The progress, then the manifest, of an export. DELETE cancels it."""
+    location = request.full_path
+    exporter = current_app.exporter
+
+    try:
+        if request.method == "DELETE":
+            status = exporter.cancel(job_id)
+        else:
+            status = exporter.status(job_id)
+    except ExportError:
+        status = None
+
+    if not status:
+        return Response.log_operation_outcome(
+            [location],
+            code="not-found",
+            diagnostics="{0} is not an export job".format(job_id),
+            status_code=404,
+            mime_type=["json"],
+        )
+
+    if request.method == "DELETE":
+        return make_response(b"", 202)
+
+    done, total, parts = status
+    if done < total:
+        api_response = make_response(b"", 202)
+        api_response.headers["X-Progress"] = "{0}/{1} resource types".format(
+            done, total
+        )
+        return api_response
+
+    def file_url(file_name):
+        return url_for(
+            "api_v1.base_export_file",
+            job_id=job_id,
+            file_name=file_name,
+            _external=True,
+        )
+
+    api_response = make_response(
+        json_writer.dumps(exporter.manifest(job_id, file_url)), 200
+    )
+    api_response.headers["Content-Type"] = "application/json; charset=utf-8"
+    return api_response
+
+
+@api_v1.route("/$export-file/<job_id>/<file_name>", methods=["GET"])
+def base_export_file(job_id, file_name):
+    """An NDJSON file of a finished export."""
+    try:
+        path = current_app.exporter.file_path(job_id, file_name)
+    except ExportError:
+        path = None
+
+    if not path:
+        return Response.log_operation_outcome(
+            [request.full_path],
+            code="not-found",
+            diagnostics="{0} is not an exported file".format(file_name),
+            status_code=404,
+            mime_type=["json"],
+        )
+
+    return send_file(path, mimetype="application/fhir+ndjson")
+
+
 @api_v1.route("/<fhirop:operation>", methods=["GET"])
 def base_meta_list_operation(operation):
     """The "base" FHIR `meta-list` operation endpoint.
@@ -0,0 +1,404 @@
+"""
+Process batch and transaction Bundles posted to the base endpoint.
+
+The entries of a `transaction` are staged in one session, written with a
+single flush and committed together: any failing entry rolls the whole
+Bundle back. `urn:uuid` fullUrls of the entries are resolved to the ids
+assigned by the server and the references to them are rewritten before the
+resources are built.
+
+The entries of a `batch` are independent. Each one runs in a savepoint so a
+failing entry is reported in its response without undoing the others, and
+the batch is committed once.
+
+Example usage::
+    response_bundle = process_bundle(request.data)
+"""
+
+import uuid
+from urllib.parse import parse_qs
+
+from werkzeug.http import HTTP_STATUS_CODES
+
+from fhir_server.api import response as Response
+from fhir_server.api.mixins import add_meta_last_modified
+from fhir_server.configs.database import db
+from fhir_server.helpers.validations import CodeValidationBatch, resolve_active_batch
+from fhir_server.resources import all_resources
+
+# Transaction entries are processed in this order whatever their order in
+# the Bundle, as required by the FHIR transaction processing rules.
+METHOD_ORDER = {"DELETE": 0, "POST": 1, "PUT": 2, "GET": 3}
+
+URN_PREFIXES = ("urn:uuid:", "urn:oid:")
+
+
+class BundleError(ValueError):
+    """A Bundle, or an entry of a Bundle, that can not be processed."""
+
+    def __init__(self, message, status_code=400, expression=None):
+        super(BundleError, self).__init__(message)
+        self.status_code = status_code
+        self.expression = expression
+
+
+def http_status(status_code):
+    return "{0} {1}".format(status_code, HTTP_STATUS_CODES.get(status_code, ""))
+
+
+def _resource_classes():
+    return {resource.__tablename__: resource for resource in all_resources}
+
+
+def _rewrite_references(value, references):
+    """Replace, in place, the references to the fullUrls of other entries."""
+    if isinstance(value, dict):
+        reference = value.get("reference")
+        if isinstance(reference, str) and reference in references:
+            value["reference"] = references[reference]
+        for item in value.values():
+            if isinstance(item, (dict, list)):
+                _rewrite_references(item, references)
+
+    elif isinstance(value, list):
+        for item in value:
+            if isinstance(item, (dict, list)):
+                _rewrite_references(item, references)
+
+
+def _last_updated(instance):
+    meta = instance.meta
+    if isinstance(meta, dict):
+        value = meta.get("lastUpdated")
+    else:
+        value = getattr(meta, "lastUpdated", None)
+
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+class BundleAction(object):
+    """One entry of a Bundle: the interaction its `request` asks for.
+
+    `stage` adds the changes of the entry to the session without flushing
+    and `response` builds the `response` of the entry once it is flushed.
+    """
+
+    def __init__(self, index, entry, resources):
+        self.index = index
+        self.expression = "Bundle.entry[{0}]".format(index)
+        self.full_url = entry.get("fullUrl")
+        self.resource = entry.get("resource")
+        self.instance = None
+        self.status_code = None
+        self.result = None
+
+        request = entry.get("request") or {}
+        self.method = (request.get("method") or "").upper()
+        self.if_match = request.get("ifMatch")
+        self.if_none_exist = request.get("ifNoneExist")
+
+        if self.method not in METHOD_ORDER:
+            raise self.error(
+                "Unsupported request method {0}".format(request.get("method"))
+            )
+
+        url = (request.get("url") or "").strip("/")
+        path, _, query = url.partition("?")
+        parts = path.split("/")
+
+        self.resource_cls = resources.get(parts[0])
+        if self.resource_cls is None:
+            raise self.error("Unknown resource type in url {0}".format(url), 404)
+
+        self.key = parts[1] if len(parts) > 1 else None
+        self.params = parse_qs(query)
+
+        if self.method in ["POST", "PUT"]:
+            if not isinstance(self.resource, dict):
+                raise self.error(
+                    "A {0} entry must include a resource".format(self.method)
+                )
+
+            resource_type = self.resource.get("resourceType")
+            if resource_type != self.resource_cls.__tablename__:
+                raise self.error(
+                    "Incorrect resource type {0} found, expected {1}".format(
+                        resource_type, self.resource_cls.__tablename__
+                    )
+                )
+
+        if self.method == "POST":
+            # The server assigns the id of a created resource. It is known
+            # before anything is written so references to it can be resolved
+            self.key = str(uuid.uuid4())
+
+        elif self.method in ["PUT", "DELETE"] and not (self.key or self.params):
+            raise self.error(
+                "A {0} entry url needs an id or params".format(self.method)
+            )
+
+    def error(self, message, status_code=400):
+        return BundleError(
+            "{0}: {1}".format(self.expression, message),
+            status_code=status_code,
+            expression=self.expression,
+        )
+
+    @property
+    def reference(self):
+        return "{0}/{1}".format(self.resource_cls.__tablename__, self.key)
+
+    def _match(self, params):
+        query, count, status_code = self.resource_cls.filter(**params)
+        if status_code == 412:
+            raise self.error("The search criteria are not selective enough", 412)
+        return query
+
+    def _data(self):
+        data = {
+            key: value
+            for key, value in self.resource.items()
+            if key not in ["resourceType", "id"]
+        }
+        return add_meta_last_modified(data)
+
+    def locate(self):
+        """Find the existing resource the entry applies to, if any.
+
+        Conditional entries are matched here, before any entry is staged, so
+        that the references to them resolve to the matching resource.
+        """
+        if self.method == "POST":
+            if self.if_none_exist:
+                self.instance = self._match(parse_qs(self.if_none_exist))
+                if self.instance is not None:
+                    self.key = self.instance.id
+
+        elif self.method in ["PUT", "DELETE"]:
+            if self.key:
+                self.instance = self.resource_cls.query.get(self.key)
+            else:
+                self.instance = self._match(self.params)
+                if self.instance is not None:
+                    self.key = self.instance.id
+                elif self.method == "PUT":
+                    # A conditional update without a match creates the resource
+                    self.key = str(uuid.uuid4())
+
+    def stage(self):
+        """Add the changes of the entry to the session."""
+        instance = self.instance
+
+        if self.method == "DELETE":
+            if instance is None or instance.is_deleted:
+                raise self.error("{0} is not known".format(self.reference), 404)
+
+            instance.assign(patch=True, **instance.deleted_fields())
+            self.status_code = 204
+
+        elif instance is None:
+            # POST, or a PUT creating the resource
+            self.instance = self.resource_cls(id=self.key, **self._data())
+            db.session.add(self.instance)
+            self.status_code = 201
+
+        elif self.method == "POST":
+            # `ifNoneExist` matched an existing resource
+            self.status_code = 200
+
+        else:
+            version_id = getattr(instance.meta, "versionId", None)
+            if self.if_match and self.if_match != version_id:
+                raise self.error(
+                    "CONFLICT. The version of {0} changed".format(self.reference), 409
+                )
+
+            instance.assign(**self._data())
+            self.status_code = 200
+
+    def read(self):
+        """Perform a GET entry, a read or a search of the resource type."""
+        if self.key:
+            instance, status_code = self.resource_cls.get_by_id(self.key)
+            if not instance or status_code != 200:
+                raise self.error("{0} is not known".format(self.reference), status_code)
+
+            data = instance._to_dict()
+            data["resourceType"] = self.resource_cls.__tablename__
+            self.result, self.status_code = data, 200
+            return
+
+        results, total, next_cursor = self.resource_cls.search(**self.params)
+        entries = []
+        for instance in results:
+            data = instance._to_dict()
+            data["resourceType"] = self.resource_cls.__tablename__
+            entries.append({"resource": data})
+
+        self.result = {
+            "resourceType": "Bundle",
+            "type": "searchset",
+            "total": total,
+            "entry": entries,
+        }
+        self.status_code = 200
+
+    def response(self):
+        """The `response` of the entry and the resource of a GET."""
+        entry = {"response": {"status": http_status(self.status_code)}}
+        if self.result is not None:
+            entry["resource"] = self.result
+
+        elif self.instance is not None and self.status_code != 204:
+            version = self.instance.resource_version
+            entry["response"].update(
+                {
+                    "location": "{0}/_history/{1}".format(self.reference, version),
+                    "etag": 'W/"{0}"'.format(version),
+                    "lastModified": _last_updated(self.instance),
+                }
+            )
+        return entry
+
+
+def _error_entry(error, status_code):
+    expression = getattr(error, "expression", None)
+    outcome = Response.operation_outcome(
+        None,
+        code="invalid",
+        diagnostics=error,
+        expression=[expression] if expression else None,
+    )
+    return {"response": {"status": http_status(status_code), "outcome": outcome}}
+
+
+def process_transaction(actions):
+    """Run all the actions in one database transaction with a single flush.
+
+    :raises BundleError: With the status of the first failing entry. Nothing
+                         is written in that case
+    """
+    current = None
+    try:
+        references = {}
+        for action in actions:
+            current = action
+            action.locate()
+
+            if action.method in ["POST", "PUT"] and action.full_url:
+                if action.full_url.startswith(URN_PREFIXES):
+                    references[action.full_url] = action.reference
+
+        for action in actions:
+            if action.resource:
+                _rewrite_references(action.resource, references)
+
+        with CodeValidationBatch():
+            # Nothing is written until every entry is staged
+            with db.session.no_autoflush:
+                for action in sorted(actions, key=lambda a: METHOD_ORDER[a.method]):
+                    if action.method != "GET":
+                        current = action
+                        action.stage()
+
+            current = None
+            db.session.flush()
+            resolve_active_batch()
+
+        for action in actions:
+            if action.method == "GET":
+                current = action
+                action.read()
+
+        # Read before the commit expires the flushed instances
+        responses = [action.response() for action in actions]
+        db.session.commit()
+    except BundleError:
+        db.session.rollback()
+        raise
+    except Exception as e:
+        db.session.rollback()
+        expression = current.expression if current else None
+        message = "{0}: {1}".format(expression, e) if expression else str(e)
+        raise BundleError(message, status_code=422, expression=expression)
+
+    return responses
+
+
+def process_batch(entries, resources):
+    """Run every entry on its own, in a savepoint of a single transaction."""
+    responses = []
+    for index, entry in enumerate(entries):
+        try:
+            action = BundleAction(index, entry, resources)
+        except BundleError as e:
+            responses.append(_error_entry(e, e.status_code))
+            continue
+
+        savepoint = db.session.begin_nested()
+        try:
+            if action.method == "GET":
+                action.read()
+            else:
+                action.locate()
+                with CodeValidationBatch():
+                    with db.session.no_autoflush:
+                        action.stage()
+                    db.session.flush()
+                    resolve_active_batch()
+            savepoint.commit()
+        except BundleError as e:
+            savepoint.rollback()
+            responses.append(_error_entry(e, e.status_code))
+            continue
+        except Exception as e:
+            savepoint.rollback()
+            responses.append(_error_entry(action.error(e), 422))
+            continue
+
+        responses.append(action.response())
+
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return responses
+
+
+def process_bundle(bundle):
+    """Process a batch or transaction Bundle.
+
+    :param bundle: The Bundle dict
+    :return The `batch-response` or `transaction-response` Bundle:
+    :raises BundleError: If the Bundle, or an entry of a transaction, fails
+    """
+    if not isinstance(bundle, dict) or bundle.get("resourceType") != "Bundle":
+        raise BundleError("Only a Bundle can be posted to the base endpoint")
+
+    bundle_type = bundle.get("type")
+    if bundle_type not in ["batch", "transaction"]:
+        raise BundleError(
+            "Bundle type {0} can not be processed. Expected batch or "
+            "transaction".format(bundle_type)
+        )
+
+    resources = _resource_classes()
+    entries = bundle.get("entry") or []
+
+    if bundle_type == "transaction":
+        actions = [
+            BundleAction(index, entry, resources) for index, entry in enumerate(entries)
+        ]
+        responses = process_transaction(actions)
+    else:
+        responses = process_batch(entries, resources)
+
+    return {
+        "resourceType": "Bundle",
+        "id": str(uuid.uuid4()),
+        "type": "{0}-response".format(bundle_type),
+        "entry": responses,
+    }
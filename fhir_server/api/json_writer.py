@@ -0,0 +1,193 @@
+"""
+Write JSON responses without the empty values.
+
+`dumps` drops dict entries whose value is None or an empty dict, the same
+entries `response.clean_dict` removes. The entries are dropped by one walk
+that only copies the dicts and lists, then the result is encoded by the C
+encoder of the `json` module. Dates, times and UUIDs are encoded as strings.
+
+The C encoder can not write a `Decimal` with its own digits, so a document
+holding one is written by the pure Python writer (`_write_value`) instead.
+"""
+
+import datetime
+import json
+import uuid
+from decimal import Decimal
+from json.encoder import encode_basestring_ascii as encode_string
+
+INFINITY = float("inf")
+
+
+class _PythonWriterOnly(Exception):
+    """A value that is written by the pure Python writer only."""
+
+
+def _default(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    # Decimals are written natively, unknown types raise a TypeError
+    raise _PythonWriterOnly()
+
+
+_encode = json.JSONEncoder(default=_default).encode
+
+
+# The leaf types found in most values, checked before the containers
+LEAF_TYPES = frozenset([str, int, float, bool])
+
+
+def _clean_dict(data):
+    """A copy of `data` without the None values and empty dicts."""
+    cleaned = {}
+    for key, value in data.items():
+        if value is None:
+            continue
+
+        cls = value.__class__
+        if cls in LEAF_TYPES:
+            pass
+        elif cls is dict or isinstance(value, dict):
+            value = _clean_dict(value)
+            if not value:
+                continue
+        elif cls is list or isinstance(value, (list, tuple)):
+            value = _clean_list(value)
+        cleaned[key] = value
+    return cleaned
+
+
+def _clean_list(data):
+    """A copy of `data` with its dicts cleaned.
+
+    Empty dicts and None are kept in lists to preserve the positions.
+    """
+    cleaned = []
+    append = cleaned.append
+    for value in data:
+        cls = value.__class__
+        if cls in LEAF_TYPES or value is None:
+            append(value)
+        elif cls is dict or isinstance(value, dict):
+            append(_clean_dict(value))
+        elif cls is list or isinstance(value, (list, tuple)):
+            append(_clean_list(value))
+        else:
+            append(value)
+    return cleaned
+
+
+def _write_float(value, append):
+    if value != value:
+        append("NaN")
+    elif value == INFINITY:
+        append("Infinity")
+    elif value == -INFINITY:
+        append("-Infinity")
+    else:
+        append(float.__repr__(value))
+
+
+def _write_dict(data, out, keep_empty):
+    """Write the non empty entries of `data`.
+
+    Returns False, with nothing written, when no entry is left and
+    `keep_empty` is False.
+    """
+    append = out.append
+    mark = len(out)
+    append("{")
+    separator = ""
+    for key, value in data.items():
+        if value is None:
+            continue
+
+        start = len(out)
+        if not isinstance(key, str):
+            key = str(key)
+        append(separator + encode_string(key) + ": ")
+        if isinstance(value, dict):
+            if not _write_dict(value, out, False):
+                del out[start:]
+                continue
+        else:
+            _write_value(value, out)
+        separator = ", "
+
+    if not separator and not keep_empty:
+        del out[mark:]
+        return False
+
+    append("}")
+    return True
+
+
+def _write_list(data, out):
+    append = out.append
+    append("[")
+    separator = ""
+    for value in data:
+        append(separator)
+        if isinstance(value, dict):
+            # Empty dicts are kept in lists to preserve the positions
+            _write_dict(value, out, True)
+        else:
+            _write_value(value, out)
+        separator = ", "
+    append("]")
+
+
+def _write_value(value, out):
+    if isinstance(value, str):
+        out.append(encode_string(value))
+    elif value is None:
+        out.append("null")
+    elif value is True:
+        out.append("true")
+    elif value is False:
+        out.append("false")
+    elif isinstance(value, int):
+        out.append(int.__repr__(value))
+    elif isinstance(value, float):
+        _write_float(value, out.append)
+    elif isinstance(value, dict):
+        _write_dict(value, out, True)
+    elif isinstance(value, (list, tuple)):
+        _write_list(value, out)
+    elif isinstance(value, Decimal):
+        out.append(str(value))
+    elif isinstance(value, (datetime.date, datetime.time)):
+        out.append(encode_string(value.isoformat()))
+    elif isinstance(value, uuid.UUID):
+        out.append(encode_string(str(value)))
+    else:
+        raise TypeError(
+            "Object of type {0} is not JSON serializable".format(type(value).__name__)
+        )
+
+
+def dumps_members(data):
+    """Encode the non empty entries of the dict `data` without its braces.
+
+    This is used to write the members of an object that is written in parts.
+    """
+    cleaned = _clean_dict(data)
+    if not cleaned:
+        return b""
+    return dumps(cleaned)[1:-1]
+
+
+def dumps(data):
+    """Encode `data` to JSON bytes, leaving out None values and empty dicts."""
+    try:
+        if isinstance(data, dict):
+            return _encode(_clean_dict(data)).encode("utf-8")
+        if isinstance(data, (list, tuple)):
+            return _encode(_clean_list(data)).encode("utf-8")
+        return _encode(data).encode("utf-8")
+    except _PythonWriterOnly:
+        out = []
+        _write_value(data, out)
+        return "".join(out).encode("utf-8")
@@ -1,12 +1,17 @@
 from datetime import datetime, timezone
+from urllib.parse import urlencode
 
+from dateutil import parser
 from flask import request, views
 from flask_sqlalchemy import _BoundDeclarativeMeta
 from werkzeug.http import HTTP_STATUS_CODES
 
 from fhir_server.api import response as Response
-from fhir_server.configs import ITEMS_PER_PAGE
+from fhir_server.configs import ITEMS_PER_PAGE, MAX_ITEMS_PER_PAGE
+from fhir_server.elements.primitives import PRIMITIVE_PATTERNS
 from fhir_server.resources import all_resources
+from fhir_server.utils.crud import decode_history_cursor
+from fhir_server.utils.search import SearchError
 
 
 class BaseApi(object):
@@ -71,6 +76,77 @@ def validate_resource_type(request_data, location, mime_type):
     return response
 
 
+def page_links(next_cursor):
+    """The `self` link of a page of results and the `next` link if any."""
+    links = {"self": request.url}
+    if next_cursor:
+        params = request.args.to_dict(flat=False)
+        params.pop("_page", None)
+        params["_cursor"] = [next_cursor]
+        links["next"] = "{0}?{1}".format(
+            request.base_url, urlencode(params, doseq=True)
+        )
+    return links
+
+
+def history_response(resource, request_args, mime_type, key=None):
+    """Respond with a page of the history of a resource type or instance.
+
+    Paging follows `_count`, `_since` and the `_cursor` of the `next` link
+    included in the Bundle.
+    """
+    location = request.full_path
+    base_url = request.base_url
+
+    try:
+        count = int(request_args.get("_count")[0])
+        count = max(1, min(count, MAX_ITEMS_PER_PAGE))
+    except (TypeError, ValueError):
+        count = ITEMS_PER_PAGE
+
+    since = request_args.get("_since")
+    cursor = request_args.get("_cursor")
+    cursor = cursor and cursor[0]
+    try:
+        if since:
+            since = parser.parse(since[0])
+            if since.tzinfo:
+                # History times are stored as naive UTC datetimes
+                since = since.astimezone(timezone.utc).replace(tzinfo=None)
+
+        if cursor:
+            decode_history_cursor(cursor)
+    except (ValueError, OverflowError) as e:
+        return Response.log_operation_outcome(
+            [location],
+            code="invalid",
+            diagnostics=e,
+            status_code=400,
+            mime_type=mime_type,
+        )
+
+    stream = resource.history_stream(key=key, count=count, since=since, cursor=cursor)
+
+    if key and not cursor and stream.is_empty():
+        err = "{0}/{1} is not known".format(resource.__tablename__.title(), key)
+        return Response.log_operation_outcome(
+            [location],
+            code="invalid",
+            diagnostics=err,
+            status_code=404,
+            mime_type=mime_type,
+        )
+
+    return Response.make_stream_resp(
+        stream,
+        resource,
+        mime_type=mime_type,
+        location=base_url,
+        bundle_type="history",
+        links=lambda: page_links(stream.next_cursor),
+    )
+
+
 class ListMixin(BaseApi, views.MethodView):
     """return a list of resource instances"""
 
@@ -84,31 +160,57 @@ class ListMixin(BaseApi, views.MethodView):
         mime_type = request_args.get("_format") or "text/html"
 
         # PAGINATION PARAMS
-        count = None  # initialize the count for objects
         try:
             page = int(request_args.get("_page")[0])
-        except TypeError:
+        except (TypeError, ValueError):
             page = 1
 
         try:
             per_page = int(request_args.get("_count")[0])
-        except TypeError:
+            per_page = max(1, min(per_page, MAX_ITEMS_PER_PAGE))
+        except (TypeError, ValueError):
             per_page = ITEMS_PER_PAGE
 
-        if str(location).endswith("_history/"):
-            query, status_code = resource.get_history()
-        else:
-            query, count, status_code = resource.filter(
-                page=page, per_page=per_page, **request_args
+        if request.path.rstrip("/").endswith("_history"):
+            return history_response(resource, request_args, mime_type)
+
+        # `_total` is `accurate` unless the client settles for an estimate or
+        # no total at all. `_cursor` is the keyset position of the next page.
+        total = (request_args.get("_total") or ["accurate"])[0]
+        if total not in ["accurate", "estimate", "none"]:
+            total = "accurate"
+
+        cursor = request_args.get("_cursor")
+        cursor = cursor and cursor[0]
+        if cursor and not PRIMITIVE_PATTERNS["id"].match(cursor):
+            return Response.log_operation_outcome(
+                [location],
+                code="invalid",
+                diagnostics="{0} is not a valid search cursor".format(cursor),
+                status_code=400,
+                mime_type=mime_type,
             )
 
-        return Response.make_data_resp(
-            query,
+        try:
+            stream = resource.search_stream(
+                page=page, per_page=per_page, cursor=cursor, total=total, **request_args
+            )
+        except SearchError as e:
+            return Response.log_operation_outcome(
+                [location],
+                code="invalid",
+                diagnostics=e,
+                status_code=400,
+                mime_type=mime_type,
+            )
+
+        return Response.make_stream_resp(
+            stream,
             resource,
-            code=200,
             mime_type=mime_type,
             location=base_url,
-            count=count,
+            bundle_type="searchset",
+            links=lambda: page_links(stream.next_cursor),
         )
 
 
@@ -241,8 +343,8 @@ class RetrieveMixin(BaseApi, views.MethodView):
             # Summary responses are not allowed if resource instance
             # version is required. Return a summary of the resource
             query, status_code = resource.get_summary(str(key), summary[0])
-        elif str(location).endswith("_history"):
-            query, status_code = resource.get_history(key=key)
+        elif request.path.rstrip("/").endswith("_history"):
+            return history_response(resource, request_args, mime_type, key=key)
         else:
             query, status_code = resource.get_by_id(str(key))
 
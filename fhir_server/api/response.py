@@ -1,15 +1,18 @@
 import sys
 import os
 import json
+import datetime
+from decimal import Decimal
 from dateutil import tz, parser
 import traceback
+import uuid
 from xml.etree import ElementTree
 
-from flask import current_app, Response, make_response
+from flask import current_app, Response, make_response, stream_with_context
 import xmltodict
 
+from fhir_server.api import json_writer, xml_writer
 from fhir_server.configs import VALID_JSON_MIMETYPES, VALID_XML_MIMETYPES
-from fhir_server.resources import OperationOutcome
 
 """
 Helper for making API returns consistent
@@ -50,6 +53,22 @@ def clean_dict(data):
     return data
 
 
+def json_default(value):
+    """Encode the values `json.dumps` does not know, as `json_writer` does.
+
+    Decimals, e.g of quantities, are written as floats.
+    """
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(
+        "Object of type {0} is not JSON serializable".format(type(value).__name__)
+    )
+
+
 def _response_to_xml(data):
     """
     This converts json data to xml.
@@ -140,6 +159,17 @@ def _response_to_xml(data):
     return resource_xml.decode("utf-8")
 
 
+def _direct_writer(mime_type):
+    """The writer encoding `mime_type` responses in one pass, if enabled."""
+    if str(mime_type[0]) in VALID_JSON_MIMETYPES:
+        if current_app.config.get("JSON_RESPONSE_WRITER", "direct") == "direct":
+            return json_writer
+    elif str(mime_type[0]) in VALID_XML_MIMETYPES:
+        if current_app.config.get("XML_RESPONSE_WRITER", "direct") == "direct":
+            return xml_writer
+    return None
+
+
 def _make_response(response, code=200, mime_type="text/html", **kwargs):
     """
      This is an example response header that we should aim at constructing for
@@ -179,11 +209,15 @@ def _make_response(response, code=200, mime_type="text/html", **kwargs):
     if not response:
         response = []
 
-    response_data = clean_dict(response)
+    # The direct writers drop the empty values while they encode the response
+    writer = _direct_writer(mime_type)
+    response_data = response if writer else clean_dict(response)
 
     content_location = kwargs.get("location")
     query_result = kwargs.get("query_result")
     count = kwargs.get("count")
+    bundle_type = kwargs.get("bundle_type")
+    links = kwargs.get("links")
 
     if query_result:
         query_result_dict = query_result._to_dict()
@@ -197,15 +231,28 @@ def _make_response(response, code=200, mime_type="text/html", **kwargs):
         data = [{"resource": resource} for resource in response_data]
         response_data = {"resourceType": "Bundle", "total": count, "entry": data}
 
+        if bundle_type:
+            response_data["type"] = bundle_type
+        if links:
+            response_data["link"] = [
+                {"relation": relation, "url": url} for relation, url in links.items()
+            ]
+
     if str(mime_type[0]) in VALID_XML_MIMETYPES:
         mime_type = "application/xml"
-        response_data = _response_to_xml(response_data)
+        if writer:
+            response_data = writer.dumps(response_data)
+        else:
+            response_data = _response_to_xml(response_data)
         api_response = Response(
             response_data, code, mimetype=mime_type, content_type=mime_type
         )
     elif str(mime_type[0]) in VALID_JSON_MIMETYPES:
         mime_type = "application/json"
-        response_data = json.dumps(response_data)
+        if writer:
+            response_data = writer.dumps(response_data)
+        else:
+            response_data = json.dumps(response_data, default=json_default)
         api_response = Response(
             response_data, code, mimetype=mime_type, content_type=mime_type
         )
@@ -258,6 +305,82 @@ def make_data_resp(data, resource, code=200, mime_type="text/html", **kwargs):
     return _make_response(data, code=code, mime_type=mime_type, **kwargs)
 
 
+def make_stream_resp(
+    stream, resource, mime_type="text/html", bundle_type=None, links=None, **kwargs
+):
+    """Respond with a Bundle of the resources of a `PageStream`.
+
+    JSON and XML Bundles are written one entry at a time as the rows are
+    read, so the response starts before the whole page is read and only one
+    entry is held at a time. The total and the links are only known once the
+    rows are read and close the Bundle. Other formats, and the responses of
+    disabled direct writers, are built from the whole page.
+
+    :param links: Returns the Bundle links, called once the rows are read
+    """
+    writer = _direct_writer(mime_type)
+    if not writer:
+        data = list(stream)
+        return make_data_resp(
+            data,
+            resource,
+            mime_type=mime_type,
+            count=stream.total,
+            bundle_type=bundle_type,
+            links=links and links(),
+            **kwargs
+        )
+
+    def entries():
+        for entry in stream:
+            data = entry._to_dict()
+            data["resourceType"] = resource.__tablename__
+            yield data
+
+    def tail():
+        members = {"total": stream.total}
+        if links:
+            members["link"] = [
+                {"relation": relation, "url": url} for relation, url in links().items()
+            ]
+        return members
+
+    def json_bundle():
+        head = {"resourceType": "Bundle", "type": bundle_type}
+        yield b"{" + json_writer.dumps_members(head) + b', "entry": ['
+
+        separator = b""
+        for data in entries():
+            yield separator + json_writer.dumps({"resource": data})
+            separator = b", "
+
+        members = json_writer.dumps_members(tail())
+        yield b"]" + (b", " + members if members else b"") + b"}"
+
+    def xml_bundle():
+        yield xml_writer.bundle_start({"type": bundle_type})
+        for data in entries():
+            yield xml_writer.bundle_entry(data)
+        yield xml_writer.bundle_end(tail())
+
+    if writer is json_writer:
+        mime_type, bundle = "application/json", json_bundle()
+    else:
+        mime_type, bundle = "application/xml", xml_bundle()
+
+    api_response = Response(
+        stream_with_context(bundle), 200, mimetype=mime_type, content_type=mime_type
+    )
+    api_response.headers["Content-Type"] = "{}; charset=utf-8".format(mime_type)
+    api_response.headers["Content-Location"] = kwargs.get("location")
+    return api_response
+
+
+def make_bundle_resp(bundle, code=200, mime_type="text/html", **kwargs):
+    """Respond with a Bundle built by the server e.g a transaction-response."""
+    return _make_response(bundle, code=code, mime_type=mime_type, **kwargs)
+
+
 def make_error_resp(error, msg=None, code=400, mime_type="text/html"):
     log = error
     try:
@@ -295,6 +418,36 @@ def make_exception_resp(exception, code=422, mime_type="text/html"):
         return make_error_resp(exception, code=code, mime_type=mime_type)
 
 
+def operation_outcome(
+    location,
+    code=None,
+    severity="error",
+    diagnostics=None,
+    expression=None,
+    details=None,
+):
+    """The OperationOutcome resource dict of a single issue."""
+    return {
+        "resourceType": "OperationOutcome",
+        "id": str(uuid.uuid4()),
+        "issue": [
+            {
+                "severity": severity,
+                "code": code,
+                "diagnostics": "{}".format(diagnostics),
+                "location": location,
+                "expression": expression,
+                "details": details,
+            }
+        ],
+        "text": {
+            "div": '<div xmlns="http://www.w3.org/1999/xhtml"><h1>Operation '
+            "Outcome</h1><p>{}</p></div>".format(diagnostics),
+            "status": "generated",
+        },
+    }
+
+
 def log_operation_outcome(
     location,
     code=None,
@@ -307,7 +460,10 @@ def log_operation_outcome(
     query_result=None,
 ):
     """
-    All Error/Exceptions/Responses are logged to an OperationOutcome Resource.
+    All Error/Exceptions/Responses are reported with an OperationOutcome.
+
+    The OperationOutcome is built in memory and is only persisted, outside of
+    the request, when the `OPERATION_OUTCOME_AUDIT` trail is enabled.
 
     :param location:
     :param code:
@@ -319,34 +475,21 @@ def log_operation_outcome(
     :param status_code: HTTP status code
     :param query_result: Result from an initial query to provide information
                         e.g meta versioning on deleting a resource.ss
-    :return operation outcome instance:
+    :return operation outcome response:
     """
-    data = {
-        "issue": [
-            {
-                "severity": severity,
-                "code": code,
-                "diagnostics": "{}".format(diagnostics),
-                "location": location,
-                "expression": expression,
-                "details": details,
-            }
-        ],
-        "text": {
-            "div": '<div xmlns="http://www.w3.org/1999/xhtml"><h1>Operation '
-            "Outcome</h1><p>{}</p></div>".format(diagnostics),
-            "status": "generated",
-        },
-    }
-    try:
-        outcome_response = OperationOutcome.create(**data)
-    except Exception as e:
-        return make_exception_resp(e.args, code=status_code, mime_type=mime_type)
-
-    return make_data_resp(
-        outcome_response,
-        OperationOutcome,
-        code=status_code,
-        mime_type=mime_type,
-        query_result=query_result,
+    outcome = operation_outcome(
+        location,
+        code=code,
+        severity=severity,
+        diagnostics=diagnostics,
+        expression=expression,
+        details=details,
+    )
+
+    audit = getattr(current_app, "outcome_audit", None)
+    if audit is not None:
+        audit.submit(outcome)
+
+    return _make_response(
+        outcome, code=status_code, mime_type=mime_type, query_result=query_result
     )
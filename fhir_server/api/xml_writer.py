@@ -0,0 +1,171 @@
+"""
+Write FHIR XML responses in a single pass.
+
+Primitive values are written as `value` attributes and the FHIR namespace is
+declared once on the root element, straight from the resource dict. As in
+`json_writer`, dict entries whose value is None or an empty dict are left out
+while writing, so responses do not go through `response.clean_dict`.
+
+Bundles can be written in parts with `bundle_start`, `bundle_entry` and
+`bundle_end` to stream their entries.
+"""
+
+FHIR_NAMESPACE = "http://hl7.org/fhir"
+
+
+def escape_text(value):
+    if "&" in value:
+        value = value.replace("&", "&amp;")
+    if "<" in value:
+        value = value.replace("<", "&lt;")
+    if ">" in value:
+        value = value.replace(">", "&gt;")
+    if "\r" in value:
+        # As an XML parser would read it
+        value = value.replace("\r\n", "\n").replace("\r", "\n")
+    return value
+
+
+def escape_attribute(value):
+    if "&" in value:
+        value = value.replace("&", "&amp;")
+    if "<" in value:
+        value = value.replace("<", "&lt;")
+    if ">" in value:
+        value = value.replace(">", "&gt;")
+    if '"' in value:
+        value = value.replace('"', "&quot;")
+    if "\r" in value:
+        value = value.replace("\r", "&#13;")
+    if "\n" in value:
+        value = value.replace("\n", "&#10;")
+    if "\t" in value:
+        value = value.replace("\t", "&#09;")
+    return value
+
+
+def to_text(value):
+    if isinstance(value, str):
+        return value
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    return str(value)
+
+
+def _write_children(data, out):
+    """Write the non empty entries of `data` as elements.
+
+    Returns False, with nothing written, when there is no entry to write.
+    """
+    mark = len(out)
+    for tag, value in data.items():
+        if value is None:
+            continue
+        if isinstance(value, dict):
+            start = len(out)
+            out.append("<" + tag + ">")
+            if _write_children(value, out):
+                out.append("</" + tag + ">")
+            else:
+                del out[start:]
+        elif isinstance(value, list):
+            for item in value:
+                _write_item(tag, item, out)
+        else:
+            out.append(
+                "<" + tag + ' value="' + escape_attribute(to_text(value)) + '" />'
+            )
+    return len(out) > mark
+
+
+def _write_item(tag, item, out):
+    """Write an entry of a list as one of the repeated `tag` elements."""
+    if isinstance(item, dict):
+        start = len(out)
+        out.append("<" + tag + ">")
+        if _write_children(item, out):
+            out.append("</" + tag + ">")
+        else:
+            # Empty entries are kept to preserve the positions
+            out[start] = "<" + tag + " />"
+    elif item is None or item == "":
+        out.append("<" + tag + " />")
+    else:
+        out.append("<" + tag + ">" + escape_text(to_text(item)) + "</" + tag + ">")
+
+
+def _write_resource(data, out, namespace):
+    resource_type = data["resourceType"]
+    if namespace:
+        out.append("<" + resource_type + ' xmlns="' + FHIR_NAMESPACE + '">')
+    else:
+        out.append("<" + resource_type + ">")
+
+    children = {key: value for key, value in data.items() if key != "resourceType"}
+    _write_children(children, out)
+    out.append("</" + resource_type + ">")
+
+
+def _encode(out):
+    return "".join(out).encode("ascii", "xmlcharrefreplace")
+
+
+def _write_bundle_start(members, out):
+    out.append('<Bundle xmlns="' + FHIR_NAMESPACE + '">')
+    _write_children(
+        {key: value for key, value in members.items() if key != "resourceType"}, out
+    )
+
+
+def _write_bundle_entry(entry, out):
+    out.append("<entry>")
+    for key, value in entry.items():
+        if key != "resource":
+            _write_children({key: value}, out)
+        elif value:
+            out.append("<resource>")
+            _write_resource(value, out, False)
+            out.append("</resource>")
+    out.append("</entry>")
+
+
+def dumps(data):
+    """Encode a resource or a Bundle dict to FHIR XML bytes.
+
+    The `resourceType` of a resource is its root element. The resources in
+    the entries of a Bundle are written as `<resource><Patient>...`.
+    """
+    out = []
+    if data.get("resourceType") == "Bundle":
+        members = {key: value for key, value in data.items() if key != "entry"}
+        _write_bundle_start(members, out)
+        for entry in data.get("entry") or []:
+            _write_bundle_entry(entry, out)
+        out.append("</Bundle>")
+    else:
+        _write_resource(data, out, True)
+    return _encode(out)
+
+
+def bundle_start(members):
+    """The opening tag of a Bundle followed by the `members` elements."""
+    out = []
+    _write_bundle_start(members, out)
+    return _encode(out)
+
+
+def bundle_entry(resource):
+    """An `entry` element of a Bundle holding `resource`."""
+    out = []
+    _write_bundle_entry({"resource": resource}, out)
+    return _encode(out)
+
+
+def bundle_end(members):
+    """The `members` elements written after the entries and the closing tag."""
+    out = []
+    _write_children(members, out)
+    out.append("</Bundle>")
+    return _encode(out)
@@ -1,3 +1,4 @@
+from functools import partial
 from http.client import HTTPException
 
 from flask import render_template
@@ -13,6 +14,8 @@ from fhir_server.resources import *
 from fhir_server.api import response as Response
 from fhir_server.api import *  # noqa
 from fhir_server.api.url_converters import FhirOperationsConverter
+from fhir_server.helpers.audit import OutcomeAuditSink, persist_outcomes
+from fhir_server.helpers.export import BulkExporter, register_export_task
 from fhir_server.oauth_server import *  # noqa
 
 # from fhir_server.resources.profiledOrg import DemoOrgResource1
@@ -123,6 +126,26 @@ def configure_extensions(app):
     # Celery
     celery = Celery(app.name, broker=app.config["CELERY_BROKER_URL"])
     celery.conf.update(app.config)
+    app.celery = celery
+
+    # Bulk `$export` parts run on a thread pool unless Celery is configured
+    use_celery = app.config.get("EXPORT_EXECUTOR") == "celery"
+    if use_celery:
+        export_task = register_export_task(celery, app)
+
+        def celery_submit(function, app, job_dir, resource_name, since):
+            return export_task.delay(job_dir, resource_name, since)
+
+    app.exporter = BulkExporter(app, submit=celery_submit if use_celery else None)
+
+    # OperationOutcome audit trail. Outcomes are written in the background
+    app.outcome_audit = None
+    if app.config.get("OPERATION_OUTCOME_AUDIT"):
+        app.outcome_audit = OutcomeAuditSink(
+            partial(persist_outcomes, app),
+            batch_size=app.config.get("OPERATION_OUTCOME_AUDIT_BATCH_SIZE", 100),
+            flush_interval=app.config.get("OPERATION_OUTCOME_AUDIT_INTERVAL", 5),
+        )
 
 
 def configure_blueprints(app, blueprints):
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -22,6 +23,28 @@ class BaseConfig(object):
     DOMAIN_NAME = "localhost:5000"
     API_ROOT = "api"
 
+    # "direct" writes JSON responses with `api.json_writer` and streams the
+    # search and history Bundles one entry at a time.
+    # "clean_dict" strips empty values first then encodes with `json.dumps`
+    JSON_RESPONSE_WRITER = "direct"
+    # "direct" writes XML responses in one pass with `api.xml_writer`.
+    # "xmltodict" renders them with xmltodict and normalizes with ElementTree
+    XML_RESPONSE_WRITER = "direct"
+
+    # Error responses are built in memory. Turn this on to also keep their
+    # OperationOutcome, written in batches by a background thread
+    OPERATION_OUTCOME_AUDIT = False
+    OPERATION_OUTCOME_AUDIT_BATCH_SIZE = 100
+    # Seconds an outcome waits before a partial batch is written
+    OPERATION_OUTCOME_AUDIT_INTERVAL = 5
+
+    # Bulk `$export` jobs write their NDJSON files under EXPORT_DIR. Each
+    # resource type is exported by its own worker, a thread of a pool of
+    # EXPORT_WORKERS threads or, with EXPORT_EXECUTOR = "celery", a Celery task
+    EXPORT_DIR = os.path.join(tempfile.gettempdir(), "fhir_exports")
+    EXPORT_EXECUTOR = "thread"
+    EXPORT_WORKERS = 4
+
 
 class DefaultConfig(BaseConfig):
     SITE_NAME = "GawanaFhirServer"
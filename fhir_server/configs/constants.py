@@ -1,5 +1,14 @@
 # PAGINATION PARAMS
 ITEMS_PER_PAGE = 10
+# Upper bound for a client provided `_count`
+MAX_ITEMS_PER_PAGE = 500
+# Rows fetched at a time from the server-side cursor of a streamed page
+STREAM_BATCH_SIZE = 100
+# "sql" writes the history rows of a flush with one INSERT ... SELECT of the
+# previous rows per table. "orm" builds a history object per changed resource
+HISTORY_BACKEND = "sql"
+# Records validated and copied at a time by a bulk import
+BULK_IMPORT_BATCH_SIZE = 1000
 
 VALID_XML_MIMETYPES = ["xml", "text/xml", "application/xml", "application/xml+fhir"]
 
@@ -54,6 +63,28 @@ ISSUE_SEVERITY_URL = VALUESETS_BASE_URL + "issue_severity/"
 ISSUE_TYPE_URL = VALUESETS_BASE_URL + "issue_type/"
 OPERATION_OUTCOME_URL = VALUESETS_BASE_URL + "operation_outcome/"
 
+# Valueset lookups are answered from an in-process cache of whole value sets.
+# Cached value sets expire after VALUESETS_CACHE_TTL seconds and the least
+# recently used ones are evicted beyond VALUESETS_CACHE_MAXSIZE entries.
+VALUESETS_CACHE_ENABLED = True
+VALUESETS_CACHE_TTL = 60 * 60
+VALUESETS_CACHE_MAXSIZE = 128
+
+# Digests of the narrative divs found valid, beyond which the least recently
+# validated ones are parsed again.
+NARRATIVE_CACHE_MAXSIZE = 4096
+
+# How the generated narrative (`text`) of a resource is maintained on write:
+# "eager" regenerates it on every insert and update, "cached" only writes it
+# when the generated div differs from the stored one and "lazy" does not
+# store it, resources without a narrative, or with a generated one, get it
+# rendered when serialized.
+NARRATIVE_STRATEGY = "cached"
+
+# "http" looks up codes on the valueset server at VALUESETS_BASE_URL while
+# "local" uses the embedded `valueset_server` engine in this process.
+VALUESETS_BACKEND = "http"
+
 UCUM_SYSTEM_URI = "http://unitsofmeasure.org"
 
 VALID_ATTACHMENT_EXTENSIONS = [
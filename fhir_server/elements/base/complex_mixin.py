@@ -3,6 +3,38 @@ from sqlalchemy.types import TypeDecorator
 
 from .cplxtype_validator import CompositeValidator
 
+# The trusted subclass of each composite namedtuple class
+_trusted_classes = {}
+
+
+class Trusted(object):
+    """Marks composite values read from the database.
+
+    They were validated when they were written, so binding one again, e.g.
+    when an UPDATE writes back an unchanged value or a version is copied to
+    a history table, does not run the `CompositeValidator` again. Trusted
+    values are namedtuples and are replaced, not modified, like any
+    composite value.
+    """
+
+    __slots__ = ()
+
+
+def trusted_class(type_cls):
+    """The subclass of a composite namedtuple class for trusted values."""
+    if type_cls not in _trusted_classes:
+
+        def _replace(self, **kwargs):
+            # A changed value is no longer trusted
+            return type_cls._make(self)._replace(**kwargs)
+
+        _trusted_classes[type_cls] = type(
+            type_cls.__name__,
+            (type_cls, Trusted),
+            {"__slots__": (), "_replace": _replace},
+        )
+    return _trusted_classes[type_cls]
+
 
 class PgComposite(CompositeType):
     """A composite type that creates a postgresql composite type field.
@@ -45,6 +77,59 @@ class PgComposite(CompositeType):
         http://sqlalchemy-utils.readthedocs.org/en/latest/
     """
 
+    def __init__(self, *args, **kwargs):
+        super(PgComposite, self).__init__(*args, **kwargs)
+        self.compile_plans()
+
+    def compile_plans(self):
+        """Compile how values of the type are composed, bound and read.
+
+        The nested composite and composite array columns are resolved once
+        here, so composing a value is a loop over the plan.
+        """
+        self.field_names = frozenset(col.name for col in self.columns)
+        self.composite_columns = [
+            col for col in self.columns if isinstance(col.type, PgComposite)
+        ]
+
+        # (name, compose) of each field, `compose` being None for the fields
+        # whose values are kept as they are
+        self.compose_plan = [
+            (col.name, self.composer(col.type)) for col in self.columns
+        ]
+
+        # (name, nullable, type, compose) of each field
+        self.bind_plan = [
+            (
+                col.name,
+                col.nullable,
+                col.type if isinstance(col.type, TypeDecorator) else None,
+                self.composer(col.type),
+            )
+            for col in self.columns
+        ]
+
+        self.trusted_cls = trusted_class(self.type_cls)
+
+        # (name, type) of the fields processed when reading a value
+        self.result_plan = [
+            (col.name, col.type)
+            for col in self.columns
+            if isinstance(col.type, TypeDecorator)
+        ]
+
+    @staticmethod
+    def composer(column_type):
+        """The function composing the values of a nested column type."""
+        if isinstance(column_type, PgComposite):
+            return column_type.compose
+
+        if isinstance(column_type, CompositeArray) and isinstance(
+            column_type.item_type, PgComposite
+        ):
+            return column_type.item_type.compose_array
+        return None
+
     def copy(self):
         """Produce a copy of this :class:`.PgComposite` instance.
 
@@ -56,134 +141,102 @@ class PgComposite(CompositeType):
         return instance
 
     def validate_col_data(self, values):
-        cols = []
-        for col in self.columns:
-            if isinstance(col.type, PgComposite):
-                cols.append(col)
-        CompositeValidator(self.name, cols, values)
+        CompositeValidator(self.name, self.composite_columns, values)
         return values
 
-    def nested_composite_array(self, column, values):
-        """compose a nested composite array type with values"""
-        if not isinstance(column.type.item_type, PgComposite):
-            return values
+    def compose(self, values):
+        """Compose a value of the type from a dict, nested values included.
 
+        Missing fields are None and unknown fields are rejected.
+        """
         if values is None:
             return None
 
-        fields = {col.name: col for col in column.type.item_type.columns}
-        new_value = []
-        for field, data in fields.items():
-            for i, val in enumerate(values):
-                if isinstance(values[i], tuple):
-                    values[i] = dict(values[i]._asdict())
-
-                if values[i]:  # pragma: no cover
-                    if not (field in values[i].keys()):
-                        values[i][field] = None
-
-                if isinstance(data.type, PgComposite):  # pragma: no cover
-                    values[i][field] = self.nested_composite(data, values[i][field])
-
-        # for val in values:
-        for i, val in enumerate(values):
-            if val:
-                for k, v in enumerate(val):
-                    if isinstance(val[v], list):
-                        # Added for list objects that are nested within a
-                        # complex element nested in a list of complex elements
-                        # e.g Patient -> Contact[] -> relationship[] -> coding[]
-                        col_type = fields[v]
-                        val[v] = self.nested_composite_array(col_type, val[v])
-
-            if values[i]:  # pragma: no cover
-                new_value.append(column.type.item_type.type_cls(**values[i]))
-
-        if len(new_value) > 0:  # pragma: no cover
-            new_value = new_value
-        else:  # pragma: no cover
-            new_value = None
-
-        return new_value
-
-    def nested_composite(self, column, values):
-        """compose a nested composite type with values"""
-
+        if isinstance(values, tuple):
+            values = values._asdict()
+        elif not self.field_names.issuperset(values):
+            unknown = sorted(set(values) - self.field_names)
+            raise TypeError("Unknown fields %s in %s" % (unknown, self.name))
+
+        get = values.get
+        return self.type_cls._make(
+            [
+                get(name) if compose is None else compose(get(name))
+                for name, compose in self.compose_plan
+            ]
+        )
+
+    def compose_array(self, values):
+        """Compose a list of values of the type, None when it is empty."""
         if values is None:
             return None
 
-        fields = {col.name: col for col in column.type.columns}
-        for field, data in fields.items():
-            if not (field in values.keys()):
-                values[field] = None
+        compose = self.compose
+        return [compose(value) for value in values if value] or None
 
-            if isinstance(data.type, CompositeArray):
-                values[field] = self.nested_composite_array(data, values[field])
+    def nested_composite_array(self, column, values):
+        """compose a nested composite array type with values"""
+        if not isinstance(column.type.item_type, PgComposite):
+            return values
+        return column.type.item_type.compose_array(values)
 
-            elif isinstance(data.type, PgComposite):
-                values[field] = self.nested_composite(data, values[field])
-        return (column.type).type_cls(**values)
+    def nested_composite(self, column, values):
+        """compose a nested composite type with values"""
+        return column.type.compose(values)
 
     def bind_processor(self, dialect):
+        plan = self.bind_plan
+        type_cls = self.type_cls
+
         def process(value):
             if value is None:
                 return None
 
-            new_value = []
+            is_dict = isinstance(value, dict)
             processed_value = []
             errors = []
-            for i, column in enumerate(self.columns):
+            for name, nullable, decorator, compose in plan:
                 try:
-                    if isinstance(value, dict):
-                        new_value.append(value[column.name])
-
-                    else:
-                        new_value.append(getattr(value, column.name))
+                    field = value[name] if is_dict else getattr(value, name)
                 except Exception:
                     # VALIDATE IF NULLABLE IS TRUE OR FALSE
-                    if not (column.nullable):
+                    if not nullable:
                         errors.append(
-                            "Field %s in column %s not nullable"
-                            % (column.name, self.name)
+                            "Field %s in column %s not nullable" % (name, self.name)
                         )
-                    new_value.append(None)
-
-                if isinstance(column.type, TypeDecorator):
-                    processed_value.append(
-                        column.type.process_bind_param(new_value[i], dialect)
-                    )
-                elif isinstance(column.type, PgComposite):
-                    val = self.nested_composite(column, new_value[i])
-                    processed_value.append(val)
+                    field = None
 
-                elif isinstance(column.type, CompositeArray):
-                    val = self.nested_composite_array(column, new_value[i])
-                    processed_value.append(val)
-
-                else:
-                    processed_value.append(new_value[i])
+                if decorator is not None:
+                    field = decorator.process_bind_param(field, dialect)
+                elif compose is not None:
+                    field = compose(field)
+                processed_value.append(field)
 
             if len(errors) > 0:
                 raise ValueError(errors)
 
-            result = self.validate_col_data(self.type_cls(*processed_value))
-            return result
+            if isinstance(value, Trusted):
+                return type_cls._make(processed_value)
+            return self.validate_col_data(type_cls._make(processed_value))
 
         return process
 
     def result_processor(self, dialect, coltype):
+        plan = self.result_plan
+        trusted_cls = self.trusted_cls
+
         def process(value):
             if value is None:
                 return None
-            cls = value.__class__
-            kwargs = {}
-            for column in self.columns:
-                if isinstance(column.type, TypeDecorator):
-                    kwargs[column.name] = column.type.process_result_value(
-                        getattr(value, column.name), dialect
-                    )
-                else:
-                    kwargs[column.name] = getattr(value, column.name)
-            return cls(**kwargs)
+            if not plan:
+                return trusted_cls._make(value)
+            return trusted_cls._make(
+                value._replace(
+                    **{
+                        name: type_.process_result_value(getattr(value, name), dialect)
+                        for name, type_ in plan
+                    }
+                )
+            )
 
         return process
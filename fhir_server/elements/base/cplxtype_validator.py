@@ -10,7 +10,7 @@ from pycountry import countries
 
 from fhir_server.configs.constants import SANCTIONED_CODE_URLS
 from fhir_server.helpers.validations import validate_valuesets
-from .xhtml_validator import xhtml_validator
+from .xhtml_validator import validate_xhtml
 from .reference_validator import validate_reference
 from fhir_server.configs import (
     ADDRESS_USE_URL,
@@ -338,9 +338,7 @@ class CompositeValidator(object):
         url = NARRATIVE_STATUS_URL + "?code=" + self.values.status
         validate_valuesets(self.values.status, url, "narrative status")
 
-        xhtml_validator.reset()
-        xhtml_validator.feed(self.values.div)
-        xhtml_validator.close()
+        validate_xhtml(self.values.div)
 
         return self.values
 
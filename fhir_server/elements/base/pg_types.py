@@ -3,6 +3,8 @@ import warnings
 from sqlalchemy.exc import StatementError
 from sqlalchemy.sql.expression import text
 
+from fhir_server.utils.search import register_search_functions
+
 
 def register_pg_types(session):
     try:  # pragma: no cover
@@ -657,4 +659,8 @@ def register_pg_types(session):
 
         session.commit()
     except StatementError as excinfo:
+        session.rollback()
         warnings.warn(excinfo.__repr__(), category=UserWarning, stacklevel=1)
+
+    # Search functions depend on the types above and are safe to re-create
+    register_search_functions(session)
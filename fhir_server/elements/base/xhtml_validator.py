@@ -1,121 +1,140 @@
+"""Validation of the XHTML of narratives.
+
+The div of a narrative may only use the tags and attributes of chapters
+7-11 (except section 4 of chapter 9) and 15 of the HTML 4.0 standard. Each
+thread parses with its own `XHTMLValidator` and the digests of the divs
+that were found valid are remembered, so a div, e.g. a generated narrative,
+is parsed once.
+"""
+import hashlib
 import re
+import threading
+from collections import OrderedDict
 from html.parser import HTMLParser
 
+from fhir_server.configs.constants import NARRATIVE_CACHE_MAXSIZE
+
+VALID_TAGS = frozenset(
+    [
+        "a",
+        "abbr",
+        "acronym",
+        "b",
+        "big",
+        "blockquote",
+        "br",
+        "caption",
+        "cite",
+        "code",
+        "col",
+        "colgroup",
+        "dd",
+        "dfn",
+        "div",
+        "dl",
+        "dt",
+        "em",
+        "h1",
+        "h2",
+        "h3",
+        "h4",
+        "h5",
+        "h6",
+        "hr",
+        "i",
+        "img",
+        "li",
+        "ol",
+        "p",
+        "pre",
+        "q",
+        "samp",
+        "small",
+        "span",
+        "strong",
+        "table",
+        "tbody",
+        "td",
+        "tfoot",
+        "th",
+        "thead",
+        "tr",
+        "tt",
+        "ul",
+        "var",
+    ]
+)
+
+VALID_ATTRS = frozenset(
+    [
+        "abbr",
+        "accesskey",
+        "align",
+        "alt",
+        "axis",
+        "bgcolor",
+        "border",
+        "cellhalign",
+        "cellpadding",
+        "cellspacing",
+        "cellvalign",
+        "char",
+        "charoff",
+        "charset",
+        "cite",
+        "class",
+        "colspan",
+        "compact",
+        "coords",
+        "dir",
+        "frame",
+        "headers",
+        "height",
+        "href",
+        "hreflang",
+        "hspace",
+        "id",
+        "lang",
+        "longdesc",
+        "name",
+        "nowrap",
+        "rel",
+        "rev",
+        "rowspan",
+        "rules",
+        "scope",
+        "shape",
+        "span",
+        "src",
+        "start",
+        "style",
+        "summary",
+        "tabindex",
+        "title",
+        "type",
+        "valign",
+        "value",
+        "vspace",
+        "width",
+        "img",
+        "xmlns",
+    ]
+)
+
+BLANK = re.compile(r"^\s*$")
+
 
 class XHTMLValidator(HTMLParser):
     def handle_starttag(self, tag, attrs):
         errors = []
-        valid_tags = [
-            "a",
-            "abbr",
-            "acronym",
-            "b",
-            "big",
-            "blockquote",
-            "br",
-            "caption",
-            "cite",
-            "code",
-            "col",
-            "colgroup",
-            "dd",
-            "dfn",
-            "div",
-            "dl",
-            "dt",
-            "em",
-            "h1",
-            "h2",
-            "h3",
-            "h4",
-            "h5",
-            "h6",
-            "hr",
-            "i",
-            "img",
-            "li",
-            "ol",
-            "p",
-            "pre",
-            "q",
-            "samp",
-            "small",
-            "span",
-            "strong",
-            "table",
-            "tbody",
-            "td",
-            "tfoot",
-            "th",
-            "thead",
-            "tr",
-            "tt",
-            "ul",
-            "var",
-            "img",
-            "div",
-        ]
-        valid_attrs = [
-            "abbr",
-            "accesskey",
-            "align",
-            "alt",
-            "axis",
-            "bgcolor",
-            "border",
-            "cellhalign",
-            "cellpadding",
-            "cellspacing",
-            "cellvalign",
-            "char",
-            "charoff",
-            "charset",
-            "cite",
-            "class",
-            "colspan",
-            "compact",
-            "coords",
-            "dir",
-            "frame",
-            "headers",
-            "height",
-            "href",
-            "hreflang",
-            "hspace",
-            "id",
-            "lang",
-            "longdesc",
-            "name",
-            "nowrap",
-            "rel",
-            "rev",
-            "rowspan",
-            "rules",
-            "scope",
-            "shape",
-            "span",
-            "src",
-            "start",
-            "style",
-            "summary",
-            "tabindex",
-            "title",
-            "type",
-            "valign",
-            "value",
-            "vspace",
-            "width",
-            "img",
-            "xmlns",
-        ]
         for attr in attrs:
-            if not (attr[0] in valid_attrs):
+            if not (attr[0] in VALID_ATTRS):
                 errors.append(
                     "The attribute %s is not valid in chapters 7-11 (except "
                     "section 4 of chapter 9) and 15 of the HTML 4.0 standard" % attr[0]
                 )
 
-        if not (tag in valid_tags):
+        if not (tag in VALID_TAGS):
             errors.append(
                 "The tag %s is not valid in chapters 7-11 (except section "
                 "4 of chapter 9) and 15 of the HTML 4.0 standard" % tag
@@ -126,9 +145,65 @@ class XHTMLValidator(HTMLParser):
 
     def handle_data(self, data):
         # check that narrative content has some whitespaces i.e not blank
-        pattern = re.compile("^\s*$")
-        if re.search(pattern, data):
+        if BLANK.search(data):
             raise TypeError("narrative content must not be an empty string")
 
 
-xhtml_validator = XHTMLValidator()
+class ValidatedDivs(object):
+    """The digests of the most recently validated divs."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.digests = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, digest):
+        with self.lock:
+            if digest not in self.digests:
+                return False
+            self.digests.move_to_end(digest)
+            return True
+
+    def add(self, digest):
+        with self.lock:
+            self.digests[digest] = True
+            self.digests.move_to_end(digest)
+            while len(self.digests) > self.maxsize:
+                self.digests.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.digests.clear()
+
+
+validated_divs = ValidatedDivs(NARRATIVE_CACHE_MAXSIZE)
+_parsers = threading.local()
+
+
+def thread_parser():
+    """The `XHTMLValidator` of the current thread."""
+    parser = getattr(_parsers, "parser", None)
+    if parser is None:
+        parser = _parsers.parser = XHTMLValidator()
+    return parser
+
+
+def validate_xhtml(div):
+    """Raise a TypeError if the div of a narrative is not valid XHTML."""
+    if not isinstance(div, str):
+        raise TypeError("narrative div must be a string")
+
+    digest = hashlib.sha1(div.encode("utf-8")).digest()
+    if digest in validated_divs:
+        return
+
+    parser = thread_parser()
+    parser.reset()
+    try:
+        parser.feed(div)
+        parser.close()
+    finally:
+        # Drop the rest of a rejected div
+        parser.reset()
+
+    validated_divs.add(digest)
@@ -1,8 +1,9 @@
 from sqlalchemy import Column
+from sqlalchemy_utils import CompositeArray
 
-from fhir_server.elements.base.complex_mixin import PgComposite
+from fhir_server.elements.base.complex_mixin import PgComposite, Trusted
 from fhir_server.elements import primitives
-from fhir_server.elements.opentype import OpenType
+from fhir_server.elements.opentype import OpenType, validate_extension_values
 
 
 class Extension(object):
@@ -20,3 +21,52 @@ class Extension(object):
 
 
 ElementExtension = Extension()
+
+
+class ExtensionArray(CompositeArray):
+    """An array of extensions whose values are validated in bulk.
+
+    Binding the items one by one validates the value of each extension on
+    its own; here the values of all the items are validated in one call and
+    the items are then composed without validating them again.
+
+    Example usage::
+        extension = Column(ExtensionArray(ElementExtension()))
+    """
+
+    def bind_processor(self, dialect):
+        item_type = self.item_type
+        type_cls = item_type.type_cls
+        missing_url = "Field url in column %s not nullable" % item_type.name
+
+        def process(values):
+            if values is None:
+                return None
+
+            items = []
+            pending = []
+            for value in values:
+                if value is None:
+                    items.append(None)
+                    continue
+
+                if isinstance(value, dict):
+                    if "url" not in value:
+                        raise ValueError([missing_url])
+                    url, data = value["url"], value.get("value")
+                else:
+                    url, data = value.url, value.value
+
+                if not isinstance(value, Trusted):
+                    pending.append(data)
+                items.append((url, data))
+
+            validate_extension_values(pending)
+            return [
+                None
+                if item is None
+                else type_cls._make([item[0], OpenType.serialize(item[1])])
+                for item in items
+            ]
+
+        return process
@@ -1,9 +1,123 @@
-from jsonschema import validate
+"""Open typed `value[x]` of extensions, stored as JSONB.
 
+The extension schema is compiled to a validator once, at import. A value of
+the common `{"valueString": "..."}` shape, a single `value[x]` key of the
+right JSON type, is accepted without running the validator.
+"""
 import json
+
+from jsonschema import Draft4Validator
 from sqlalchemy.dialects import postgresql
 from sqlalchemy import TypeDecorator
 
+# The JSON type of each `value[x]`. Notice that the data types in this
+# server go beyond the schema definition. Example: Here uri is defined as a
+# string field but the server validates this as a URI field.
+VALUE_TYPES = {
+    "valueBoolean": "boolean",
+    "valueInteger": "integer",
+    "valueDecimal": "integer",
+    "valueBase64Binary": "string",
+    "valueInstant": "string",
+    "valueString": "string",
+    "valueUri": "string",
+    "valueDate": "string",
+    "valueDateTime": "string",
+    "valueTime": "string",
+    "valueCode": "string",
+    "valueOid": "string",
+    "valueId": "string",
+    "valueUnsignedInt": "integer",
+    "valuePositiveInt": "integer",
+    "valueMarkdown": "string",
+    "valueAnnotation": "object",
+    "valueAttachment": "object",
+    "valueIdentifier": "object",
+    "valueCodeableConcept": "object",
+    "valueCoding": "object",
+    "valueQuantity": "object",
+    "valueRange": "object",
+    "valuePeriod": "object",
+    "valueRatio": "object",
+    "valueSampledData": "object",
+    "valueSignature": "object",
+    "valueHumanName": "object",
+    "valueAddress": "object",
+    "valueContactPoint": "object",
+    "valueTiming": "object",
+    "valueReference": "object",
+    "valueMeta": "object",
+}
+
+# Python types accepted for a JSON type without running the validator
+FAST_TYPES = {"string": str, "object": dict}
+
+EXTENSION_SCHEMA = {
+    "description": "schema validating extensions type in FHIR",
+    "definitions": {
+        "valueX": {
+            "type": "object",
+            "properties": {
+                name: {"type": json_type} for name, json_type in VALUE_TYPES.items()
+            },
+            "additionalProperties": False,
+        },
+        "nestedExtension": {
+            "type": "object",
+            "properties": {
+                "url": {"type": "string"},
+                "extension": {"type": "array"},
+            },
+            "required": ["url"],
+            "additionalProperties": False,
+        },
+    },
+    "oneOf": [
+        {"$ref": "#/definitions/valueX"},
+        {"$ref": "#/definitions/nestedExtension"},
+    ],
+}
+
+# Validates a list of values in a single call
+EXTENSION_LIST_SCHEMA = {
+    "definitions": EXTENSION_SCHEMA["definitions"],
+    "type": "array",
+    "items": {"oneOf": EXTENSION_SCHEMA["oneOf"]},
+}
+
+Draft4Validator.check_schema(EXTENSION_LIST_SCHEMA)
+extension_validator = Draft4Validator(EXTENSION_LIST_SCHEMA)
+
+
+def _is_simple_value(value):
+    """True for a dict of a single `value[x]` of the expected type."""
+    if len(value) != 1:
+        return False
+
+    (name, item), = value.items()
+    json_type = VALUE_TYPES.get(name)
+    if json_type == "integer":
+        return isinstance(item, int) and not isinstance(item, bool)
+    if json_type == "boolean":
+        return isinstance(item, bool)
+    return json_type is not None and isinstance(item, FAST_TYPES[json_type])
+
+
+def validate_extension_values(values):
+    """Validate the extension values of a list in one pass.
+
+    :raises ValueError: If a value is invalid
+    """
+    pending = [
+        value
+        for value in values
+        if value is not None
+        and not isinstance(value, str)
+        and not (isinstance(value, dict) and _is_simple_value(value))
+    ]
+    if pending and not extension_validator.is_valid(pending):
+        raise ValueError("The data provided for the extensions field is invalid")
+
 
 class OpenType(TypeDecorator):
 
@@ -40,85 +154,21 @@ class OpenType(TypeDecorator):
 
     def process_bind_param(self, value, dialect):
         """
-        The schema variable defined here is used to constrain the field names
-        and also naively constrain the data types. Notice that the data types
-        in this server go beyond the schema definition. Example: Here uri is
-        defined as a string field but the server validates this as a URI field.
+        The extension schema constrains the field names and also naively
+        constrains the data types, see `VALUE_TYPES`.
         (jsonschema)[https://pypi.python.org/pypi/jsonschema] is used.
 
         :param value:
         :param dialect:
         :return: valid value:
         """
-        schema = {
-            "description": "schema validating extensions type in FHIR",
-            "definition1": {
-                "valueX": {
-                    "type": "object",
-                    "properties": {
-                        "valueBoolean": {"type": "boolean"},
-                        "valueInteger": {"type": "integer"},
-                        "valueDecimal": {"type": "integer"},
-                        "valueBase64Binary": {"type": "string"},
-                        "valueInstant": {"type": "string"},
-                        "valueString": {"type": "string"},
-                        "valueUri": {"type": "string"},
-                        "valueDate": {"type": "string"},
-                        "valueDateTime": {"type": "string"},
-                        "valueTime": {"type": "string"},
-                        "valueCode": {"type": "string"},
-                        "valueOid": {"type": "string"},
-                        "valueId": {"type": "string"},
-                        "valueUnsignedInt": {"type": "integer"},
-                        "valuePositiveInt": {"type": "integer"},
-                        "valueMarkdown": {"type": "string"},
-                        "valueAnnotation": {"type": "object"},
-                        "valueAttachment": {"type": "object"},
-                        "valueIdentifier": {"type": "object"},
-                        "valueCodeableConcept": {"type": "object"},
-                        "valueCoding": {"type": "object"},
-                        "valueQuantity": {"type": "object"},
-                        "valueRange": {"type": "object"},
-                        "valuePeriod": {"type": "object"},
-                        "valueRatio": {"type": "object"},
-                        "valueSampledData": {"type": "object"},
-                        "valueSignature": {"type": "object"},
-                        "valueHumanName": {"type": "object"},
-                        "valueAddress": {"type": "object"},
-                        "valueContactPoint": {"type": "object"},
-                        "valueTiming": {"type": "object"},
-                        "valueReference": {"type": "object"},
-                        "valueMeta": {"type": "object"},
-                    },
-                    "additionalProperties": False,
-                }
-            },
-            "definition2": {
-                "nestedExtension": {
-                    "type": "object",
-                    "properties": {
-                        "url": {"type", "string"},
-                        "extension": {"type": "array"},
-                    },
-                    "required": ["url"],
-                    "additionalProperties": False,
-                }
-            },
-            "oneOf": [
-                {"$ref": "#definition1/valueX"},
-                {"$ref": "#definition2/nestedExtension"},
-            ],
-        }
+        validate_extension_values([value])
+        return self.serialize(value)
 
+    @staticmethod
+    def serialize(value):
+        """The JSON text of a value validated beforehand."""
         if value is not None:
-            if not isinstance(value, str):
-                try:
-                    validate(value, schema)
-                except Exception:
-                    raise ValueError(
-                        "The data provided for the extensions field is invalid"
-                    )
-
             value = json.dumps(value)
         return value
 
@@ -1,22 +1,196 @@
 import sys
 from decimal import Decimal
+from functools import lru_cache
 import re
 import pytz
-from datetime import time, datetime
-from time import gmtime, strftime
+from bisect import bisect_right
+from datetime import time, datetime, timedelta
 import base64
 import bleach
 from sqlalchemy import types
 
 
+@lru_cache(maxsize=None)
+def compile_regex(regex):
+    return re.compile(regex)
+
+
 def regex_checker(some_str, regex):
-    pattern = re.compile(regex)
+    pattern = compile_regex(regex)
     if pattern.fullmatch(str(some_str)):
         return True
     else:
         return False
 
 
+class PrimitivePattern(object):
+    """A FHIR primitive type regex, compiled once and shared by all fields."""
+
+    def __init__(self, name, regex):
+        self.name = name
+        self.regex = regex
+        self.fullmatch = compile_regex(regex).fullmatch
+
+    def match(self, value):
+        return self.fullmatch(str(value)) is not None
+
+    def validate_many(self, values):
+        """Return the values in an array that do not match the pattern."""
+        fullmatch = self.fullmatch
+        return [
+            value
+            for value in values
+            if value is not None and fullmatch(str(value)) is None
+        ]
+
+
+PRIMITIVE_PATTERNS = {
+    pattern.name: pattern
+    for pattern in [
+        PrimitivePattern("id", r"[A-Za-z0-9\-\.]{1,64}"),
+        PrimitivePattern("code", r"[^\s]+([\s]+[^\s]+)*"),
+        PrimitivePattern("oid", r"urn:oid:[0-2](\.[1-9]\d*)+"),
+        PrimitivePattern(
+            "time", r"([01][0-9]|2[0-3]):[0-5][0-9]:[0-5][0-9](\.[0-9]+)?"
+        ),
+        PrimitivePattern(
+            "date", r"-?[0-9]{4}(-(0[1-9]|1[0-2])(-(0[0-9]|[1-2][0-9]|3[0-1]))?)?"
+        ),
+        PrimitivePattern(
+            "dateTime",
+            r"-?[0-9]{4}(-(0[1-9]|1[0-2])(-(0[0-9]|[1-2][0-9]|3[0-1])"
+            r"(T([01][0-9]|2[0-3]):[0-5][0-9](:[0-5][0-9])?(\.[0-9]+)?"
+            r"(Z|(\+|-)((0[0-9]|1[0-3]):[0-5][0-9]|14:00)))?)?)?",
+        ),
+        PrimitivePattern(
+            "instant",
+            r"-?[0-9]{4}(-(0[1-9]|1[0-2])(-(0[0-9]|[1-2][0-9]|3[0-1])"
+            r"T([01][0-9]|2[0-3]):[0-5][0-9](:[0-5][0-9])?(\.[0-9]+)?"
+            r"(Z|(\+|-))((0[0-9]|1[0-3])[0-5][0-9]|1400)?)?)?",
+        ),
+    ]
+}
+
+CODE_WHITESPACES = compile_regex(r"(\s\s)+")
+
+
+def validate_many(values, primitive):
+    """Validate an array of values against a FHIR primitive type at once.
+
+    :param values: A list of values e.g the items of a CompositeArray
+    :param primitive: The primitive name in `PRIMITIVE_PATTERNS` e.g `id`
+    :return the values if they are all valid:
+    """
+    if not values:
+        return values
+
+    invalid = PRIMITIVE_PATTERNS[primitive].validate_many(values)
+    if len(invalid) > 0:
+        raise TypeError(
+            "{0} are invalid values for the fhir {1} field".format(invalid, primitive)
+        )
+    return values
+
+
+class PatternValidated(object):
+    """Vectorized validation for fields backed by a `PrimitivePattern`."""
+
+    pattern = None
+
+    def validate_many(self, values):
+        return validate_many(values, self.pattern.name)
+
+
+class LocalTimeIndex(object):
+    """Local times that are ambiguous or non-existent in some timezone.
+
+    Every utc offset change of every timezone in `pytz.all_timezones` is
+    turned, once, into a window of local wall clock times. A fall back
+    transition makes the window ambiguous and a spring forward transition
+    makes it non-existent. The windows are kept sorted so finding the ones
+    containing a datetime is a binary search.
+
+    Transitions that are close to another transition (pytz only looks a day
+    either side of a local time) get a wider window. Datetimes falling in a
+    window are confirmed against that timezone with `tz.localize` so the
+    results are the same as localizing in all the timezones.
+    """
+
+    margin = timedelta(days=3)
+
+    def __init__(self, zones=None):
+        self.zones = list(pytz.all_timezones if zones is None else zones)
+        self.starts = []
+        self.windows = []
+        self.max_width = timedelta(0)
+        self._build()
+
+    def _zone_windows(self, tz):
+        utc_times = getattr(tz, "_utc_transition_times", None) or []
+        infos = getattr(tz, "_transition_info", None) or []
+
+        for i in range(1, len(utc_times)):
+            before, after = infos[i - 1][0], infos[i][0]
+            if before == after:
+                continue
+
+            transition = utc_times[i]
+            isolated = (transition - utc_times[i - 1] > self.margin) and (
+                i + 1 == len(utc_times) or utc_times[i + 1] - transition > self.margin
+            )
+            if isolated:
+                yield transition + min(before, after), transition + max(before, after)
+            else:
+                try:
+                    yield transition - self.margin, transition + self.margin
+                except OverflowError:  # pragma: no cover
+                    yield datetime.min, datetime.max
+
+    def _build(self):
+        windows = []
+        for zone in self.zones:
+            tz = pytz.timezone(zone)
+            for start, end in self._zone_windows(tz):
+                windows.append((start, end, tz))
+
+        windows.sort(key=lambda window: window[0])
+        self.windows = windows
+        self.starts = [window[0] for window in windows]
+        self.max_width = max(
+            [end - start for start, end, tz in windows], default=timedelta(0)
+        )
+
+    def candidates(self, date_obj):
+        """Timezones with a transition window containing `date_obj`."""
+        try:
+            lowest = date_obj - self.max_width
+        except OverflowError:
+            lowest = datetime.min
+
+        first = bisect_right(self.starts, lowest)
+        last = bisect_right(self.starts, date_obj)
+        for start, end, tz in self.windows[first:last]:
+            if date_obj < end:
+                yield tz
+
+    def check(self, date_obj):
+        """Raise an error if `date_obj` is ambiguous or non-existent."""
+        if date_obj.tzinfo is not None or not (
+            datetime.min + self.margin < date_obj < datetime.max - self.margin
+        ):
+            # Aware datetimes and the edges of the datetime range can not be
+            # localized in a timezone. Check them the slow way.
+            zones = map(pytz.timezone, self.zones)
+        else:
+            zones = self.candidates(date_obj)
+
+        for tz in zones:
+            tz.localize(date_obj, is_dst=None)
+
+
+local_time_index = LocalTimeIndex()
+
+
 def validate_local_times(value):
     date_obj = value
     seperator = ["+", "-", "Z"]
@@ -36,15 +210,12 @@ def validate_local_times(value):
             pass
 
     if isinstance(date_obj, datetime):
-        strftime("%Z", gmtime())
-        for zone in pytz.all_timezones:
-            tz = pytz.timezone(zone)
-            try:
-                tz.localize(date_obj, is_dst=None)
-            except Exception:
-                raise pytz.exceptions.AmbiguousTimeError(
-                    "Ambiguous Time Error for %s" % value
-                )
+        try:
+            local_time_index.check(date_obj)
+        except Exception:
+            raise pytz.exceptions.AmbiguousTimeError(
+                "Ambiguous Time Error for %s" % value
+            )
 
 
 class BooleanField(types.TypeDecorator):
@@ -157,7 +328,7 @@ class StringField(types.TypeDecorator):
         return value
 
 
-class InstantField(types.TypeDecorator):
+class InstantField(PatternValidated, types.TypeDecorator):
     """ An instant in time - known at least to the second and always
     includes a time zone.
 
@@ -169,19 +340,14 @@ class InstantField(types.TypeDecorator):
     """
 
     impl = types.DateTime(timezone=True)
+    pattern = PRIMITIVE_PATTERNS["instant"]
 
     def process_bind_param(self, value, dialect):
-        regex = (
-            "-?[0-9]{4}(-(0[1-9]|1[0-2])(-(0[0-9]|[1-2][0-9]|3[0-1])"
-            "T([01][0-9]|2[0-3]):[0-5][0-9](:[0-5][0-9])?(\.[0-9]+)?"
-            "(Z|(\+|-))((0[0-9]|1[0-3])[0-5][0-9]|1400)?)?)?"
-        )
-
         if value is not None:
             if isinstance(value, datetime):
                 value = datetime.strftime(value, "%Y-%m-%dT%H:%M:%S%z")
 
-            if not (regex_checker(value, regex)):
+            if not (self.pattern.match(value)):
                 raise TypeError("The Instant %s is invalid" % value)
 
         return value
@@ -191,7 +357,7 @@ class InstantField(types.TypeDecorator):
         return value
 
 
-class DateField(types.TypeDecorator):
+class DateField(PatternValidated, types.TypeDecorator):
     """
     A date, or partial date (e.g. just year or year + month) as used
     in human communication.
@@ -201,12 +367,11 @@ class DateField(types.TypeDecorator):
     """
 
     impl = types.Date
+    pattern = PRIMITIVE_PATTERNS["date"]
 
     def process_bind_param(self, value, dialect):
-        regex = "-?[0-9]{4}(-(0[1-9]|1[0-2])(-(0[0-9]|[1-2][0-9]|3[0-1]))?)?"
-
         if value is not None:
-            if not (regex_checker(value, regex)):
+            if not (self.pattern.match(value)):
                 raise TypeError("The Date %s is invalid" % value)
 
         return value
@@ -216,7 +381,7 @@ class DateField(types.TypeDecorator):
         return value
 
 
-class DateTimeField(types.TypeDecorator):
+class DateTimeField(PatternValidated, types.TypeDecorator):
     """ A date, date-time or partial date (e.g. just year or year + month)
     as used in human communication.
 
@@ -227,16 +392,11 @@ class DateTimeField(types.TypeDecorator):
     """
 
     impl = types.DateTime(timezone=True)
+    pattern = PRIMITIVE_PATTERNS["dateTime"]
 
     def process_bind_param(self, value, dialect):
-        regex = (
-            "-?[0-9]{4}(-(0[1-9]|1[0-2])(-(0[0-9]|[1-2][0-9]|3[0-1])"
-            "(T([01][0-9]|2[0-3]):[0-5][0-9](:[0-5][0-9])?(\.[0-9]+)?"
-            "(Z|(\+|-)((0[0-9]|1[0-3]):[0-5][0-9]|14:00)))?)?)?"
-        )
-
         if value is not None:
-            if not (regex_checker(value, regex)):
+            if not (self.pattern.match(value)):
                 raise TypeError("The DateTime %s is invalid" % value)
 
             validate_local_times(value)
@@ -248,7 +408,7 @@ class DateTimeField(types.TypeDecorator):
         return value
 
 
-class TimeField(types.TypeDecorator):
+class TimeField(PatternValidated, types.TypeDecorator):
     """ A time during the day, with no date specified (can be converted
     to a Duration since midnight). Seconds must be provided due to schema
     type constraints but may be zero-filled and may be ignored. The time
@@ -256,9 +416,9 @@ class TimeField(types.TypeDecorator):
     """
 
     impl = types.Time
+    pattern = PRIMITIVE_PATTERNS["time"]
 
     def process_bind_param(self, value, dialect):
-        regex = "([01][0-9]|2[0-3]):[0-5][0-9]:[0-5][0-9](\.[0-9]+)?"
         res_value = value
 
         if value is not None:
@@ -276,7 +436,7 @@ class TimeField(types.TypeDecorator):
                 )
 
             else:
-                if not (regex_checker(res_value, regex)):
+                if not (self.pattern.match(res_value)):
                     raise TypeError("The Time %s is invalid" % value)
 
         return res_value
@@ -310,24 +470,24 @@ class URIField(types.UserDefinedType):
         return process
 
 
-class OIDField(URIField):
+class OIDField(PatternValidated, URIField):
     """
     An OID represented as a URI (RFC 3001): urn:oid:1.2.3.4.5
     """
 
+    pattern = PRIMITIVE_PATTERNS["oid"]
+
     def bind_processor(self, dialect):
         def process(value):
-            regex = "urn:oid:[0-2](\.[1-9]\d*)+"
-
             if value is not None:
-                if not (regex_checker(value, regex)):
+                if not (self.pattern.match(value)):
                     raise TypeError("This OID is invalid")
             return value
 
         return process
 
 
-class IdField(types.TypeDecorator):
+class IdField(PatternValidated, types.TypeDecorator):
     """
     Any combination of upper or lower case ASCII letters
     ('A'..'Z', and 'a'..'z', numerals ('0'..'9'), '-' and '.', with a length
@@ -336,10 +496,9 @@ class IdField(types.TypeDecorator):
     """
 
     impl = types.UnicodeText
+    pattern = PRIMITIVE_PATTERNS["id"]
 
     def process_bind_param(self, value, dialect):
-        regex = "[A-Za-z0-9\-\.]{1,64}"
-
         if value is not None:
             if len(value) > 64:
                 raise ValueError("Id field cannot be more than 64 characters")
@@ -347,7 +506,7 @@ class IdField(types.TypeDecorator):
             if len(value) < 1:
                 raise ValueError("Id must have at least 1 character")
 
-            if not (regex_checker(value, regex)):
+            if not (self.pattern.match(value)):
                 raise TypeError("Id: {} is not a valid id".format(value))
 
         return value
@@ -357,7 +516,7 @@ class IdField(types.TypeDecorator):
         return value
 
 
-class CodeField(StringField):
+class CodeField(PatternValidated, StringField):
     """
     Indicates that the value is taken from a set of controlled strings defined
     elsewhere (see Using codes for further discussion). Technically, a code is
@@ -366,18 +525,19 @@ class CodeField(StringField):
     spaces in the contents
     """
 
+    pattern = PRIMITIVE_PATTERNS["code"]
+
     def process_bind_param(self, value, dialect):
         size = sys.getsizeof(value)  # Returns size of the string in bytes
-        regex = "[^\s]+([\s]+[^\s]+)*"
 
         if value is not None:
             if size > 1_048_576:
                 raise TypeError("Code value must not exceed 1MB")
 
-            if not (regex_checker(value, regex)):
+            if not (self.pattern.match(value)):
                 raise TypeError(f"This Code: {value} is invalid")
 
-            if re.search(r"(\s\s)+", value):
+            if CODE_WHITESPACES.search(value):
                 raise TypeError(
                     "Code must not have a whitespace more " "than a single character"
                 )
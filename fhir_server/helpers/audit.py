@@ -0,0 +1,177 @@
+"""Optional audit trail of the OperationOutcomes sent to clients.
+
+OperationOutcome responses are built in memory. When the audit trail is
+enabled (`OPERATION_OUTCOME_AUDIT`) the outcomes are queued and a background
+thread writes them in batches, one transaction per batch, so that an error
+response never waits on the database.
+"""
+import atexit
+import copy
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Queued when the sink is stopped to wake the background thread up
+_STOP = object()
+
+
+def persist_outcomes(app, outcomes):
+    """Insert OperationOutcome resources in a single transaction."""
+    from fhir_server.configs.database import db
+    from fhir_server.resources import OperationOutcome
+
+    with app.app_context():
+        try:
+            for outcome in outcomes:
+                data = {
+                    key: value
+                    for key, value in outcome.items()
+                    if key != "resourceType"
+                }
+                db.session.add(OperationOutcome(**data))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+
+
+class OutcomeAuditSink(object):
+    """Queue OperationOutcomes and write them in batches from a thread.
+
+    A batch is written once `batch_size` outcomes are queued or when an
+    outcome has waited `flush_interval` seconds. Outcomes submitted while the
+    queue holds `maxsize` outcomes are dropped and counted in `dropped`.
+
+    Example usage::
+        sink = OutcomeAuditSink(partial(persist_outcomes, app))
+        sink.submit(outcome)
+    """
+
+    def __init__(self, writer, batch_size=100, flush_interval=5.0, maxsize=10000):
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+        self._queue = queue.Queue(maxsize)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+        atexit.register(self.stop)
+
+    def _ensure_started(self):
+        # A thread started before a worker process is forked does not run in
+        # the worker so the thread is started by the process that submits
+        if self._thread is not None and self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._run, name="outcome-audit", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, outcome):
+        """Queue a copy of an outcome dict. Returns False if it was dropped."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(copy.deepcopy(outcome))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def _next_batch(self, timeout):
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            if deadline is not None:
+                timeout = max(0, deadline - time.monotonic())
+            try:
+                outcome = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+
+            if outcome is _STOP:
+                break
+            batch.append(outcome)
+
+            if deadline is None:
+                # The first outcome of a batch waits at most `flush_interval`
+                # seconds
+                deadline = time.monotonic() + self.flush_interval
+        return batch
+
+    def _write(self, batch):
+        try:
+            self.writer(batch)
+            self.written += len(batch)
+        except Exception:
+            self.failed += len(batch)
+            logger.exception("Failed to write %s OperationOutcomes", len(batch))
+
+    def _run(self):
+        while not self._stopping:
+            batch = self._next_batch(timeout=self.flush_interval)
+            if batch:
+                self._write(batch)
+
+    def flush(self):
+        """Write the queued outcomes from the calling thread."""
+        batch = []
+        while True:
+            try:
+                outcome = self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if outcome is _STOP:
+                continue
+            batch.append(outcome)
+
+            if len(batch) == self.batch_size:
+                self._write(batch)
+                batch = []
+
+        if batch:
+            self._write(batch)
+
+    def stop(self, timeout=10):
+        """Stop the background thread and write what is left in the queue.
+
+        The thread is joined first, for at most `timeout` seconds, so that
+        the batch it has taken is written before the rest of the queue.
+        """
+        self._stopping = True
+
+        thread = self._thread
+        if (
+            thread is not None
+            and self._pid == os.getpid()
+            and thread is not threading.current_thread()
+        ):
+            try:
+                self._queue.put_nowait(_STOP)
+            except queue.Full:
+                # The thread takes the queued outcomes and then stops
+                pass
+
+            thread.join(timeout)
+            if thread.is_alive():
+                logger.warning(
+                    "The OperationOutcome audit thread did not stop in %ss", timeout
+                )
+
+        self.flush()
@@ -0,0 +1,219 @@
+"""Asynchronous bulk `$export` of resources to NDJSON files.
+
+An export job is a directory under `EXPORT_DIR`. Kicking it off writes the
+request in `job.json` and submits one part per resource type to the
+executor: a thread pool of `EXPORT_WORKERS` threads by default or, with
+`EXPORT_EXECUTOR = "celery"`, one Celery task per type. A part streams its
+resources from a server-side cursor to `<Type>.ndjson` and then records its
+count, or its error, in `<Type>.json`.
+
+The state of a job is read back from its directory so the status of a job
+can be polled from any process sharing `EXPORT_DIR`.
+
+Example usage::
+    exporter = BulkExporter(app, submit=executor.submit)
+    job_id = exporter.kick_off(["Patient"], request_url)
+    status = exporter.status(job_id)
+"""
+import json
+import logging
+import os
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+EXPORT_TASK = "fhir_server.export_resource"
+
+
+class ExportError(ValueError):
+    """An export that can not be kicked off."""
+
+
+def export_resource(app, job_dir, resource_name, since=None):
+    """Write the resources of one type to `<Type>.ndjson` in the job directory.
+
+    Rows are read from a server-side cursor and written one at a time.
+    """
+    from fhir_server.api import json_writer
+    from fhir_server.configs.constants import STREAM_BATCH_SIZE
+    from fhir_server.configs.database import db
+    from fhir_server.resources import all_resources
+    from sqlalchemy.sql.expression import text
+
+    resources = {resource.__tablename__: resource for resource in all_resources}
+    resource = resources[resource_name]
+    path = os.path.join(job_dir, resource_name + ".ndjson")
+    part = {"type": resource_name}
+
+    with app.app_context():
+        try:
+            query = resource.query.filter_by(is_deleted=False)
+            if since:
+                query = query.filter(text("(meta).lastUpdated >= :since")).params(
+                    since=since
+                )
+            query = query.order_by(resource.id).yield_per(STREAM_BATCH_SIZE)
+
+            count = 0
+            with open(path + ".tmp", "wb") as ndjson:
+                for instance in query:
+                    data = instance._to_dict()
+                    data["resourceType"] = resource_name
+                    ndjson.write(json_writer.dumps(data) + b"\n")
+                    count += 1
+            os.replace(path + ".tmp", path)
+            part["count"] = count
+        except Exception as e:
+            logger.exception("Export of %s failed", resource_name)
+            part["error"] = resource_name + ".errors.ndjson"
+            outcome = {
+                "resourceType": "OperationOutcome",
+                "issue": [
+                    {"severity": "error", "code": "exception", "diagnostics": str(e)}
+                ],
+            }
+            if os.path.isdir(job_dir):
+                with open(os.path.join(job_dir, part["error"]), "wb") as errors:
+                    errors.write(json_writer.dumps(outcome) + b"\n")
+        finally:
+            db.session.remove()
+
+    if os.path.isdir(job_dir):
+        # The job is gone when it was cancelled while the part was running
+        with open(os.path.join(job_dir, resource_name + ".json"), "w") as status:
+            json.dump(part, status)
+    return part
+
+
+def register_export_task(celery, app):
+    """Register the Celery task running a part of an export."""
+
+    @celery.task(name=EXPORT_TASK)
+    def export_resource_task(job_dir, resource_name, since=None):
+        return export_resource(app, job_dir, resource_name, since)
+
+    return export_resource_task
+
+
+class BulkExporter(object):
+    """Kick off, poll and cancel `$export` jobs.
+
+    :param submit: Runs `export_resource(app, job_dir, type, since)` in the
+                   background. Parts are run on a thread pool when not given
+    """
+
+    def __init__(self, app, submit=None, directory=None, workers=None):
+        self.app = app
+        self.directory = directory or app.config["EXPORT_DIR"]
+        os.makedirs(self.directory, exist_ok=True)
+        if submit is None:
+            pool = ThreadPoolExecutor(
+                max_workers=workers or app.config.get("EXPORT_WORKERS", 4)
+            )
+            submit = pool.submit
+        self.submit = submit
+
+    def job_dir(self, job_id):
+        if not job_id or os.path.basename(job_id) != job_id:
+            raise ExportError("{0} is not an export job".format(job_id))
+        return os.path.join(self.directory, job_id)
+
+    def kick_off(self, resource_names, request_url, since=None):
+        """Start exporting the resource types, one part per type.
+
+        :return the id of the job:
+        """
+        job_id = uuid.uuid4().hex
+        job_dir = self.job_dir(job_id)
+        os.makedirs(job_dir)
+
+        job = {
+            "transactionTime": datetime.now(timezone.utc).isoformat(),
+            "request": request_url,
+            "types": list(resource_names),
+        }
+        with open(os.path.join(job_dir, "job.json"), "w") as job_file:
+            json.dump(job, job_file)
+
+        for resource_name in resource_names:
+            self.submit(export_resource, self.app, job_dir, resource_name, since)
+        return job_id
+
+    def _read(self, path):
+        try:
+            with open(path) as data:
+                return json.load(data)
+        except (OSError, ValueError):
+            return None
+
+    def status(self, job_id):
+        """The progress of a job.
+
+        :return None for an unknown job, else (done, total, parts) where
+                parts are the finished parts of the job:
+        """
+        job_dir = self.job_dir(job_id)
+        job = self._read(os.path.join(job_dir, "job.json"))
+        if job is None:
+            return None
+
+        parts = []
+        for resource_name in job["types"]:
+            part = self._read(os.path.join(job_dir, resource_name + ".json"))
+            if part is not None:
+                parts.append(part)
+        return len(parts), len(job["types"]), parts
+
+    def manifest(self, job_id, file_url):
+        """The Bulk Data manifest of a finished job.
+
+        :param file_url: Returns the url of an exported file name
+        """
+        job_dir = self.job_dir(job_id)
+        job = self._read(os.path.join(job_dir, "job.json"))
+        done, total, parts = self.status(job_id)
+
+        output, error = [], []
+        for part in parts:
+            if "error" in part:
+                error.append(
+                    {"type": "OperationOutcome", "url": file_url(part["error"])}
+                )
+            else:
+                output.append(
+                    {
+                        "type": part["type"],
+                        "url": file_url(part["type"] + ".ndjson"),
+                        "count": part["count"],
+                    }
+                )
+
+        return {
+            "transactionTime": job["transactionTime"],
+            "request": job["request"],
+            "requiresAccessToken": False,
+            "output": output,
+            "error": error,
+        }
+
+    def file_path(self, job_id, file_name):
+        """The path of an exported file, None if there is no such file."""
+        if os.path.basename(file_name) != file_name:
+            return None
+
+        path = os.path.join(self.job_dir(job_id), file_name)
+        if not file_name.endswith(".ndjson") or not os.path.isfile(path):
+            return None
+        return path
+
+    def cancel(self, job_id):
+        """Delete a job and its files. Returns False for an unknown job."""
+        job_dir = self.job_dir(job_id)
+        if not os.path.isdir(job_dir):
+            return False
+
+        shutil.rmtree(job_dir, ignore_errors=True)
+        return True
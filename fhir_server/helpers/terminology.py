@@ -0,0 +1,246 @@
+"""In-process terminology cache for valueset lookups.
+
+Coded fields are validated against the valueset server. Instead of asking the
+server about every single code, whole value sets are fetched once, kept in
+memory as sets of codes and answered locally until they expire.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+from fhir_server.configs import constants
+from valueset_server.engine import valueset_engine
+
+
+def valueset_base_url(url):
+    """Strip the lookup query from a valueset url.
+
+    ``http://127.0.0.1:5000/address_use/?code=home`` is stored under
+    ``http://127.0.0.1:5000/address_use/``.
+    """
+    return url.split("?", 1)[0]
+
+
+def response_codes(resp, url):
+    """The codes listed in a response of the valueset server.
+
+    A failed request is an error rather than an empty valueset, so that it
+    is never cached.
+
+    :raises TypeError: If the request failed or returned no valueset
+    """
+    try:
+        resp.raise_for_status()
+    except requests.HTTPError:
+        raise TypeError(f"A request to {url} returned a {resp.status_code} status code")
+
+    data = resp.json()
+    if not isinstance(data, dict) or "data" not in data:
+        raise TypeError(f"A request to {url} did not return a valueset")
+
+    return frozenset(value["code"] for value in data["data"] or [])
+
+
+def fetch_valueset_codes(url):
+    """Load every code defined in the value set at `url` over HTTP.
+
+    :param url: The valueset url without a lookup query
+    :return frozenset of the codes in the valueset:
+    """
+    return response_codes(requests.get(url), url)
+
+
+def fetch_valueset_codes_in(url, codes):
+    """Ask the valueset server which of `codes` it defines in one request.
+
+    The valueset server accepts a repeated lookup param e.g
+    ``address_use/?code=home&code=work``.
+    """
+    params = [("code", code) for code in sorted(codes)]
+    resp = requests.get(valueset_base_url(url), params=params)
+    return response_codes(resp, valueset_base_url(url))
+
+
+def valueset_name(url):
+    """The valueset server name for a url e.g ``address_use``."""
+    url = valueset_base_url(url)
+    if url.startswith(constants.VALUESETS_BASE_URL):
+        url = url.replace(constants.VALUESETS_BASE_URL, "", 1)
+    return url.strip("/")
+
+
+def load_local_valueset_codes(url):
+    """Load every code defined in a value set from the embedded engine.
+
+    Value sets the engine does not ship are fetched from the valueset server.
+    """
+    try:
+        return frozenset(valueset_engine.codes(valueset_name(url)))
+    except FileNotFoundError:
+        return fetch_valueset_codes(valueset_base_url(url))
+
+
+def local_valueset_contains(url, code):
+    """Check a code against the embedded engine without any network I/O.
+
+    Value sets the engine does not ship are looked up in the terminology
+    cache, which loads them from the valueset server once.
+    """
+    try:
+        return valueset_engine.contains(valueset_name(url), code)
+    except FileNotFoundError:
+        return terminology_cache.contains(url, code)
+
+
+class TerminologyCache(object):
+    """Value sets held in memory as hash sets of codes.
+
+    Entries are evicted when they are older than `ttl` seconds or, once the
+    cache holds `maxsize` value sets, on a least recently used basis.
+
+    Example usage::
+        cache = TerminologyCache(ttl=3600, maxsize=128)
+        cache.preload([ADDRESS_USE_URL, ADDRESS_TYPE_URL])
+        cache.contains(ADDRESS_USE_URL, 'home')
+    """
+
+    def __init__(self, ttl=3600, maxsize=128, loader=fetch_valueset_codes):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.loader = loader
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._valuesets = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._valuesets)
+
+    def __contains__(self, url):
+        with self._lock:
+            return self._get(valueset_base_url(url)) is not None
+
+    def _expired(self, loaded_at):
+        if self.ttl is None:
+            return False
+        return (time.monotonic() - loaded_at) > self.ttl
+
+    def _get(self, url):
+        entry = self._valuesets.get(url)
+        if entry is None:
+            return None
+
+        codes, loaded_at = entry
+        if self._expired(loaded_at):
+            del self._valuesets[url]
+            self.evictions += 1
+            return None
+
+        self._valuesets.move_to_end(url)
+        return codes
+
+    def _set(self, url, codes):
+        self._valuesets[url] = (frozenset(codes), time.monotonic())
+        self._valuesets.move_to_end(url)
+
+        while self.maxsize and len(self._valuesets) > self.maxsize:
+            self._valuesets.popitem(last=False)
+            self.evictions += 1
+
+    def load(self, url, codes=None):
+        """Cache the codes for a value set, fetching them if not given.
+
+        :param url: The valueset url
+        :param codes: An iterable of codes. Uses the cache loader if None
+        :return frozenset of the codes in the valueset:
+        """
+        url = valueset_base_url(url)
+        if codes is None:
+            codes = self.loader(url)
+
+        with self._lock:
+            self._set(url, codes)
+            return self._valuesets[url][0]
+
+    def preload(self, urls=None):
+        """Bulk load value sets into the cache.
+
+        :param urls: Valueset urls to load. Defaults to every valueset url
+                     defined in the server constants.
+        :return the number of valuesets loaded:
+        """
+        if urls is None:
+            urls = valueset_urls()
+
+        for url in urls:
+            self.load(url)
+        return len(urls)
+
+    def get_codes(self, url):
+        """Return the codes of a value set, loading it on a cache miss."""
+        url = valueset_base_url(url)
+
+        with self._lock:
+            codes = self._get(url)
+            if codes is not None:
+                self.hits += 1
+                return codes
+            self.misses += 1
+
+        return self.load(url)
+
+    def contains(self, url, code):
+        """Check if `code` is defined in the value set at `url`."""
+        return code in self.get_codes(url)
+
+    def invalidate(self, url):
+        with self._lock:
+            self._valuesets.pop(valueset_base_url(url), None)
+
+    def clear(self):
+        """Drop all cached value sets and reset the counters."""
+        with self._lock:
+            self._valuesets.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._valuesets),
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+def valueset_urls():
+    """All the valueset urls configured in `fhir_server.configs.constants`."""
+    urls = []
+    for name in dir(constants):
+        value = getattr(constants, name)
+        if (
+            name.isupper()
+            and isinstance(value, str)
+            and value.startswith(constants.VALUESETS_BASE_URL)
+            and value != constants.VALUESETS_BASE_URL
+        ):
+            urls.append(value)
+    return urls
+
+
+terminology_cache = TerminologyCache(
+    ttl=constants.VALUESETS_CACHE_TTL,
+    maxsize=constants.VALUESETS_CACHE_MAXSIZE,
+    loader=(
+        load_local_valueset_codes
+        if constants.VALUESETS_BACKEND == "local"
+        else fetch_valueset_codes
+    ),
+)
@@ -1,7 +1,40 @@
+import threading
+from collections import OrderedDict
+
 import requests
 
+from fhir_server.configs.constants import VALUESETS_CACHE_ENABLED, VALUESETS_BACKEND
+from fhir_server.helpers.terminology import (
+    terminology_cache,
+    local_valueset_contains,
+    fetch_valueset_codes_in,
+    valueset_base_url,
+)
+
+_batches = threading.local()
+
 
 def validate_valuesets(code_value, url, response):
+    batch = CodeValidationBatch.active()
+    if batch is not None:
+        # Defer the lookup. All the codes in the batch are resolved together
+        batch.add(code_value, url, response)
+        return
+
+    if VALUESETS_BACKEND == "local":
+        # Lookups on the embedded valueset engine are a dict access
+        if local_valueset_contains(url, code_value):
+            return
+
+        raise TypeError(f"The {response} must be defined in {url}")
+
+    if VALUESETS_CACHE_ENABLED:
+        # The whole valueset is loaded once and membership is a set lookup
+        if terminology_cache.contains(url, code_value):
+            return
+
+        raise TypeError(f"The {response} must be defined in {url}")
+
     resp = requests.get(url)
 
     # TODO: Validate the response and fix request on test mocks to
@@ -11,10 +44,103 @@ def validate_valuesets(code_value, url, response):
     #         'A request to %s returned a %s status code' % (
     #             url, resp.status_code))
 
-    # TODO optimize this validation
     if "data" in resp.json():
         for value in resp.json()["data"]:
             if value["code"] == code_value:
                 return
 
     raise TypeError(f"The {response} must be defined in {url}")
+
+
+def resolve_valuesets(url, codes):
+    """Return the subset of `codes` that are defined in the value set at `url`.
+
+    This is a single lookup per valueset whatever the number of codes.
+    """
+    if VALUESETS_BACKEND == "local":
+        return {code for code in codes if local_valueset_contains(url, code)}
+
+    if VALUESETS_CACHE_ENABLED:
+        return terminology_cache.get_codes(url) & set(codes)
+
+    return fetch_valueset_codes_in(url, codes) & set(codes)
+
+
+class CodeValidationBatch(object):
+    """Collect the coded values of a resource and validate them together.
+
+    While a batch is active `validate_valuesets` records (valueset, code)
+    pairs instead of looking them up. `resolve` dedupes the pairs, checks
+    each valueset once and raises a single error listing every invalid code.
+
+    Example usage::
+        with CodeValidationBatch() as batch:
+            record = Patient(**data)
+            db.session.add(record)
+            db.session.flush()
+            batch.resolve()
+    """
+
+    def __init__(self):
+        self.lookups = OrderedDict()
+        self._outer = None
+
+    @classmethod
+    def active(cls):
+        return getattr(_batches, "current", None)
+
+    def __enter__(self):
+        self._outer = self.active()
+        if self._outer is not None:
+            # Nested batches are merged into the outermost one
+            return self._outer
+
+        _batches.current = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._outer is not None:
+            return False
+
+        _batches.current = None
+        if exc_type is None:
+            self.resolve()
+        return False
+
+    def __len__(self):
+        return len(self.lookups)
+
+    def add(self, code_value, url, response):
+        base_url = valueset_base_url(url)
+        messages = self.lookups.setdefault((base_url, code_value), [])
+        message = f"The {response} must be defined in {url}"
+        if message not in messages:
+            messages.append(message)
+
+    def resolve(self):
+        """Validate all pending codes and raise a TypeError with all failures.
+
+        The messages of the failures are joined by "; ".
+        """
+        lookups, self.lookups = self.lookups, OrderedDict()
+
+        valuesets = OrderedDict()
+        for base_url, code_value in lookups:
+            valuesets.setdefault(base_url, set()).add(code_value)
+
+        errors = []
+        for base_url, codes in valuesets.items():
+            valid_codes = resolve_valuesets(base_url, codes)
+            for (url, code_value), messages in lookups.items():
+                if url == base_url and code_value not in valid_codes:
+                    errors.extend(messages)
+
+        if len(errors) > 0:
+            raise TypeError("; ".join(errors))
+
+
+def resolve_active_batch():
+    """Resolve the codes collected so far by the active batch, if any."""
+    batch = CodeValidationBatch.active()
+    if batch is not None:
+        batch.resolve()
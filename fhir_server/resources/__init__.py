@@ -18,31 +18,56 @@ constraints = []
 
 from datetime import datetime, timezone  # noqa
 from sqlalchemy import event  # noqa
+from fhir_server.configs import constants  # noqa
+from fhir_server.utils.crud import add_history_indexes, add_version_indexes  # noqa
+from fhir_server.utils.search import add_search_indexes  # noqa
+from fhir_server.resources.domainresource import narrative_content  # noqa
 
-for resource in all_resources:
+
+def gen_default(mapper, connection, instance):
     """An event hook adds missing text field on all resources.
 
     Resources should have a human readable text field that can be used
     to render a resource instance. Each resource that implements
-    `_resource_summary` func will have a text field created from that method.
+    `_resource_summary` func will have a text field created from that method,
+    as set by `NARRATIVE_STRATEGY`.
     """
+    now = datetime.now(timezone.utc)
+    str_now = datetime.strftime(now, "%Y-%m-%dT%H:%M:%S%z")
+
+    strategy = constants.NARRATIVE_STRATEGY
+    if strategy != "lazy":
+        narrative = instance.generated_narrative()
+        # An unchanged narrative is not written, nor validated, again
+        if strategy == "eager" or narrative_content(instance.text) != (
+            narrative["div"],
+            narrative["status"],
+        ):
+            instance.text = narrative
+    elif narrative_content(instance.text)[1] == "generated":
+        # A generated narrative is rendered when read, a stored one would
+        # not follow the changes of the summary fields
+        instance.text = None
+
+    if not instance.meta:
+        instance.meta = {}
+
+    if isinstance(instance.meta, dict):
+        if not instance.meta.get("lastUpdated"):
+            instance.meta["lastUpdated"] = str_now
+    else:
+        if not instance.meta.lastUpdated:
+            instance.meta._replace(lastUpdated=str_now)
+
+
+for resource in all_resources:
+    # Versioned reads are a single index lookup on (id, (meta).versionId)
+    add_version_indexes(resource)
+    # History pages are ranges of the (resource_changed, resource_version, id)
+    # index
+    add_history_indexes(resource)
+    # Search parameters over composite columns are backed by GIN indexes
+    add_search_indexes(resource)
 
-    @event.listens_for(resource, "before_insert")
-    @event.listens_for(resource, "before_update")
-    def gen_default(mapper, connection, instance):
-        now = datetime.now(timezone.utc)
-        str_now = datetime.strftime(now, "%Y-%m-%dT%H:%M:%S%z")
-        rep = instance._resource_summary().get("repr")
-        div = '<div xmlns="http://www.w3.org/1999/xhtml">{}</div>'.format(rep)
-        narrative = {"div": div, "status": "generated"}
-        instance.text = narrative
-
-        if not instance.meta:
-            instance.meta = {}
-
-        if isinstance(instance.meta, dict):
-            if not instance.meta.get("lastUpdated"):
-                instance.meta["lastUpdated"] = str_now
-        else:
-            if not instance.meta.lastUpdated:
-                instance.meta._replace(lastUpdated=str_now)
+    event.listen(resource, "before_insert", gen_default)
+    event.listen(resource, "before_update", gen_default)
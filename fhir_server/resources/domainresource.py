@@ -5,9 +5,19 @@ from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy_utils import JSONType
 from sqlalchemy_utils import CompositeArray as Array
 
+from fhir_server.configs import constants
 from fhir_server.elements import complex
 from fhir_server.resources.resource import Resource
-from fhir_server.elements.extension import ElementExtension
+from fhir_server.elements.extension import ElementExtension, ExtensionArray
+
+NARRATIVE_DIV = '<div xmlns="http://www.w3.org/1999/xhtml">{}</div>'
+
+
+def narrative_content(narrative):
+    """The (div, status) of a narrative dict or composite value."""
+    if isinstance(narrative, dict):
+        return narrative.get("div"), narrative.get("status")
+    return getattr(narrative, "div", None), getattr(narrative, "status", None)
 
 
 class DomainResource(Resource):
@@ -19,6 +29,10 @@ class DomainResource(Resource):
     __abstract__ = True
     __metaclass__ = ABCMeta
 
+    # Set to False on an instance to serialize it without a lazily rendered
+    # narrative, e.g. for `_summary=data`
+    render_narrative = True
+
     @declared_attr
     def text(cls):
         # Text summary of the resource, for human interpretation
@@ -32,12 +46,12 @@ class DomainResource(Resource):
     @declared_attr
     def extension(cls):
         # Additional Content defined by implementations
-        return Column(Array(ElementExtension()))
+        return Column(ExtensionArray(ElementExtension()))
 
     @declared_attr
     def modifierExtension(cls):
         # Extensions that cannot be ignored
-        return Column(Array(ElementExtension()))
+        return Column(ExtensionArray(ElementExtension()))
 
     @abstractmethod
     def _resource_summary(self):
@@ -59,6 +73,26 @@ class DomainResource(Resource):
         """
         raise NotImplementedError("Resources should implement a summary!")
 
+    def generated_narrative(self):
+        """The narrative generated from the summary of the resource."""
+        div = NARRATIVE_DIV.format(self._resource_summary().get("repr"))
+        return {"div": div, "status": "generated"}
+
+    def _to_dict(self):
+        fields = super(DomainResource, self)._to_dict()
+        if (
+            constants.NARRATIVE_STRATEGY == "lazy"
+            and self.render_narrative
+            and (
+                fields.get("text") is None
+                or narrative_content(fields["text"])[1] == "generated"
+            )
+        ):
+            # The narrative is not stored, it is rendered when read. A
+            # generated one stored before may not match the summary anymore
+            fields["text"] = self.generated_narrative()
+        return fields
+
     @abstractmethod
     def __repr__(cls):
         raise NotImplementedError("Resources should implement a `repr` method!")
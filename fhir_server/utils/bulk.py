@@ -0,0 +1,374 @@
+"""Bulk import of resources with COPY.
+
+Records are validated in batches: each one is built as a resource, which
+runs its `@validates` chain, and the coded values of the whole batch are
+checked in one `CodeValidationBatch`. The columns are then bound with the
+column types, so composites are checked by `PgComposite` as on a flush, and
+written as COPY text with the `fhir_*` composite and array literals.
+
+A batch is copied into a temporary table and merged with two set-based
+statements. The current version of the resources that already exist is
+moved to the history table and the batch is upserted, so importing a
+resource again creates a new version of it as an update would.
+
+Example usage::
+    with open("Organization.ndjson") as lines:
+        result = bulk_import(lines)
+"""
+
+import datetime
+import io
+import json
+from collections import OrderedDict
+from decimal import Decimal
+
+from fhir_server.configs.constants import BULK_IMPORT_BATCH_SIZE
+from fhir_server.configs.database import db
+from fhir_server.helpers.validations import CodeValidationBatch
+
+# Escapes of the COPY text format
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\n": "\\n", "\r": "\\r", "\t": "\\t"})
+COPY_NULL = "\\N"
+
+# Characters that make a composite field or an array element be quoted
+COMPOSITE_SPECIALS = set('"\\(),') | set(" \t\n\r\v\f")
+ARRAY_SPECIALS = set('"\\{},') | set(" \t\n\r\v\f")
+
+# Columns that keep their first value when a resource is imported again
+KEPT_COLUMNS = ["id", "created_at"]
+
+
+class BulkImportError(ValueError):
+    """A bulk import that can not be started."""
+
+
+class BulkImportResult(object):
+    """The counts and the rejected records of a bulk import."""
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+
+    def add_error(self, line, error):
+        self.errors.append((line, str(error)))
+
+    def __repr__(self):
+        return "<BulkImportResult created={0} updated={1} errors={2}>".format(
+            self.created, self.updated, len(self.errors)
+        )
+
+
+def _quote(text, specials, composite):
+    if text and not specials.intersection(text):
+        return text
+
+    if composite:
+        # Inside a quoted record field quotes and backslashes are doubled
+        text = text.replace('"', '""').replace("\\", "\\\\")
+    else:
+        text = text.replace("\\", "\\\\").replace('"', '\\"')
+    return '"' + text + '"'
+
+
+def literal(value):
+    """The postgres text of a bound value, `None` for NULL.
+
+    Composite values (the namedtuples of `PgComposite`) are written as
+    `(field,...)` records and lists as `{item,...}` arrays.
+    """
+    if value is None:
+        return None
+
+    if isinstance(value, bool):
+        return "t" if value else "f"
+
+    if isinstance(value, tuple):
+        fields = []
+        for field in value:
+            text = literal(field)
+            if text is not None:
+                text = _quote(text, COMPOSITE_SPECIALS, True)
+            fields.append(text or "")
+        return "(" + ",".join(fields) + ")"
+
+    if isinstance(value, list):
+        items = []
+        for item in value:
+            text = literal(item)
+            if text is None:
+                items.append("NULL")
+            elif text.upper() == "NULL":
+                items.append('"' + text + '"')
+            else:
+                items.append(_quote(text, ARRAY_SPECIALS, False))
+        return "{" + ",".join(items) + "}"
+
+    if isinstance(value, dict):
+        return json.dumps(value)
+
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+
+    if isinstance(value, Decimal):
+        return format(value, "f")
+
+    return str(value)
+
+
+def copy_line(values):
+    """A line of COPY text holding `values`."""
+    fields = []
+    for value in values:
+        text = literal(value)
+        fields.append(COPY_NULL if text is None else text.translate(COPY_ESCAPES))
+    return "\t".join(fields) + "\n"
+
+
+class BulkImporter(object):
+    """Import the records of one resource type.
+
+    Example usage::
+        importer = BulkImporter(Organization)
+        importer.import_batch([(1, line), (2, line)], result)
+    """
+
+    def __init__(self, resource, dialect=None):
+        from fhir_server.resources import gen_default
+
+        self.resource = resource
+        self.gen_default = gen_default
+        self.dialect = dialect or db.engine.dialect
+
+        table = resource.__table__
+        self.table_name = table.name
+        self.history_name = resource.__history_mapper__.local_table.name
+        self.staging_name = "bulk_{0}".format(table.name.lower())
+
+        # `resource_version` is set when the batch is merged
+        self.columns = [
+            column for column in table.columns if column.key != "resource_version"
+        ]
+        self.binds = [
+            column.type.bind_processor(self.dialect) for column in self.columns
+        ]
+        self.defaults = [self._default(column) for column in self.columns]
+
+    @staticmethod
+    def _default(column):
+        default = column.default
+        if default is None or not (default.is_scalar or default.is_callable):
+            return None
+
+        if default.is_callable:
+            return lambda: default.arg(None)
+        return lambda: default.arg
+
+    def build(self, record):
+        """The column values of a record, bound and validated.
+
+        :param record: The JSON text or dict of a resource
+        """
+        data = json.loads(record) if isinstance(record, str) else dict(record)
+        resource_type = data.pop("resourceType", self.table_name)
+        if resource_type != self.table_name:
+            raise BulkImportError(
+                "Incorrect resource type {0} found, expected {1}".format(
+                    resource_type, self.table_name
+                )
+            )
+
+        instance = self.resource(**data)
+        # The narrative and `meta.lastUpdated` a flush would have generated
+        self.gen_default(None, None, instance)
+
+        values = []
+        for column, bind, default in zip(self.columns, self.binds, self.defaults):
+            value = getattr(instance, column.key)
+            if value is None and default is not None:
+                value = default()
+            values.append(bind(value) if bind is not None else value)
+        return values
+
+    def validate(self, records):
+        """Build a batch of records and validate their codes together.
+
+        :param records: (line number, record) pairs
+        :return the (line number, values) of the valid records and the
+                (line number, error) of the others:
+        """
+        rows, errors = [], []
+        try:
+            with CodeValidationBatch():
+                for line, record in records:
+                    try:
+                        rows.append((line, self.build(record)))
+                    except Exception as e:
+                        errors.append((line, e))
+        except TypeError:
+            # Some codes are not defined in their valuesets. Find the records
+            # they belong to, each record resolving its own codes.
+            rows, errors = [], []
+            for line, record in records:
+                try:
+                    with CodeValidationBatch():
+                        values = self.build(record)
+                    rows.append((line, values))
+                except Exception as e:
+                    errors.append((line, e))
+
+        return rows, errors
+
+    def _names(self, prefix=""):
+        return ", ".join(
+            '{0}"{1}"'.format(prefix, column.name) for column in self.columns
+        )
+
+    def connection(self):
+        """The connection of the session to the table of the resource.
+
+        The batch is copied and merged in the transaction the session uses
+        to read and write the resource.
+        """
+        return db.session.connection(mapper=self.resource.__mapper__)
+
+    def copy(self, rows):
+        """COPY the rows into the staging table of the current transaction."""
+        connection = self.connection()
+        # The staging table has the columns of the resource but none of its
+        # constraints. ON COMMIT DELETE ROWS does not empty it when the
+        # import runs within an outer transaction, so it is truncated here
+        connection.execute(
+            'CREATE TEMPORARY TABLE IF NOT EXISTS "{0}" ON COMMIT DELETE ROWS '
+            'AS SELECT {1} FROM "{2}" WITH NO DATA'.format(
+                self.staging_name, self._names(), self.table_name
+            )
+        )
+        connection.execute('TRUNCATE "{0}"'.format(self.staging_name))
+
+        buffer = io.StringIO()
+        buffer.writelines(copy_line(values) for values in rows)
+        buffer.seek(0)
+
+        cursor = connection.connection.cursor()
+        try:
+            cursor.copy_expert(
+                'COPY "{0}" ({1}) FROM STDIN'.format(self.staging_name, self._names()),
+                buffer,
+            )
+        finally:
+            cursor.close()
+
+    def merge(self):
+        """Move replaced versions to the history table and upsert the batch.
+
+        :return (created, updated):
+        """
+        connection = self.connection()
+        names = self._names()
+
+        connection.execute(
+            'INSERT INTO "{0}" ({1}, resource_version, resource_changed) '
+            'SELECT {2}, base.resource_version, (now() AT TIME ZONE \'UTC\') '
+            'FROM "{3}" AS base JOIN "{4}" AS batch ON batch.id = base.id'.format(
+                self.history_name,
+                names,
+                self._names("base."),
+                self.table_name,
+                self.staging_name,
+            )
+        )
+
+        updates = ", ".join(
+            '"{0}" = EXCLUDED."{0}"'.format(column.name)
+            for column in self.columns
+            if column.name not in KEPT_COLUMNS
+        )
+        rows = connection.execute(
+            'INSERT INTO "{0}" ({1}, resource_version) '
+            'SELECT {1}, 1 FROM "{2}" '
+            "ON CONFLICT (id) DO UPDATE SET {3}, "
+            'resource_version = "{0}".resource_version + 1 '
+            "RETURNING (xmax = 0) AS created".format(
+                self.table_name, names, self.staging_name, updates
+            )
+        ).fetchall()
+
+        created = sum(1 for row in rows if row.created)
+        return created, len(rows) - created
+
+    def import_batch(self, records, result):
+        """Validate, copy and merge a batch of records in one transaction."""
+        rows, errors = self.validate(records)
+        for line, error in errors:
+            result.add_error(line, error)
+
+        # A resource imported twice in a batch keeps its last version
+        unique = OrderedDict()
+        id_index = [column.key for column in self.columns].index("id")
+        for line, values in rows:
+            unique[values[id_index]] = values
+
+        if not unique:
+            return
+
+        try:
+            self.copy(unique.values())
+            created, updated = self.merge()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        result.created += created
+        result.updated += updated
+
+
+def bulk_import(lines, resource=None, batch_size=BULK_IMPORT_BATCH_SIZE):
+    """Import NDJSON resources, one COPY and one commit per batch.
+
+    :param lines: NDJSON lines, each holding a resource
+    :param resource: The resource type of all the lines. When not given the
+                     resource type is read from each line and lines of
+                     several types are batched by type
+    :param batch_size: Number of records validated and copied at a time
+    :return `BulkImportResult`:
+    """
+    from fhir_server.resources import all_resources
+
+    resources = {cls.__tablename__: cls for cls in all_resources}
+    result = BulkImportResult()
+    importers = {}
+    pending = OrderedDict()
+
+    def importer_of(cls):
+        if cls not in importers:
+            importers[cls] = BulkImporter(cls)
+        return importers[cls]
+
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+
+        cls = resource
+        if cls is None:
+            try:
+                cls = resources.get(json.loads(line).get("resourceType"))
+            except (ValueError, AttributeError) as e:
+                result.add_error(number, e)
+                continue
+
+            if cls is None:
+                result.add_error(number, "Unknown resource type")
+                continue
+
+        batch = pending.setdefault(cls, [])
+        batch.append((number, line))
+        if len(batch) >= batch_size:
+            importer_of(cls).import_batch(pending.pop(cls), result)
+
+    for cls, batch in pending.items():
+        importer_of(cls).import_batch(batch, result)
+
+    return result
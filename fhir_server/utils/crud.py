@@ -1,7 +1,18 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from datetime import datetime, timezone
+from itertools import chain, islice
+
+from dateutil import parser
+from sqlalchemy import Index, and_, case, exists, func, literal_column, select
+from sqlalchemy.orm import aliased
 from sqlalchemy.sql.expression import text
 
+from fhir_server.configs.constants import ITEMS_PER_PAGE, STREAM_BATCH_SIZE
 from fhir_server.configs.database import db
+from fhir_server.elements.base.complex_mixin import PgComposite, Trusted
+from fhir_server.helpers.validations import CodeValidationBatch, resolve_active_batch
+from fhir_server.utils.search import search_clauses, search_parameters
 
 
 def unpack_resource_helper(resource, resource_instance):
@@ -9,22 +20,12 @@ def unpack_resource_helper(resource, resource_instance):
     Creates a valid resource instances with data from raw SQL queries.
     """
     kwargs = {}
-    list_data = []
 
     if not resource_instance:
         return resource()
 
     if isinstance(resource_instance, list):
-        for entry in resource_instance:
-            for key in entry.keys():
-                if key != "resource_changed":
-                    kwargs[key] = entry[key]
-
-                    if isinstance(kwargs[key], tuple):
-                        kwargs[key] = dict(kwargs[key]._asdict())
-
-            list_data.append(resource(**kwargs))
-        return list_data
+        return [unpack_resource_row(resource, entry) for entry in resource_instance]
 
     for key in resource_instance.keys():
         if key != "resource_changed":
@@ -33,6 +34,87 @@ def unpack_resource_helper(resource, resource_instance):
     return resource(**kwargs)
 
 
+def unpack_resource_row(resource, row):
+    """
+    Creates a resource instance from a raw SQL row of a list of results.
+    """
+    kwargs = {}
+    for key in row.keys():
+        if key != "resource_changed":
+            kwargs[key] = row[key]
+
+            if isinstance(kwargs[key], tuple):
+                kwargs[key] = dict(kwargs[key]._asdict())
+
+    return resource(**kwargs)
+
+
+def unpack_history_helper(resource, history_instance):
+    """
+    Creates a resource instance from a mapped history table row.
+    """
+    if history_instance is None:
+        return resource()
+
+    kwargs = {
+        key: getattr(history_instance, key) for key in resource.__table__.columns.keys()
+    }
+    return resource(**kwargs)
+
+
+def version_index_name(table_name):
+    return "ix_{0}_id_version_id".format(table_name)
+
+
+def add_version_indexes(resource):
+    """Index the base and history tables of a resource on (id, versionId).
+
+    Versioned reads look a resource up by its logical id and
+    `(meta).versionId` on both tables. The expression must be compared
+    as is (no casts) for the indexes to be used.
+    """
+    tables = [resource.__table__, resource.__history_mapper__.local_table]
+
+    for table in tables:
+        name = version_index_name(table.name)
+        if name not in [index.name for index in table.indexes]:
+            Index(name, table.c.id, text("((meta).versionId)"))
+
+
+def history_index_name(table_name):
+    return "ix_{0}_changed_version".format(table_name)
+
+
+def add_history_indexes(resource):
+    """Index the history table of a resource on its keyset pagination order."""
+    table = resource.__history_mapper__.local_table
+
+    name = history_index_name(table.name)
+    if name not in [index.name for index in table.indexes]:
+        Index(name, table.c.resource_changed, table.c.resource_version, table.c.id)
+
+
+def encode_history_cursor(resource_changed, resource_version, key):
+    """An opaque `_cursor` pointing at the last entry of a history page."""
+    position = "{0}|{1}|{2}".format(
+        resource_changed.isoformat(), resource_version, key
+    )
+    return urlsafe_b64encode(position.encode("utf-8")).decode("utf-8")
+
+
+def decode_history_cursor(cursor):
+    """Get the (resource_changed, resource_version, id) position of a `_cursor`.
+
+    :raises ValueError: If the cursor was not issued by this server
+    """
+    try:
+        position = urlsafe_b64decode(cursor.encode("utf-8")).decode("utf-8")
+        resource_changed, resource_version, key = position.split("|", 2)
+        return parser.parse(resource_changed), int(resource_version), key
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("{0} is not a valid history cursor".format(cursor))
+
+
 def tag_summary_resource(instance):
     """Tag a summary resource as `SUBSETTED` for clients.
 
@@ -58,6 +140,68 @@ def tag_summary_resource(instance):
     return instance
 
 
+class PageStream(object):
+    """Iterate over a page of resources as rows are read from the database.
+
+    `rows` yields one more row than the page holds when there is a next page.
+    `total` and `next_cursor` are only known once the rows have been read.
+
+    Example usage::
+        stream = Organization.search_stream(per_page=100)
+        for resource in stream:
+            write(resource)
+        links = next_link(stream.next_cursor)
+    """
+
+    def __init__(self, rows, count, build, position, total=None, finish=None):
+        """
+        :param rows: Raw rows, read lazily e.g from a server-side cursor
+        :param count: Number of resources in the page
+        :param build: Returns the resource of a row
+        :param position: Returns the `_cursor` of a row
+        :param total: Total number of matches, if known beforehand
+        :param finish: Called with the stream once all the rows are read
+        """
+        self.rows = rows
+        self.count = count
+        self.build = build
+        self.position = position
+        self.total = total
+        self.finish = finish
+        self.next_cursor = None
+        self._iterator = None
+        self._first = []
+
+    def _read(self):
+        if self._iterator is None:
+            self._iterator = iter(self.rows)
+        return self._iterator
+
+    def is_empty(self):
+        """Read ahead the first row to tell if the page has any resource."""
+        if not self._first:
+            self._first = list(islice(self._read(), 1))
+        return not self._first
+
+    def __iter__(self):
+        previous = None
+        try:
+            for index, row in enumerate(chain(self._first, self._read())):
+                if index == self.count:
+                    self.next_cursor = self.position(previous)
+                    continue
+                previous = row
+                yield self.build(row)
+        finally:
+            self._first = []
+            close = getattr(self.rows, "close", None)
+            if close is not None:
+                close()
+
+        if self.finish is not None:
+            self.finish(self)
+
+
 class CRUDMixin(object):
     """Provides an easier way of handling the common model operations.
 
@@ -87,9 +231,12 @@ class CRUDMixin(object):
         if "resourceType" in kwargs:
             del kwargs["resourceType"]
 
-        # create resource instance and call save to add to and commit session
-        record = cls(**kwargs)
-        record.save()
+        # create resource instance and call save to add to and commit session.
+        # Coded values are collected while the resource is built and flushed
+        # and then validated against their valuesets in one pass.
+        with CodeValidationBatch():
+            record = cls(**kwargs)
+            record.save()
         return record
 
     @classmethod
@@ -101,38 +248,135 @@ class CRUDMixin(object):
         :param per_page:
         :param kwargs:
         """
+        result, count, next_cursor = cls.search(per_page=per_page, page=page, **kwargs)
+
+        if len(result) > 1:
+            # 412 Precondition Failed error indicating the client's
+            # criteria were not selective enough
+            return result, count, 412
+
+        elif len(result) == 0:
+            #  404 Results for supplied params Not Found
+            return None, count, 404
+
+        return result[0], count, 200
+
+    @classmethod
+    def filter_params(cls, **kwargs):
+        """Keep the params that are resource fields as `filter_by` criteria.
+
+        Fields that are also search parameters are left to `search_clauses`.
+        """
         # Get rid of params that are not part of the resource fields
         resource_fields = cls.__table__.columns.keys()
+        parameters = search_parameters(cls)
 
         filter_params = {}
         for key, val in kwargs.items():
+            if key not in resource_fields or key in parameters:
+                continue
+
             if isinstance(val, list):
                 filter_params[key] = val[0]
             else:
                 filter_params[key] = val
 
-        filter_keys = [param for param in kwargs.keys()]
+        filter_params["is_deleted"] = False
+        return filter_params
 
-        for key in filter_keys:
-            if key not in resource_fields:
-                filter_params.pop(key)
+    @classmethod
+    def search(cls, per_page=30, page=1, cursor=None, total="accurate", **kwargs):
+        """Get a page of matching resources together with the total.
 
-        filter_params["is_deleted"] = False
-        count = cls.query.filter_by(**filter_params).count()
-        result = (
-            cls.query.filter_by(**filter_params).paginate(page, per_page, False).items
+        The page and the total come from one query, the total being a
+        `count(*) OVER ()` window over the matches. Results are ordered by
+        id; with a `cursor` (the id of the last resource of the previous
+        page) the page is an index range instead of an OFFSET scan.
+
+        :param per_page:
+        :param page: Page number, ignored when a cursor is given
+        :param cursor: The `_cursor` of the previous page
+        :param total: `accurate`, `estimate` (from planner statistics) or
+                      `none` (no total) as in the FHIR `_total` param
+        :param kwargs: Search params. Registered search parameters are
+                       compiled by `search_clauses`, other fields are matched
+                       exactly and the rest is ignored
+        :return (results, total, `_cursor` of the next page):
+        """
+        stream = cls.search_stream(
+            per_page=per_page, page=page, cursor=cursor, total=total, **kwargs
         )
+        rows = list(stream)
+        return rows, stream.total, stream.next_cursor
 
-        if len(result) > 1:
-            # 412 Precondition Failed error indicating the client's
-            # criteria were not selective enough
-            return result, count, 412
+    @classmethod
+    def search_stream(
+        cls, per_page=30, page=1, cursor=None, total="accurate", **kwargs
+    ):
+        """Stream a page of matching resources from a server-side cursor.
 
-        elif len(result) == 0:
-            #  404 Results for supplied params Not Found
-            return None, count, 404
+        Takes the arguments of `search`. The total and the `_cursor` of the
+        next page are set on the returned `PageStream` once it is read.
+        """
+        query = cls.query.filter_by(**cls.filter_params(**kwargs)).filter(
+            *search_clauses(cls, kwargs)
+        )
+        count = None
 
-        return result[0], count, 200
+        if total == "accurate":
+            matches = query.add_columns(func.count().over().label("total")).subquery()
+            resource = aliased(cls, matches)
+            page_query = db.session.query(resource, matches.c.total)
+        else:
+            if total == "estimate":
+                count = cls.estimate_count(query)
+            resource = cls
+            page_query = query
+
+        # The order must be set before OFFSET and LIMIT are applied
+        page_query = page_query.order_by(resource.id)
+        if cursor:
+            page_query = page_query.filter(resource.id > cursor)
+        else:
+            page_query = page_query.offset((page - 1) * per_page)
+
+        # One more row than requested tells if there is a next page
+        page_query = page_query.limit(per_page + 1).yield_per(
+            min(per_page + 1, STREAM_BATCH_SIZE)
+        )
+
+        if total != "accurate":
+            return PageStream(
+                page_query, per_page, lambda row: row, lambda row: row.id, count
+            )
+
+        def build(row):
+            stream.total = row.total
+            return row[0]
+
+        def finish(stream):
+            if stream.total is None:
+                # Past the last page the window has no row to report on
+                stream.total = query.count() if (cursor or page > 1) else 0
+
+        stream = PageStream(
+            page_query, per_page, build, lambda row: row[0].id, finish=finish
+        )
+        return stream
+
+    @classmethod
+    def estimate_count(cls, query):
+        """The number of rows the planner expects a query to return."""
+        statement = query.statement.compile(dialect=db.engine.dialect)
+        plan = (
+            db.session.connection()
+            .execute("EXPLAIN (FORMAT JSON) " + str(statement), statement.params)
+            .scalar()
+        )
+
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
 
     @classmethod
     def get_by_id(cls, id, include_deleted=False):
@@ -148,27 +392,40 @@ class CRUDMixin(object):
          None, 410 --> This is returned if the resource was deleted.
          None, 404 --> Not Found:
         """
-        result = cls.query.filter_by(id=id, is_deleted=include_deleted).first()
-
-        qq_history = text(
-            "SELECT * FROM \"{0}_history\" WHERE (id::text='{1}'::text)".format(
-                cls.__tablename__, id
-            )
+        history_cls = cls.__history_mapper__.class_
+        base = cls.__table__.alias("deleted_base")
+
+        # The live row, the latest history row of a resource that no longer
+        # has a live row and the status are all resolved in one round-trip.
+        status = case(
+            [
+                (cls.id.isnot(None), 200),
+                (history_cls.id.isnot(None), 410),
+                (
+                    exists().where(and_(base.c.id == id, base.c.is_deleted.is_(True))),
+                    410,
+                ),
+            ],
+            else_=404,
+        )
+        probe = select([literal_column("1").label("probe")]).alias("probe")
+
+        result, history_model, status_code = (
+            db.session.query(cls, history_cls, status.label("status"))
+            .select_from(probe)
+            .outerjoin(cls, and_(cls.id == id, cls.is_deleted == include_deleted))
+            .outerjoin(history_cls, and_(cls.id.is_(None), history_cls.id == id))
+            .order_by(history_cls.resource_version.desc())
+            .first()
         )
-        history_model = db.session.execute(qq_history).first()
-        base_deleted = cls.query.filter_by(id=id, is_deleted=True).first()
 
-        if result:
-            return result, 200
-        elif history_model or base_deleted:
+        if status_code == 410:
             """This will be interpreted as HTTP_STATUS_CODE 410.
             Means the resource is deleted but it's history exists.
             Returning meta is important to populate Etags and last_modified
             headers for resource contention"""
-            result = unpack_resource_helper(cls, history_model)
-            return result, 410
-        else:
-            return None, 404
+            result = unpack_history_helper(cls, history_model)
+        return result, status_code
 
     @classmethod
     def get_by_vid(cls, vid, key, include_deleted=False):
@@ -179,58 +436,38 @@ class CRUDMixin(object):
         :param key:
         :return The result:
         """
+        # Base and history rows are matched on the (id, (meta).versionId)
+        # expression indexes and ranked so that live rows win over deleted
+        # ones and base rows over history rows.
+        cols = cls.__table__.columns.keys()
+        str_cols = ", ".join('"{0}"'.format(col) for col in cols)
         qq = text(
-            'SELECT * FROM "{0}" WHERE ('
-            "(\"{0}\".meta).versionId)::text='{1}'::text AND "
-            '"{0}".id::text=\'{2}\'::text AND "{0}".is_deleted={3}'.format(
-                cls.__tablename__, vid, key, include_deleted
-            )
-        )
-
-        qq_history = text(
-            'SELECT * FROM "{0}_history" WHERE ('
-            "(\"{0}_history\".meta).versionId)::text='{1}'::text AND "
-            "\"{0}_history\".id::text='{2}'::text AND "
-            '"{0}_history".is_deleted={3}'.format(
-                cls.__tablename__, vid, key, include_deleted
+            "SELECT * FROM ("
+            'SELECT {1}, 0 AS source, is_deleted <> :include_deleted AS gone FROM "{0}"'
+            " WHERE id = :key AND (meta).versionId = :vid"
+            " AND (is_deleted = :include_deleted OR is_deleted) "
+            "UNION ALL "
+            "SELECT {1}, 1 AS source, is_deleted <> :include_deleted AS gone "
+            'FROM "{0}_history"'
+            " WHERE id = :key AND (meta).versionId = :vid"
+            " AND (is_deleted = :include_deleted OR is_deleted)"
+            ") AS versions ORDER BY gone, source LIMIT 1".format(
+                cls.__tablename__, str_cols
             )
         )
+        row = db.session.execute(
+            qq, {"key": key, "vid": vid, "include_deleted": include_deleted}
+        ).first()
 
-        qq_deleted_history = text(
-            'SELECT * FROM "{0}_history" WHERE ('
-            "(\"{0}_history\".meta).versionId)::text='{1}'::text AND "
-            "\"{0}_history\".id::text='{2}'::text AND "
-            '"{0}_history".is_deleted=True'.format(cls.__tablename__, vid, key)
-        )
-
-        qq_deleted_base = text(
-            'SELECT * FROM "{0}" WHERE ('
-            "(\"{0}\".meta).versionId)::text='{1}'::text AND "
-            '"{0}".id::text=\'{2}\'::text AND "{0}".is_deleted=True'.format(
-                cls.__tablename__, vid, key
-            )
-        )
-
-        base_model = db.session.execute(qq).first()
-        history_model = db.session.execute(qq_history).first()
-        deleted_base = db.session.execute(qq_deleted_base).first()
-        deleted_history = db.session.execute(qq_deleted_history).first()
-
-        if base_model:
-            result = unpack_resource_helper(cls, base_model)
-            return result, 200
-        elif history_model:
-            result = unpack_resource_helper(cls, history_model)
-            return result, 200
-        elif deleted_base:
-            # The resource is marked as deleted so return a `401: GONE`
-            return deleted_base, 410
-        elif deleted_history:
-            # The resource is marked as deleted so return a `401: GONE`
-            return deleted_history, 410
-        else:
+        if not row:
             return None, 404
 
+        result = unpack_resource_helper(cls, {col: row[col] for col in cols})
+        if row["gone"]:
+            # The resource is marked as deleted so return a `410: GONE`
+            return result, 410
+        return result, 200
+
     @classmethod
     def get_summary(cls, id, summary):
         """Get the summary of a resource based on specified summary param.
@@ -252,6 +489,7 @@ class CRUDMixin(object):
             # Removes the text element
             result, status_code = cls.get_by_id(id)
             result.text = None
+            result.render_narrative = False
 
             subset = tag_summary_resource(result)
             return subset, status_code
@@ -294,40 +532,118 @@ class CRUDMixin(object):
         return result, status_code
 
     @classmethod
-    def get_history(cls, key=None, all=False):
+    def get_history(cls, key=None, all=False, **kwargs):
         """Get the record history for a resource instance.
 
         :param key: the logical id of the resource
         :param all: Toggle to get _history of all resources in the system
+        :param kwargs: Paging arguments of `get_history_page`
         :return resource history:
         """
-        if key:
-            history = text(
-                'SELECT * FROM "{0}_history" WHERE "{0}_history".id::text='
-                "'{1}' AND is_deleted=False".format(cls.__tablename__, key)
-            )
+        result, next_cursor, status_code = cls.get_history_page(key=key, **kwargs)
+        return result, status_code
 
-            base = text(
-                'SELECT * FROM "{0}" WHERE "{0}".id::text=\'{1}\' AND '
-                "is_deleted=False".format(cls.__tablename__, key)
-            )
+    @classmethod
+    def get_history_page(cls, key=None, count=ITEMS_PER_PAGE, since=None, cursor=None):
+        """Get a page of the history of a resource type or instance.
+
+        Takes the arguments of `history_stream`.
+
+        :return (resource history, `_cursor` of the next page, status code):
+        """
+        stream = cls.history_stream(key=key, count=count, since=since, cursor=cursor)
+        result = list(stream)
+        if not result:
+            return None, None, 404
 
-            history_model = db.session.execute(history).fetchall()
-            base_model = db.session.execute(base).fetchall()
+        return result, stream.next_cursor, 200
 
-            history_model.extend(base_model)
+    @classmethod
+    def history_stream(cls, key=None, count=ITEMS_PER_PAGE, since=None, cursor=None):
+        """Get a page of the history of a resource type or instance.
+
+        Versions are ordered by (`resource_changed`, `resource_version`, `id`)
+        and a page starts right after the `cursor` position, so every page is
+        an index range scan whatever the length of the history. The id breaks
+        the ties between resources changed in the same flush. Rows are read
+        from a server-side cursor and built one at a time as the returned
+        stream is iterated.
+
+        The current version of a resource instance is always the last entry
+        of its history.
+
+        :param key: the logical id of the resource. All the resource instances
+                    when not provided
+        :param count: Number of versions in the page
+        :param since: Only versions changed at or after this (UTC) datetime
+        :param cursor: `_cursor` of the previous page
+        :return `PageStream` of the resource versions:
+        """
+        cols = cls.__table__.columns.keys()
+        str_cols = ", ".join('"{0}"'.format(col) for col in cols)
+        params = {"count": count + 1}
+
+        if key:
+            params["key"] = key
+            versions = (
+                'SELECT {1}, resource_changed FROM "{0}_history" '
+                "WHERE id = :key AND is_deleted = False "
+                "UNION ALL "
+                "SELECT {1}, (now() AT TIME ZONE 'UTC') AS resource_changed "
+                'FROM "{0}" WHERE id = :key AND is_deleted = False'
+            )
         else:
-            qq_history = text('SELECT * FROM "{0}_history"'.format(cls.__tablename__))
-            history_model = db.session.execute(qq_history).fetchall()
+            versions = 'SELECT {1}, resource_changed FROM "{0}_history"'
+
+        conditions = ["TRUE"]
+        if since:
+            params["since"] = since
+            conditions.append("resource_changed >= :since")
+
+        if cursor:
+            (
+                params["changed"],
+                params["version"],
+                params["cursor_id"],
+            ) = decode_history_cursor(cursor)
+            conditions.append(
+                "(resource_changed, resource_version, id) > "
+                "(:changed, :version, :cursor_id)"
+            )
 
-        if history_model:
-            result = unpack_resource_helper(cls, history_model)
-            return result, 200
-        return None, 404
+        qq = text(
+            "SELECT * FROM ({0}) AS versions WHERE {1} "
+            "ORDER BY resource_changed, resource_version, id LIMIT :count".format(
+                versions.format(cls.__tablename__, str_cols), " AND ".join(conditions)
+            )
+        )
+
+        rows = db.session.execute(qq.execution_options(stream_results=True), params)
+        return PageStream(
+            rows,
+            count,
+            lambda row: unpack_resource_row(cls, row),
+            lambda row: encode_history_cursor(
+                row["resource_changed"], row["resource_version"], row["id"]
+            ),
+        )
 
     def update(self, patch=False, **kwargs):
         """Updates a resource instance.
 
+        :param patch: Bool to PATCH on update, default is False (PUT)
+        :param kwargs:
+        """
+        with CodeValidationBatch():
+            # Coded values are collected while the fields are set and the
+            # resource is flushed and then validated in one pass on save
+            self.assign(patch=patch, **kwargs)
+            self.save()
+        return self, 200
+
+    def assign(self, patch=False, **kwargs):
+        """Set the fields of an update without saving the resource.
+
         :param patch: Bool to PATCH on update, default is False (PUT)
         :param kwargs:
         """
@@ -361,12 +677,14 @@ class CRUDMixin(object):
         if patch:
             # PATCH the resource
             for attr, value in kwargs.items():
-                setattr(self, attr, value)
+                if not self.composite_unchanged(attr, value):
+                    setattr(self, attr, value)
 
         else:
             # PUT the resource
             for col in col_names:
-                setattr(self, col, kwargs.get(col))
+                if not self.composite_unchanged(col, kwargs.get(col)):
+                    setattr(self, col, kwargs.get(col))
 
             # FHIR update through PUT can bring a deleted resource back to life.
             # That is the default behaviour here to mark resource as not
@@ -380,8 +698,29 @@ class CRUDMixin(object):
                 setattr(self, "is_deleted", kwargs.get("is_deleted"))
                 setattr(self, "deleted_at", kwargs.get("deleted_at"))
 
-        self.save()
-        return self, 200
+    def composite_unchanged(self, name, value):
+        """True when `value` is the composite value loaded from the database.
+
+        The loaded value is kept so that the column is neither written nor
+        validated again when the resource is flushed.
+        """
+        current = self.__dict__.get(name)
+        if value is None or not current:
+            return False
+
+        loaded = current if isinstance(current, list) else [current]
+        if not all(isinstance(item, Trusted) for item in loaded):
+            return False
+
+        compose = PgComposite.composer(self.__table__.columns[name].type)
+        if compose is None:
+            return False
+
+        try:
+            return compose(value) == current
+        except Exception:
+            # The value is rejected when it is bound
+            return False
 
     def save(self):
         """
@@ -392,6 +731,11 @@ class CRUDMixin(object):
         """
         try:
             db.session.add(self)
+            db.session.flush()
+
+            # Validate the codes collected while building and flushing the
+            # resource before anything is committed
+            resolve_active_batch()
             db.session.commit()
             return self
         except Exception:
@@ -414,12 +758,16 @@ class CRUDMixin(object):
                 raise
         # Soft delete
         else:
-            now = datetime.now(timezone.utc)
-            str_now = datetime.strftime(now, "%Y-%m-%dT%H:%M:%S%z")
-            data = {
-                "is_deleted": delete,
-                "deleted_at": str_now if delete else None,
-                "meta": {"lastUpdated": str_now},
-            }
-            self.update(**data)
+            self.update(**self.deleted_fields(delete))
         return self, 204
+
+    @staticmethod
+    def deleted_fields(delete=True):
+        """The fields set by a soft delete (or un-delete) of a resource."""
+        now = datetime.now(timezone.utc)
+        str_now = datetime.strftime(now, "%Y-%m-%dT%H:%M:%S%z")
+        return {
+            "is_deleted": delete,
+            "deleted_at": str_now if delete else None,
+            "meta": {"lastUpdated": str_now},
+        }
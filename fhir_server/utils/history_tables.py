@@ -1,12 +1,16 @@
 """Versioned mixin class and other utilities."""
 
+from collections import OrderedDict
+
 from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.orm import mapper, attributes, object_mapper
 from sqlalchemy.orm.exc import UnmappedColumnError
 from sqlalchemy import Table, Column, ForeignKeyConstraint, Integer, DateTime
-from sqlalchemy import event, util
+from sqlalchemy import event, util, literal, select, tuple_
 import datetime
-from sqlalchemy.orm.properties import RelationshipProperty
+from sqlalchemy.orm.properties import ColumnProperty, RelationshipProperty
+
+from fhir_server.configs.constants import HISTORY_BACKEND
 
 
 def col_references_table(col, table):
@@ -23,11 +27,9 @@ def _is_versioning_col(col):
 def _history_mapper(local_mapper):
     cls = local_mapper.class_
 
-    # set the "active_history" flag
-    # on on column-mapped attributes so that the old version
-    # of the info is always loaded (currently sets it on all attributes)
-    for prop in local_mapper.iterate_properties:
-        getattr(local_mapper.class_, prop.key).impl.active_history = True
+    # the "active_history" flag is left off: setting an attribute does not
+    # load its old value. The previous version is read from the database row
+    # at flush time, see `create_versions` and `_row_image`.
 
     super_mapper = local_mapper.inherits
     super_history_mapper = getattr(cls, "__history_mapper__", None)
@@ -181,6 +183,9 @@ def create_version(obj, session, deleted=False):
 
     obj_changed = False
 
+    # attributes whose old value is not loaded, unchanged or set
+    unloaded, replaced = [], []
+
     for om, hm in zip(obj_mapper.iterate_to_root(), history_mapper.iterate_to_root()):
         if hm.single:
             continue
@@ -205,9 +210,13 @@ def create_version(obj, session, deleted=False):
                 continue
 
             # expired object attributes and also deferred cols might not
-            # be in the dict.  force it to load no matter what by
-            # using getattr().
+            # be in the dict. their value is read with the other old values
+            # from the database row, or loaded by getattr() when there is
+            # no row yet.
             if prop.key not in obj_state.dict:
+                if obj_state.has_identity:
+                    unloaded.append(prop)
+                    continue
                 getattr(obj, prop.key)
 
             a, u, d = attributes.get_history(obj, prop.key)
@@ -218,26 +227,22 @@ def create_version(obj, session, deleted=False):
             elif u:
                 attr[prop.key] = u[0]
             elif a:
-                # if the attribute had no value.
+                # if the attribute had no value, or it was set without
+                # loading the value it replaced.
                 attr[prop.key] = a[0]
-                obj_changed = True
+                if _replaced_unloaded(obj_state, prop):
+                    replaced.append(prop)
+                else:
+                    obj_changed = True
+
+    if unloaded or replaced:
+        old = _row_image(obj, obj_mapper, unloaded + replaced, session)
+        if not obj_changed:
+            obj_changed = _values_changed(obj, replaced, old)
+        attr.update(old)
 
     if not obj_changed:
-        # not changed, but we have relationships.  OK
-        # check those too
-        for prop in obj_mapper.iterate_properties:
-            if (
-                isinstance(prop, RelationshipProperty)
-                and attributes.get_history(
-                    obj, prop.key, passive=attributes.PASSIVE_NO_INITIALIZE
-                ).has_changes()
-            ):
-                for p in prop.local_columns:
-                    if p.foreign_keys:
-                        obj_changed = True
-                        break
-                if obj_changed is True:
-                    break
+        obj_changed = _relationships_changed(obj, obj_mapper)
 
     if not obj_changed and not deleted:
         return
@@ -250,9 +255,147 @@ def create_version(obj, session, deleted=False):
     obj.resource_version += 1
 
 
+def _replaced_unloaded(state, prop):
+    """True when `prop` was set without loading the value it replaced."""
+    return (
+        state.has_identity
+        and state.committed_state.get(prop.key, attributes.NO_VALUE)
+        is attributes.NO_VALUE
+    )
+
+
+def _row_image(obj, obj_mapper, props, session):
+    """The values of `props` in the database row of a persistent `obj`.
+
+    Runs within `before_flush`, so the row still holds the previous version.
+    """
+    identity = attributes.instance_state(obj).identity
+    query = session.query(*[getattr(obj_mapper.class_, prop.key) for prop in props])
+    for col, value in zip(obj_mapper.primary_key, identity):
+        query = query.filter(col == value)
+
+    row = query.first()
+    if row is None:
+        return {}
+    return {prop.key: value for prop, value in zip(props, row)}
+
+
+def _values_changed(obj, props, old):
+    """True when one of `props` of `obj` differs from its `old` value."""
+    for prop in props:
+        compare = prop.columns[0].type.compare_values
+        if not compare(getattr(obj, prop.key), old.get(prop.key)):
+            return True
+    return False
+
+
+def _relationships_changed(obj, obj_mapper):
+    """True when a many-to-one relationship of `obj` points somewhere else."""
+    for prop in obj_mapper.iterate_properties:
+        if (
+            isinstance(prop, RelationshipProperty)
+            and attributes.get_history(
+                obj, prop.key, passive=attributes.PASSIVE_NO_INITIALIZE
+            ).has_changes()
+        ):
+            for p in prop.local_columns:
+                if p.foreign_keys:
+                    return True
+    return False
+
+
+def _obj_changed(obj, obj_mapper, session):
+    """True when a column of `obj` has a pending change, without loading it.
+
+    Columns set without loading the value they replace are compared with
+    the database row.
+    """
+    state = attributes.instance_state(obj)
+    replaced = []
+    for prop in obj_mapper.iterate_properties:
+        if not isinstance(prop, ColumnProperty):
+            continue
+
+        history = attributes.get_history(
+            obj, prop.key, passive=attributes.PASSIVE_NO_INITIALIZE
+        )
+        if history.added and _replaced_unloaded(state, prop):
+            replaced.append(prop)
+        elif history.has_changes():
+            return True
+
+    if replaced and _values_changed(
+        obj, replaced, _row_image(obj, obj_mapper, replaced, session)
+    ):
+        return True
+    return _relationships_changed(obj, obj_mapper)
+
+
+def create_versions(objs, session):
+    """Copy the current rows of `objs` to their history tables.
+
+    The previous version of an object is its row in the database, before
+    the flush writes the new one, so the history rows of all the changed
+    objects of a table are written by one INSERT ... SELECT. Objects whose
+    columns did not change are skipped, unless deleted, like in
+    `create_version`.
+
+    :param objs: (object, deleted) pairs
+    """
+    changed_at = datetime.datetime.utcnow()
+    versions = OrderedDict()
+
+    for obj, deleted in objs:
+        obj_mapper = object_mapper(obj)
+        if obj_mapper.inherits is not None:
+            # The versions of inheriting mappers span several tables
+            create_version(obj, session, deleted=deleted)
+            continue
+
+        if deleted or _obj_changed(obj, obj_mapper, session):
+            versions.setdefault(obj_mapper, []).append(obj)
+
+    for obj_mapper, changed in versions.items():
+        table = obj_mapper.local_table
+        history_table = obj_mapper.class_.__history_mapper__.local_table
+        columns = [col for col in history_table.c if not _is_versioning_col(col)]
+        keys = [attributes.instance_state(obj).identity for obj in changed]
+        primary_key = list(table.primary_key.columns)
+        if len(primary_key) == 1:
+            matches = primary_key[0].in_([key[0] for key in keys])
+        else:
+            matches = tuple_(*primary_key).in_(keys)
+
+        rows = select(
+            [table.c[col.key] for col in columns]
+            + [
+                table.c.resource_version,
+                literal(changed_at, DateTime).label("resource_changed"),
+            ]
+        ).where(matches)
+
+        session.execute(
+            history_table.insert().from_select(
+                [col.key for col in columns] + ["resource_version", "resource_changed"],
+                rows,
+            )
+        )
+
+        for obj in changed:
+            obj.resource_version += 1
+
+
 def versioned_session(session):
     @event.listens_for(session, "before_flush")
     def before_flush(session, flush_context, instances):
+        if HISTORY_BACKEND == "sql":
+            create_versions(
+                [(obj, False) for obj in versioned_objects(session.dirty)]
+                + [(obj, True) for obj in versioned_objects(session.deleted)],
+                session,
+            )
+            return
+
         for obj in versioned_objects(session.dirty):
             create_version(obj, session)
         for obj in versioned_objects(session.deleted):
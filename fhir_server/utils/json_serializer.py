@@ -1,8 +1,85 @@
 import datetime
 import uuid
-from inspect import getmembers, ismethod
+from functools import lru_cache
 
-from flask import json
+from sqlalchemy import inspect, types
+from sqlalchemy_utils import CompositeArray, CompositeType, JSONType
+
+# Bookkeeping columns that are not part of a FHIR resource
+EXCLUDED_FIELDS = [
+    "updated_at",
+    "is_deleted",
+    "deleted_at",
+    "resource_version",
+    "created_at",
+    "metadata",
+]
+
+TEMPORAL_TYPES = (types.Date, types.DateTime, types.Time)
+SCALAR_TYPES = (types.String, types.Boolean, types.Integer, types.Numeric)
+
+
+def to_primitive(value):
+    """Convert a value read from a column to JSON serializable data.
+
+    Composite values are namedtuples e.g fhir_meta(versionId='1', ...) and
+    are converted to dicts, recursively.
+    """
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    if isinstance(value, tuple):
+        fields = getattr(value, "_fields", None)
+        if fields is None:
+            return [to_primitive(item) for item in value]
+        return {name: to_primitive(item) for name, item in zip(fields, value)}
+    if isinstance(value, list):
+        return [to_primitive(item) for item in value]
+    if isinstance(value, dict):
+        return {key: to_primitive(item) for key, item in value.items()}
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def isoformat(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+
+def column_converter(column_type):
+    """Pick the conversion of a column from its type.
+
+    Scalar columns are copied as is, temporal columns are formatted and
+    composites, arrays and json are walked by `to_primitive`.
+    """
+    if isinstance(column_type, (CompositeType, CompositeArray, JSONType)):
+        return to_primitive
+
+    impl = getattr(column_type, "impl", column_type)
+    impl_type = impl if isinstance(impl, type) else type(impl)
+    if issubclass(impl_type, TEMPORAL_TYPES):
+        return isoformat
+    if issubclass(impl_type, SCALAR_TYPES):
+        return None
+    return to_primitive
+
+
+@lru_cache(maxsize=None)
+def compile_serializer(resource):
+    """Return the `(attribute, converter)` pairs used to serialize `resource`.
+
+    This is built once per resource class from the mapper's columns.
+    """
+    plan = []
+    for prop in inspect(resource).column_attrs:
+        if prop.key.startswith("_") or prop.key in EXCLUDED_FIELDS:
+            continue
+        plan.append((prop.key, column_converter(prop.columns[0].type)))
+
+    return tuple(sorted(plan, key=lambda field: field[0]))
 
 
 class ElementSerializer(object):
@@ -10,93 +87,15 @@ class ElementSerializer(object):
 
     Data returned from the database is converted back to our custom composite
     data types. e.g fhir_meta(id=None, extension=(**mode_data)). This result
-    is not directly serializable into JSON without using some crazy tricks.
-    This mixin abstracts the tricks required for all the composite types created
-    in the server
+    is not directly serializable into JSON. This mixin converts the columns of
+    a resource to plain dicts, lists and strings using a plan compiled once
+    per resource class.
     """
 
-    def _iter_dict(self, data):
-        values = data
-
-        if isinstance(values, dict):
-            for key, val in values.items():
-                if isinstance(val, tuple):
-                    values[key] = self._unpack_tuple(val)
-                elif isinstance(val, list):
-                    for k, v in enumerate(val):
-                        val[k] = self._unpack_tuple(v)
-                    values[key] = val
-                elif isinstance(val, datetime.date):
-                    values[key] = val.isoformat()
-        return values
-
-    def _unpack_tuple(self, values):
-        if isinstance(values, list):
-            for val in values:
-                dict_data = {name: getattr(val, name) for name in val._fields}
-                data = self._unpack_tuple(dict_data)
-        elif isinstance(values, str):
-            data = values
-        elif isinstance(values, datetime.date):
-            data = values.isoformat()
-        else:
-            data = {name: getattr(values, name) for name in values._fields}
-
-        return self._iter_dict(data)
-
     def _to_dict(self):
         fields = {}
-
-        # This removes unnecessary attributes from a response
-        for field in [
-            x
-            for x, y in getmembers(self)
-            if not (ismethod(y))
-            and not x.startswith("_")
-            and not x.startswith("query")
-            and not x.startswith("references")
-            and x
-            not in [
-                "updated_at",
-                "is_deleted",
-                "deleted_at",
-                "resource_version",
-                "created_at",
-                "metadata",
-            ]
-        ]:
-            values = self.__getattribute__(field)
-            if isinstance(values, datetime.date):
-                values = values.isoformat()
-            elif isinstance(values, uuid.UUID):
-                values = str(values)
-            if isinstance(values, list):
-                for key, val in enumerate(values):
-                    if isinstance(val, tuple):
-                        values[key] = self._unpack_tuple(val)
-
-            # Deserialize composite types
-            if str(values).startswith("fhir_"):
-                keys = values._fields
-                for key in keys:
-                    key_values = values.__getattribute__(key)
-                    if isinstance(key_values, list):
-                        for val in key_values:
-                            if isinstance(val, tuple):
-                                attributes = {key: self._unpack_tuple(val)}
-                                values = values._replace(**attributes)
-                    elif isinstance(key_values, tuple):
-                        attributes = {key: self._unpack_tuple(key_values)}
-                        values = values._replace(**attributes)
-                    elif isinstance(key_values, datetime.date):
-                        attributes = {key: key_values.isoformat()}
-                        values = values._replace(**attributes)
-                values = values._asdict()
-
-            try:
-                json.dumps(values)
-                fields[field] = values
-            except TypeError:
-                fields[field] = None
+        for name, converter in compile_serializer(type(self)):
+            value = getattr(self, name)
+            fields[name] = value if converter is None else converter(value)
 
         return fields
@@ -0,0 +1,626 @@
+"""FHIR search parameters.
+
+Each resource has a registry of search parameters (string, token, reference
+and date). A parameter knows the SQL expression it searches on, compiles a
+request value into a where clause over that expression and declares the
+index that backs it. Values inside composite columns are
+extracted by IMMUTABLE sql functions (`SEARCH_FUNCTIONS`) so the same
+expression can be indexed (GIN) and queried.
+
+Example usage::
+    clauses = search_clauses(Patient, {"identifier": ["http://ids|123"]})
+    Patient.query.filter(*clauses)
+"""
+
+import re
+import warnings
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Index, literal_column
+from sqlalchemy.exc import StatementError
+from sqlalchemy.sql.expression import text
+
+# Separates the parts of a searchable string e.g the given and family names
+# so that a search can match the start or the whole of any part.
+PART_SEPARATOR = "\x1f"
+
+SEARCH_FUNCTIONS = [
+    """
+    CREATE OR REPLACE FUNCTION fhir_text_parts(TEXT[])
+    RETURNS TEXT LANGUAGE SQL IMMUTABLE AS $$
+        SELECT chr(31) || lower(array_to_string($1, chr(31))) || chr(31)
+    $$;
+    """,
+    """
+    CREATE OR REPLACE FUNCTION fhir_identifier_tokens(fhir_identifier[])
+    RETURNS TEXT[] LANGUAGE SQL IMMUTABLE AS $$
+        SELECT array_agg(token) FROM unnest($1) AS elm,
+        LATERAL unnest(ARRAY[
+            elm.value,
+            coalesce(elm.system::text, '') || '|' || coalesce(elm.value, ''),
+            elm.system::text || '|']) AS token
+        WHERE token IS NOT NULL
+    $$;
+    """,
+    """
+    CREATE OR REPLACE FUNCTION fhir_codeableconcept_tokens(
+        fhir_codeableconcept[])
+    RETURNS TEXT[] LANGUAGE SQL IMMUTABLE AS $$
+        SELECT array_agg(token) FROM unnest($1) AS elm,
+        LATERAL unnest(elm.coding) AS coding,
+        LATERAL unnest(ARRAY[
+            coding.code,
+            coalesce(coding.system::text, '') || '|' || coalesce(coding.code, ''),
+            coding.system::text || '|']) AS token
+        WHERE token IS NOT NULL
+    $$;
+    """,
+    """
+    CREATE OR REPLACE FUNCTION fhir_contactpoint_tokens(fhir_contactpoint[])
+    RETURNS TEXT[] LANGUAGE SQL IMMUTABLE AS $$
+        SELECT array_agg(token) FROM unnest($1) AS elm,
+        LATERAL unnest(ARRAY[
+            elm.value,
+            coalesce(elm.system, '') || '|' || coalesce(elm.value, ''),
+            elm.system || '|']) AS token
+        WHERE token IS NOT NULL
+    $$;
+    """,
+    """
+    CREATE OR REPLACE FUNCTION fhir_reference_keys(fhir_reference[])
+    RETURNS TEXT[] LANGUAGE SQL IMMUTABLE AS $$
+        SELECT array_agg(DISTINCT token) FROM (
+            SELECT regexp_replace(elm.reference, '/_history/.*$', '') AS ref
+            FROM unnest($1) AS elm) AS refs,
+        LATERAL unnest(ARRAY[
+            ref, substring(ref from '([^/]+/[^/]+)$')]) AS token
+        WHERE token IS NOT NULL
+    $$;
+    """,
+    """
+    CREATE OR REPLACE FUNCTION fhir_humanname_text(fhir_humanname[], TEXT)
+    RETURNS TEXT LANGUAGE SQL IMMUTABLE AS $$
+        SELECT chr(31) || lower(string_agg(array_to_string(
+            CASE $2
+                WHEN 'family' THEN elm.family
+                WHEN 'given' THEN elm.given
+                ELSE coalesce(elm.family, '{}') || coalesce(elm.given, '{}')
+                    || coalesce(elm.prefix, '{}') || coalesce(elm.suffix, '{}')
+                    || ARRAY[elm.text]
+            END, chr(31)), chr(31))) || chr(31)
+        FROM unnest($1) AS elm
+    $$;
+    """,
+    """
+    CREATE OR REPLACE FUNCTION fhir_address_text(fhir_address[], TEXT)
+    RETURNS TEXT LANGUAGE SQL IMMUTABLE AS $$
+        SELECT chr(31) || lower(string_agg(array_to_string(
+            CASE $2
+                WHEN 'city' THEN ARRAY[elm.city]
+                WHEN 'country' THEN ARRAY[elm.country]
+                WHEN 'postalcode' THEN ARRAY[elm.postalcode]
+                WHEN 'state' THEN ARRAY[elm.state]
+                ELSE coalesce(elm.line, '{}') || ARRAY[
+                    elm.city, elm.district, elm.state, elm.postalcode,
+                    elm.country, elm.text]
+            END, chr(31)), chr(31))) || chr(31)
+        FROM unnest($1) AS elm
+    $$;
+    """,
+]
+
+
+def register_search_functions(session):
+    """Create the functions that search expressions and indexes rely on.
+
+    The GIN indexes of the string parameters use the `gin_trgm_ops` operator
+    class of pg_trgm, so the tables can not be created without it. A failure
+    to create the extension is raised rather than warned about.
+    """
+    try:  # pragma: no cover
+        session.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm;"))
+        session.commit()
+    except StatementError as excinfo:
+        session.rollback()
+        raise RuntimeError(
+            "The pg_trgm extension is required by the string search indexes. "
+            "Install the postgresql contrib package or have a superuser run "
+            "CREATE EXTENSION pg_trgm on the database."
+        ) from excinfo
+
+    try:  # pragma: no cover
+        for function in SEARCH_FUNCTIONS:
+            session.execute(text(function))
+        session.commit()
+    except StatementError as excinfo:
+        session.rollback()
+        warnings.warn(excinfo.__repr__(), category=UserWarning, stacklevel=1)
+
+
+def escape_like(value):
+    return re.sub(r"([\\%_])", r"\\\1", value)
+
+
+class SearchError(ValueError):
+    """A search parameter value that can not be compiled."""
+
+
+class SearchQuery(object):
+    """Collects the bind params of the clauses of one search."""
+
+    def __init__(self):
+        self.params = {}
+
+    def bind(self, value, cast=None):
+        name = "search_{0}".format(len(self.params))
+        self.params[name] = value
+        if cast:
+            return "CAST(:{0} AS {1})".format(name, cast)
+        return ":" + name
+
+
+class SearchParameter(object):
+    """A search parameter over one column of a resource.
+
+    :param name: The FHIR name of the parameter e.g `address-city`
+    :param column: The resource column holding the values
+    :param array: True if the column is an array of values
+    :param indexed: Set to False if the column is already indexed
+    """
+
+    type = None
+    modifiers = ["missing"]
+    index_using = "btree"
+
+    def __init__(self, name, column, array=False, indexed=True):
+        self.name = name
+        self.column = column
+        self.array = array
+        self.indexed = indexed
+
+    def column_sql(self, table_name):
+        # Index expressions refer to the bare column
+        if table_name is None:
+            return '"{0}"'.format(self.column)
+        return '"{0}"."{1}"'.format(table_name, self.column)
+
+    def values_sql(self, table_name):
+        """The column as an array so single and repeated values match alike."""
+        if self.array:
+            return self.column_sql(table_name)
+        return "ARRAY[{0}]".format(self.column_sql(table_name))
+
+    def expression(self, table_name):
+        """The indexed SQL expression the parameter searches on."""
+        return self.column_sql(table_name)
+
+    def index_expression(self, table_name):
+        return self.expression(table_name)
+
+    def index_name(self, table_name):
+        return "ix_{0}_search_{1}".format(
+            table_name, self.name.replace("-", "_").lstrip("_").lower()
+        )
+
+    def index(self, table):
+        """Declare the index backing the parameter on a resource table."""
+        return Index(
+            self.index_name(table.name),
+            literal_column(self.index_expression(None)),
+            _table=table,
+            postgresql_using=self.index_using,
+        )
+
+    def index_ddl(self, table_name):
+        return 'CREATE INDEX IF NOT EXISTS "{0}" ON "{1}" USING {2} ({3});'.format(
+            self.index_name(table_name),
+            table_name,
+            self.index_using,
+            self.index_expression(None),
+        )
+
+    def clause(self, table_name, values, query, modifier=None):
+        """Compile the value of a request param into an SQL condition.
+
+        :param values: Comma separated values of the param. Any can match
+        :param query: The `SearchQuery` collecting bind params
+        :param modifier: The modifier of the param e.g `exact` in name:exact
+        """
+        if modifier is not None and modifier not in self.modifiers:
+            raise SearchError(
+                "Unknown modifier {0} for search parameter {1}".format(
+                    modifier, self.name
+                )
+            )
+
+        if modifier == "missing":
+            missing = values.lower() == "true"
+            return "({0} IS {1}NULL)".format(
+                self.column_sql(table_name), "" if missing else "NOT "
+            )
+
+        conditions = [
+            self.value_clause(table_name, value, query, modifier)
+            for value in values.split(",")
+        ]
+        return "({0})".format(" OR ".join(conditions))
+
+    def value_clause(self, table_name, value, query, modifier=None):
+        raise NotImplementedError
+
+
+class StringParameter(SearchParameter):
+    """Case insensitive match on the start, the whole or any part of strings.
+
+    `function` extracts the searchable text of composite values e.g
+    `fhir_humanname_text` and `part` restricts it to one element.
+    """
+
+    type = "string"
+    modifiers = ["missing", "exact", "contains"]
+    index_using = "gin"
+
+    def __init__(self, name, column, array=False, function=None, part=None):
+        super().__init__(name, column, array)
+        self.function = function
+        self.part = part
+
+    def expression(self, table_name):
+        if self.function:
+            return "{0}({1}, '{2}')".format(
+                self.function, self.values_sql(table_name), self.part or "any"
+            )
+
+        # array_to_string is only STABLE so it can not be indexed directly
+        return "fhir_text_parts({0})".format(self.values_sql(table_name))
+
+    def index_expression(self, table_name):
+        return "{0} gin_trgm_ops".format(self.expression(table_name))
+
+    def value_clause(self, table_name, value, query, modifier=None):
+        term = escape_like(value.lower())
+        if modifier == "contains":
+            pattern = "%" + term + "%"
+        elif modifier == "exact":
+            pattern = "%" + PART_SEPARATOR + term + PART_SEPARATOR + "%"
+        else:
+            pattern = "%" + PART_SEPARATOR + term + "%"
+
+        return "{0} LIKE {1}".format(self.expression(table_name), query.bind(pattern))
+
+
+class TokenParameter(SearchParameter):
+    """Match on a code, a `system|code` pair or all the codes of a system.
+
+    `function` extracts the tokens of composite values e.g identifiers or
+    codeable concepts. Without it the parameter compares the column itself.
+    """
+
+    type = "token"
+
+    def __init__(self, name, column, array=False, function=None, indexed=True):
+        super().__init__(name, column, array, indexed)
+        self.function = function
+        if function:
+            self.index_using = "gin"
+
+    def expression(self, table_name):
+        if self.function:
+            return "{0}({1})".format(self.function, self.values_sql(table_name))
+        return self.column_sql(table_name)
+
+    def value_clause(self, table_name, value, query, modifier=None):
+        if self.function:
+            return "{0} @> ARRAY[{1}]".format(
+                self.expression(table_name), query.bind(value)
+            )
+
+        # Plain codes have no system so only the code part is compared
+        code = value.split("|")[-1]
+        if code.lower() in ["true", "false"]:
+            return "{0} = {1}".format(
+                self.expression(table_name), query.bind(code.lower() == "true")
+            )
+        return "{0} = {1}".format(self.expression(table_name), query.bind(code))
+
+
+class ReferenceParameter(SearchParameter):
+    """Match references by `Type/id`, by id or by absolute url.
+
+    :param target: The resource types the reference can point to. An id
+                   alone is looked up on the first one.
+    """
+
+    type = "reference"
+    index_using = "gin"
+
+    def __init__(self, name, column, target, array=False):
+        super().__init__(name, column, array)
+        self.target = target
+
+    def expression(self, table_name):
+        return "fhir_reference_keys({0})".format(self.values_sql(table_name))
+
+    def value_clause(self, table_name, value, query, modifier=None):
+        value = re.sub(r"/_history/.*$", "", value)
+        if "://" in value:
+            # References are also keyed by their `Type/id` tail
+            value = "/".join(value.rstrip("/").split("/")[-2:])
+        elif "/" not in value:
+            value = "{0}/{1}".format(self.target[0], value)
+
+        return "{0} @> ARRAY[{1}]".format(
+            self.expression(table_name), query.bind(value)
+        )
+
+
+class PrefixedParameter(SearchParameter):
+    """A parameter compared with the FHIR eq, ne, lt, gt, le, ge prefixes.
+
+    A value stands for the range of its precision e.g `2016` is the whole
+    year and `2016-05` the whole month.
+    """
+
+    prefixes = ["eq", "ne", "lt", "gt", "le", "ge"]
+
+    def split_prefix(self, value):
+        if value[:2] in self.prefixes:
+            return value[:2], value[2:]
+        return "eq", value
+
+    def compare(self, expression, prefix, lower, upper, bind):
+        """Compare an expression with the [lower, upper) range of a value.
+
+        :param bind: Binds a bound of the range and returns its placeholder
+        """
+        if prefix == "eq":
+            return "({0} >= {1} AND {0} < {2})".format(
+                expression, bind(lower), bind(upper)
+            )
+        elif prefix == "ne":
+            return "({0} < {1} OR {0} >= {2})".format(
+                expression, bind(lower), bind(upper)
+            )
+        elif prefix == "lt":
+            return "{0} < {1}".format(expression, bind(lower))
+        elif prefix == "le":
+            return "{0} < {1}".format(expression, bind(upper))
+        elif prefix == "gt":
+            return "{0} >= {1}".format(expression, bind(upper))
+        return "{0} >= {1}".format(expression, bind(lower))
+
+
+DATE_FORMATS = [
+    (re.compile(r"^\d{4}$"), "%Y"),
+    (re.compile(r"^\d{4}-\d{2}$"), "%Y-%m"),
+    (re.compile(r"^\d{4}-\d{2}-\d{2}$"), "%Y-%m-%d"),
+]
+
+
+def parse_date(value, date_format, text=None):
+    """Parse the date part of a search value, `text` being the whole value."""
+    try:
+        return datetime.strptime(value, date_format)
+    except ValueError:
+        raise SearchError("{0} is not a valid date".format(text or value))
+
+
+def date_range(value):
+    """The [lower, upper) datetimes covered by a FHIR date or dateTime."""
+    for regex, date_format in DATE_FORMATS:
+        if regex.match(value):
+            lower = parse_date(value, date_format)
+            if date_format == "%Y":
+                upper = lower.replace(year=lower.year + 1)
+            elif date_format == "%Y-%m":
+                upper = (lower + timedelta(days=32)).replace(day=1)
+            else:
+                upper = lower + timedelta(days=1)
+            return lower.isoformat(), upper.isoformat()
+
+    match = re.match(
+        r"^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2})(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})?$",
+        value,
+    )
+    if not match:
+        raise SearchError("{0} is not a valid date".format(value))
+
+    timezone = match.group(4) or ""
+    lower = parse_date(match.group(1), "%Y-%m-%dT%H:%M", value)
+    if match.group(2):
+        seconds = int(match.group(2)[1:3])
+        if seconds > 59:
+            raise SearchError("{0} is not a valid date".format(value))
+        lower = lower.replace(second=seconds)
+        upper = lower + timedelta(seconds=1)
+    else:
+        upper = lower + timedelta(minutes=1)
+    return lower.isoformat() + timezone, upper.isoformat() + timezone
+
+
+class DateParameter(PrefixedParameter):
+    """Compare a date, dateTime or instant with the range of a date value.
+
+    :param path: The field of a composite column e.g `lastUpdated` of meta
+    :param sql_type: `date` or `timestamptz`
+    """
+
+    type = "date"
+
+    def __init__(self, name, column, path=None, sql_type="timestamptz", indexed=True):
+        super().__init__(name, column, indexed=indexed)
+        self.path = path
+        self.sql_type = sql_type
+
+    def expression(self, table_name):
+        if self.path:
+            return "({0}).{1}".format(self.column_sql(table_name), self.path)
+        return self.column_sql(table_name)
+
+    def index_expression(self, table_name):
+        return "({0})".format(self.expression(table_name))
+
+    def value_clause(self, table_name, value, query, modifier=None):
+        prefix, value = self.split_prefix(value)
+        lower, upper = date_range(value)
+        if self.sql_type == "date":
+            # Times within a day cover the whole of that day
+            lower, upper = lower[:10], upper[:10]
+            if upper <= lower:
+                upper = (date.fromisoformat(lower) + timedelta(days=1)).isoformat()
+
+        return self.compare(
+            self.expression(table_name),
+            prefix,
+            lower,
+            upper,
+            lambda value: query.bind(value, self.sql_type),
+        )
+
+
+def name_parameters(column):
+    return [
+        StringParameter("name", column, True, "fhir_humanname_text"),
+        StringParameter("family", column, True, "fhir_humanname_text", "family"),
+        StringParameter("given", column, True, "fhir_humanname_text", "given"),
+    ]
+
+
+def address_parameters(column, array=True):
+    return [StringParameter("address", column, array, "fhir_address_text")] + [
+        StringParameter("address-" + part, column, array, "fhir_address_text", part)
+        for part in ["city", "country", "postalcode", "state"]
+    ]
+
+
+def identifier_parameter(column="identifier", array=True):
+    return TokenParameter("identifier", column, array, "fhir_identifier_tokens")
+
+
+RESOURCE_PARAMETERS = [
+    TokenParameter("_id", "id", indexed=False),
+    DateParameter("_lastUpdated", "meta", "lastUpdated"),
+]
+
+SEARCH_PARAMETERS = {
+    "Organization": [
+        TokenParameter("active", "active", indexed=False),
+        identifier_parameter(),
+        StringParameter("name", "name"),
+        TokenParameter("type", "type", function="fhir_codeableconcept_tokens"),
+        ReferenceParameter("partof", "partOf", ["Organization"]),
+        ReferenceParameter("endpoint", "endpoint", ["Endpoint"], array=True),
+    ]
+    + address_parameters("address"),
+    "Patient": [
+        TokenParameter("active", "active", indexed=False),
+        identifier_parameter(),
+        TokenParameter("gender", "gender"),
+        DateParameter("birthdate", "birthDate", sql_type="date"),
+        DateParameter("death-date", "deceasedDateTime"),
+        TokenParameter("telecom", "telecom", True, "fhir_contactpoint_tokens"),
+        ReferenceParameter("organization", "managingOrganization", ["Organization"]),
+        ReferenceParameter(
+            "general-practitioner",
+            "generalPractitioner",
+            ["Practitioner", "Organization"],
+            array=True,
+        ),
+    ]
+    + name_parameters("name")
+    + address_parameters("address"),
+    "Practitioner": [
+        TokenParameter("active", "active", indexed=False),
+        identifier_parameter(),
+        TokenParameter("gender", "gender"),
+        TokenParameter("telecom", "telecom", True, "fhir_contactpoint_tokens"),
+        TokenParameter(
+            "communication", "communication", True, "fhir_codeableconcept_tokens"
+        ),
+    ]
+    + name_parameters("name")
+    + address_parameters("address"),
+    "Location": [
+        identifier_parameter(),
+        StringParameter("name", "name"),
+        TokenParameter("status", "status"),
+        TokenParameter("type", "type", function="fhir_codeableconcept_tokens"),
+        ReferenceParameter("organization", "managingOrganization", ["Organization"]),
+        ReferenceParameter("partof", "partOf", ["Location"]),
+    ]
+    + address_parameters("address", array=False),
+    "HealthcareService": [
+        TokenParameter("active", "active", indexed=False),
+        identifier_parameter(),
+        StringParameter("name", "serviceName"),
+        TokenParameter(
+            "category", "serviceCategory", function="fhir_codeableconcept_tokens"
+        ),
+        TokenParameter("type", "serviceType", True, "fhir_codeableconcept_tokens"),
+        ReferenceParameter("organization", "providedBy", ["Organization"]),
+        ReferenceParameter("location", "location", ["Location"], array=True),
+    ],
+    "StructureDefinition": [
+        TokenParameter("url", "url"),
+        identifier_parameter(),
+        StringParameter("name", "name"),
+        TokenParameter("status", "status"),
+        TokenParameter("version", "version"),
+    ],
+    "ValueSet": [
+        TokenParameter("url", "url"),
+        identifier_parameter(array=False),
+        StringParameter("name", "name"),
+        TokenParameter("status", "status"),
+        TokenParameter("version", "version"),
+    ],
+}
+
+
+def search_parameters(resource):
+    """All the search parameters of a resource, by name."""
+    params = RESOURCE_PARAMETERS + SEARCH_PARAMETERS.get(resource.__tablename__, [])
+    return {param.name: param for param in params}
+
+
+def add_search_indexes(resource):
+    """Declare the indexes backing the search parameters of a resource."""
+    table = resource.__table__
+    names = [index.name for index in table.indexes]
+
+    for param in search_parameters(resource).values():
+        if param.indexed and param.index_name(table.name) not in names:
+            param.index(table)
+
+
+def search_clauses(resource, params):
+    """Compile the search params of a request into SQL conditions.
+
+    :param resource: The resource searched
+    :param params: The request params. A param can be a list of values, each
+                   is a condition that must hold (AND) while the comma
+                   separated values of one condition are alternatives (OR)
+    :return a list of `text` clauses with their bind params:
+    """
+    parameters = search_parameters(resource)
+    table_name = resource.__tablename__
+    query = SearchQuery()
+    conditions = []
+
+    for key, values in params.items():
+        name, _, modifier = key.partition(":")
+        param = parameters.get(name)
+        if param is None:
+            continue
+
+        if not isinstance(values, list):
+            values = [values]
+
+        for value in values:
+            conditions.append(
+                param.clause(table_name, str(value), query, modifier or None)
+            )
+
+    if not conditions:
+        return []
+    return [text(" AND ".join(conditions)).bindparams(**query.params)]
@@ -8,6 +8,8 @@ from flask_script import Manager
 from sqlalchemy_utils import register_composites
 
 from fhir_server.app import create_app, db
+from fhir_server.configs import BULK_IMPORT_BATCH_SIZE
+from fhir_server.utils.bulk import bulk_import as import_ndjson
 from fhir_server.oauth_server.urls import oauth
 
 
@@ -47,6 +49,24 @@ def initdb():
     db.create_all(bind=None)
 
 
+@manager.option("path", help="NDJSON file, one resource per line")
+@manager.option(
+    "-b", "--batch-size", dest="batch_size", type=int, default=BULK_IMPORT_BATCH_SIZE
+)
+def bulk_import(path, batch_size):
+    """Import the resources of an NDJSON file with COPY."""
+    with open(path) as lines:
+        result = import_ndjson(lines, batch_size=batch_size)
+
+    print(
+        "{0} created, {1} updated, {2} rejected".format(
+            result.created, result.updated, len(result.errors)
+        )
+    )
+    for line, error in result.errors:
+        print("line {0}: {1}".format(line, error))
+
+
 @manager.command
 def clean_migrations():
     """cleans up migrations removing unnecessary arguments from autogenerate.
@@ -0,0 +1,46 @@
+"""Add (id, versionId) indexes for versioned reads
+
+Revision ID: c41d7e2a9b10
+Revises: 9f903c1902e9
+Create Date: 2026-10-17 16:40:12.318042
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "c41d7e2a9b10"
+down_revision = "9f903c1902e9"
+
+from alembic import op
+import sqlalchemy as sa
+
+from fhir_server.resources import all_resources
+from fhir_server.utils.crud import version_index_name
+
+
+def _tables():
+    for resource in all_resources:
+        yield resource.__tablename__
+        yield resource.__tablename__ + "_history"
+
+
+def upgrade():
+    conn = op.get_bind()
+    for table in _tables():
+        conn.execute(
+            sa.sql.text(
+                """
+            CREATE INDEX IF NOT EXISTS "{1}" ON "{0}" (
+                id, ((meta).versionId));
+            """.format(
+                    table, version_index_name(table)
+                )
+            )
+        )
+
+
+def downgrade():
+    conn = op.get_bind()
+    for table in _tables():
+        conn.execute(
+            sa.sql.text('DROP INDEX IF EXISTS "{0}";'.format(version_index_name(table)))
+        )
@@ -0,0 +1,42 @@
+"""Add (resource_changed, resource_version, id) indexes for history paging
+
+Revision ID: d7a83f0c5e21
+Revises: c41d7e2a9b10
+Create Date: 2026-10-17 17:05:48.902113
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "d7a83f0c5e21"
+down_revision = "c41d7e2a9b10"
+
+from alembic import op
+import sqlalchemy as sa
+
+from fhir_server.resources import all_resources
+from fhir_server.utils.crud import history_index_name
+
+
+def upgrade():
+    conn = op.get_bind()
+    for resource in all_resources:
+        table = resource.__tablename__ + "_history"
+        conn.execute(
+            sa.sql.text(
+                """
+            CREATE INDEX IF NOT EXISTS "{1}" ON "{0}" (
+                resource_changed, resource_version, id);
+            """.format(
+                    table, history_index_name(table)
+                )
+            )
+        )
+
+
+def downgrade():
+    conn = op.get_bind()
+    for resource in all_resources:
+        table = resource.__tablename__ + "_history"
+        conn.execute(
+            sa.sql.text('DROP INDEX IF EXISTS "{0}";'.format(history_index_name(table)))
+        )
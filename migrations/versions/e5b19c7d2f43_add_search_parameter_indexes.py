@@ -0,0 +1,54 @@
+"""Add search functions and search parameter indexes
+
+Revision ID: e5b19c7d2f43
+Revises: d7a83f0c5e21
+Create Date: 2026-10-17 18:12:30.551872
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "e5b19c7d2f43"
+down_revision = "d7a83f0c5e21"
+
+from alembic import op
+import sqlalchemy as sa
+
+from fhir_server.resources import all_resources
+from fhir_server.utils.search import SEARCH_FUNCTIONS, search_parameters
+
+
+def _indexed_parameters():
+    for resource in all_resources:
+        for param in search_parameters(resource).values():
+            if param.indexed:
+                yield resource.__tablename__, param
+
+
+def upgrade():
+    conn = op.get_bind()
+    conn.execute(sa.sql.text("CREATE EXTENSION IF NOT EXISTS pg_trgm;"))
+
+    for function in SEARCH_FUNCTIONS:
+        conn.execute(sa.sql.text(function))
+
+    for table, param in _indexed_parameters():
+        conn.execute(sa.sql.text(param.index_ddl(table)))
+
+
+def downgrade():
+    conn = op.get_bind()
+    for table, param in _indexed_parameters():
+        conn.execute(
+            sa.sql.text('DROP INDEX IF EXISTS "{0}";'.format(param.index_name(table)))
+        )
+
+    for function in [
+        "fhir_text_parts(TEXT[])",
+        "fhir_identifier_tokens(fhir_identifier[])",
+        "fhir_codeableconcept_tokens(fhir_codeableconcept[])",
+        "fhir_contactpoint_tokens(fhir_contactpoint[])",
+        "fhir_reference_keys(fhir_reference[])",
+        "fhir_humanname_text(fhir_humanname[], TEXT)",
+        "fhir_address_text(fhir_address[], TEXT)",
+    ]:
+        conn.execute(sa.sql.text("DROP FUNCTION IF EXISTS {0};".format(function)))
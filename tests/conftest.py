@@ -10,6 +10,7 @@ from fhir_server.app import db as _db
 
 from fhir_server.app import create_app
 from fhir_server.elements.base.pg_types import register_pg_types
+from fhir_server.helpers.terminology import terminology_cache
 
 
 def create_my_app(config=None):
@@ -25,6 +26,14 @@ def Base():
     return declarative_base()
 
 
+@pytest.fixture(autouse=True)
+def clear_terminology_cache():
+    """Valuesets are mocked per test so cached codes must not leak."""
+    terminology_cache.clear()
+    yield
+    terminology_cache.clear()
+
+
 @pytest.fixture(scope="session")
 def app(request):
     """Session-wide test `Flask` application."""
@@ -0,0 +1,89 @@
+import json
+
+from fhir_server.resources import Organization
+
+
+class TestBundleApis(object):
+    BASE_URL = "/api/v1/"
+
+    def post_bundle(self, client, bundle_type, entries):
+        bundle = {"resourceType": "Bundle", "type": bundle_type, "entry": entries}
+        response = client.post(
+            self.BASE_URL + "?_format=json",
+            content_type="application/json",
+            data=json.dumps(bundle),
+        )
+        return response, json.loads(response.get_data().decode("utf8"))
+
+    def test_transaction_resolves_urn_references(self, client):
+        parent = "urn:uuid:61ebe359-bfdc-4613-8bf2-c5e300945f0a"
+        entries = [
+            {
+                "fullUrl": "urn:uuid:88f151c0-a954-468a-88bd-5ae15c08e059",
+                "resource": {
+                    "resourceType": "Organization",
+                    "name": "Ward",
+                    "partOf": {"reference": parent},
+                },
+                "request": {"method": "POST", "url": "Organization"},
+            },
+            {
+                "fullUrl": parent,
+                "resource": {"resourceType": "Organization", "name": "Hospital"},
+                "request": {"method": "POST", "url": "Organization"},
+            },
+        ]
+        response, data = self.post_bundle(client, "transaction", entries)
+
+        assert response.status_code == 200
+        assert data["type"] == "transaction-response"
+        assert [entry["response"]["status"] for entry in data["entry"]] == [
+            "201 Created",
+            "201 Created",
+        ]
+
+        ward_id = data["entry"][0]["response"]["location"].split("/")[1]
+        hospital_id = data["entry"][1]["response"]["location"].split("/")[1]
+        ward = Organization.query.get(ward_id)
+
+        assert ward.partOf.reference == "Organization/{0}".format(hospital_id)
+        assert Organization.query.get(hospital_id).name == "Hospital"
+
+    def test_failing_transaction_writes_nothing(self, client):
+        entries = [
+            {
+                "resource": {"resourceType": "Organization", "name": "Kept"},
+                "request": {"method": "POST", "url": "Organization"},
+            },
+            {"request": {"method": "DELETE", "url": "Organization/unknown"}},
+        ]
+        response, data = self.post_bundle(client, "transaction", entries)
+
+        assert response.status_code == 404
+        assert data["resourceType"] == "OperationOutcome"
+        assert Organization.query.filter_by(name="Kept").count() == 0
+
+    def test_batch_entries_fail_on_their_own(self, client):
+        entries = [
+            {
+                "resource": {"resourceType": "Organization", "name": "Kept"},
+                "request": {"method": "POST", "url": "Organization"},
+            },
+            {"request": {"method": "DELETE", "url": "Organization/unknown"}},
+        ]
+        response, data = self.post_bundle(client, "batch", entries)
+        statuses = [entry["response"]["status"] for entry in data["entry"]]
+
+        assert response.status_code == 200
+        assert data["type"] == "batch-response"
+        assert statuses == ["201 Created", "404 Not Found"]
+        assert data["entry"][1]["response"]["outcome"]["resourceType"] == (
+            "OperationOutcome"
+        )
+        assert Organization.query.filter_by(name="Kept").count() == 1
+
+    def test_rejects_other_bundle_types(self, client):
+        response, data = self.post_bundle(client, "searchset", [])
+
+        assert response.status_code == 400
+        assert data["resourceType"] == "OperationOutcome"
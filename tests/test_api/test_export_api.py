@@ -0,0 +1,34 @@
+from fhir_server.helpers.export import BulkExporter
+
+
+class TestExportApis(object):
+    EXPORT_URL = "/api/v1/$export"
+
+    def test_kick_off_and_poll(self, app, client, tmpdir):
+        app.exporter = BulkExporter(
+            app, submit=lambda function, *args: function(*args), directory=str(tmpdir)
+        )
+
+        response = client.get(
+            self.EXPORT_URL + "?_type=Organization",
+            headers={"Prefer": "respond-async"},
+        )
+        assert response.status_code == 202
+
+        status_url = response.headers["Content-Location"]
+        response = client.get(status_url)
+        manifest = response.get_json()
+
+        assert response.status_code == 200
+        assert [output["type"] for output in manifest["output"]] == ["Organization"]
+
+        response = client.get(manifest["output"][0]["url"])
+        assert response.status_code == 200
+
+        assert client.delete(status_url).status_code == 202
+        assert client.get(status_url).status_code == 404
+
+    def test_kick_off_requires_respond_async(self, client):
+        response = client.get(self.EXPORT_URL)
+
+        assert response.status_code == 400
@@ -0,0 +1,62 @@
+import json
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from fhir_server.api.json_writer import dumps
+from fhir_server.api.response import clean_dict, json_default
+from fhir_server.elements.complex.quantity import QuantityField
+from fhir_server.utils.json_serializer import to_primitive
+
+
+class TestJsonWriter(object):
+    def resource(self):
+        return {
+            "resourceType": "Patient",
+            "id": "1",
+            "text": None,
+            "extension": {},
+            "meta": {"versionId": "1", "security": None, "tag": {"code": None}},
+            "name": [{"family": ["Smith"], "period": {}}, {}],
+            "active": False,
+            "multipleBirthInteger": 0,
+            "address": [],
+        }
+
+    def test_output_matches_clean_dict(self):
+        expected = json.dumps(clean_dict([self.resource(), self.resource()]))
+
+        assert dumps([self.resource(), self.resource()]) == expected.encode()
+
+    def test_native_types(self):
+        data = {
+            "value": Decimal("1.50"),
+            "lastUpdated": datetime(2016, 8, 4, 15, 13, 29),
+            "id": uuid.UUID(int=1),
+        }
+
+        assert json.loads(dumps(data)) == {
+            "value": 1.5,
+            "lastUpdated": "2016-08-04T15:13:29",
+            "id": "00000000-0000-0000-0000-000000000001",
+        }
+        assert b'"value": 1.50' in dumps(data)
+
+    def test_unknown_types(self):
+        with pytest.raises(TypeError):
+            dumps({"value": object()})
+
+    def test_quantity_with_both_writers(self):
+        quantity = QuantityField().compose({"value": Decimal("5.4"), "unit": "mg"})
+        data = {"resourceType": "Observation", "valueQuantity": to_primitive(quantity)}
+
+        direct = json.loads(dumps(data))
+        fallback = json.loads(json.dumps(clean_dict(data), default=json_default))
+        assert direct == fallback
+        assert direct["valueQuantity"] == {"value": 5.4, "unit": "mg"}
+
+    def test_fallback_unknown_types(self):
+        with pytest.raises(TypeError):
+            json.dumps({"value": object()}, default=json_default)
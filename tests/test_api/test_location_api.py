@@ -26,6 +26,25 @@ class TestLocationApis(object):
         session.merge(data)
         session.commit()
 
+    @pytest.mark.parametrize("writer", ["direct", "clean_dict"])
+    def test_get_decimal_position(self, app, client, session, monkeypatch, writer):
+        monkeypatch.setitem(app.config, "JSON_RESPONSE_WRITER", writer)
+        session.merge(
+            Location(
+                id="2",
+                name="Kisumu",
+                position={"longitude": "34.7617", "latitude": "-0.0917"},
+            )
+        )
+        session.commit()
+
+        response = client.get(self.LOCATION_URL + "/2?_format=json")
+        data = json.loads(response.get_data().decode("utf8"))
+
+        assert response.status_code == 200
+        assert data["position"]["longitude"] == 34.7617
+        assert data["position"]["latitude"] == -0.0917
+
     def test_list(self, client, location):
         response = client.get(self.LOCATION_URL)
         data = json.loads(response.get_data().decode("utf8"))
@@ -1,6 +1,9 @@
 import json
+from unittest.mock import patch
+
 import pytest
 
+from fhir_server.configs import MAX_ITEMS_PER_PAGE
 from fhir_server.resources import Organization
 
 
@@ -39,6 +42,42 @@ class TestOrganizationApis(object):
         assert isinstance(data, list)  # Assert that the response is a list
         assert len(data) == 1  # list
 
+    def test_search_is_paginated_with_a_cursor(self, client, new_org):
+        Organization.create(id="2", name="Second Organization")
+
+        response = client.get(self.ORG_URL + "?_format=json&_count=1")
+        data = json.loads(response.get_data().decode("utf8"))
+        links = {link["relation"]: link["url"] for link in data["link"]}
+
+        assert response.status_code == 200
+        assert data["type"] == "searchset"
+        assert data["total"] == 2
+        assert data["entry"][0]["resource"]["id"] == "1"
+        assert "_cursor=1" in links["next"]
+
+        response = client.get(links["next"])
+        data = json.loads(response.get_data().decode("utf8"))
+
+        assert data["total"] == 2
+        assert data["entry"][0]["resource"]["id"] == "2"
+        assert "next" not in [link["relation"] for link in data["link"]]
+
+    def test_search_count_is_capped(self, client, new_org):
+        with patch.object(
+            Organization, "search_stream", wraps=Organization.search_stream
+        ) as search_stream:
+            response = client.get(self.ORG_URL + "?_format=json&_count=1000000")
+
+        assert response.status_code == 200
+        assert search_stream.call_args[1]["per_page"] == MAX_ITEMS_PER_PAGE
+
+    def test_search_without_total(self, client, new_org):
+        response = client.get(self.ORG_URL + "?_format=json&_total=none")
+        data = json.loads(response.get_data().decode("utf8"))
+
+        assert len(data["entry"]) == 1
+        assert data.get("total") is None
+
     def test_list_history(self, client):
         response = client.get(self.ORG_URL + "/_history")
         data = json.loads(response.get_data().decode("utf8"))
@@ -60,6 +99,74 @@ class TestOrganizationApis(object):
         assert response.status_code == 200
         assert isinstance(data, list)  # Assert that the response is a list
 
+    def test_history_of_unknown_resource_returns_404(self, client):
+        response = client.get(self.ORG_URL + "/unknown/_history?_format=json")
+        data = json.loads(response.get_data().decode("utf8"))
+
+        assert response.status_code == 404
+        assert data["resourceType"] == "OperationOutcome"
+        assert data["issue"][0]["diagnostics"] == "Organization/unknown is not known"
+
+    def test_history_is_paginated_with_a_cursor(self, client, session):
+        # Updates are matched on If-Match against the stored versionId
+        meta = {"versionId": "1"}
+        session.add(Organization(id="1", name=self.name, meta=meta))
+        session.commit()
+
+        for name in ["First Change", "Second Change"]:
+            response = client.put(
+                self.ORG_URL + "/1",
+                content_type="application/json",
+                data=json.dumps(
+                    {"resourceType": "Organization", "name": name, "meta": meta}
+                ),
+                headers={"If-Match": "1"},
+            )
+            assert response.status_code == 200
+
+        response = client.get(self.ORG_URL + "/1/_history?_format=json&_count=2")
+        data = json.loads(response.get_data().decode("utf8"))
+        links = {link["relation"]: link["url"] for link in data["link"]}
+
+        assert response.status_code == 200
+        assert data["type"] == "history"
+        assert len(data["entry"]) == 2
+        assert "_cursor=" in links["next"]
+
+        response = client.get(links["next"])
+        data = json.loads(response.get_data().decode("utf8"))
+
+        assert len(data["entry"]) == 1
+        assert data["entry"][0]["resource"]["name"] == "Second Change"
+        assert "next" not in [link["relation"] for link in data["link"]]
+
+    def test_type_history_pages_versions_changed_in_one_flush(
+        self, client, session, new_org
+    ):
+        for key in ["2", "3"]:
+            session.add(Organization(id=key, name="Organization " + key))
+        session.commit()
+
+        # The versions replaced by one flush share their resource_changed
+        for organization in Organization.query.all():
+            organization.name = "Changed " + organization.id
+        session.commit()
+
+        ids = []
+        url = self.ORG_URL + "/_history?_format=json&_count=1"
+        while url:
+            data = json.loads(client.get(url).get_data().decode("utf8"))
+            ids += [entry["resource"]["id"] for entry in data["entry"]]
+            links = {link["relation"]: link["url"] for link in data["link"]}
+            url = links.get("next")
+
+        assert ids == ["1", "2", "3"]
+
+    def test_history_rejects_invalid_cursor(self, client, new_org):
+        response = client.get(self.ORG_URL + "/1/_history?_cursor=not-a-cursor")
+
+        assert response.status_code == 400
+
     def test_post_ignores_meta_version_and_last_modified(self, client):
         # post some data and assert list has one item
         records = {"name": "Test Organization", "meta": self.meta}
@@ -156,6 +263,12 @@ class TestOrganizationApis(object):
         assert data["id"] == self.id
         assert data["name"] == self.name
 
+    def test_get_by_unknown_vid_returns_404(self, client, new_org):
+        get = client.get(self.ORG_URL + "/1/_history/12")
+
+        assert get.status_code == 404
+        assert "/1/_history/12 is not known" in get.get_data().decode("utf8")
+
     def test_etag_header_has_version_id(self, client, new_org):
         get = client.get(self.ORG_URL + "/1")
 
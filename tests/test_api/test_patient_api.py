@@ -41,6 +41,22 @@ class TestPatientApis(object):
         assert isinstance(data, list)
         assert len(data) == 1
 
+    def test_search_by_family_name(self, client):
+        client.post(
+            self.PATIENT_URL,
+            content_type="application/json",
+            data=json.dumps({"active": True, "name": self.name}),
+        )
+
+        response = client.get(self.PATIENT_URL + "?family=fam")
+        data = json.loads(response.get_data().decode("utf8"))
+        assert response.status_code == 200
+        assert len(data) == 1
+
+        response = client.get(self.PATIENT_URL + "?family:exact=fam")
+        data = json.loads(response.get_data().decode("utf8"))
+        assert len(data) == 0
+
     def test_post(self, client):
         records = {
             "active": True,
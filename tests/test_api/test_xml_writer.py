@@ -0,0 +1,64 @@
+from fhir_server.api import xml_writer
+from fhir_server.api.response import _response_to_xml, clean_dict
+
+
+class TestXmlWriter(object):
+    def resource(self):
+        return {
+            "resourceType": "Organization",
+            "id": "1",
+            "text": None,
+            "meta": {"versionId": "1", "security": None, "tag": {"code": None}},
+            "active": True,
+            "name": 'Karen & "Sons" <é>',
+            "alias": ["Karen", ""],
+            "address": [{"line": ["line1"], "period": {}}, {}],
+            "telecom": [],
+        }
+
+    def test_output_matches_xmltodict(self):
+        expected = _response_to_xml(clean_dict(self.resource()))
+
+        assert xml_writer.dumps(self.resource()).decode() == expected
+
+    def test_bundle_entries_are_wrapped_in_their_resource_type(self):
+        bundle = {
+            "resourceType": "Bundle",
+            "total": 1,
+            "type": "searchset",
+            "entry": [{"resource": self.resource()}],
+        }
+        data = xml_writer.dumps(bundle).decode()
+
+        assert data.startswith(
+            '<Bundle xmlns="http://hl7.org/fhir"><total value="1" />'
+            '<type value="searchset" /><entry><resource><Organization><id value="1" />'
+        )
+        assert data.endswith("</Organization></resource></entry></Bundle>")
+
+    def test_bundle_in_parts(self):
+        parts = [
+            xml_writer.bundle_start({"type": "history"}),
+            xml_writer.bundle_entry(self.resource()),
+            xml_writer.bundle_end({"total": None, "link": []}),
+        ]
+        bundle = {
+            "resourceType": "Bundle",
+            "type": "history",
+            "entry": [{"resource": self.resource()}],
+        }
+
+        assert b"".join(parts) == xml_writer.dumps(bundle)
+
+    def test_bundle_entry_response_members(self):
+        bundle = {
+            "resourceType": "Bundle",
+            "type": "transaction-response",
+            "entry": [{"response": {"status": "201 Created"}}],
+        }
+        data = xml_writer.dumps(bundle).decode()
+
+        assert data.endswith(
+            '<entry><response><status value="201 Created" /></response></entry>'
+            "</Bundle>"
+        )
@@ -0,0 +1,91 @@
+import pytest
+
+from sqlalchemy.dialects import postgresql
+
+from fhir_server.elements.base.complex_mixin import Trusted
+from fhir_server.elements.complex.codeableconcept import CodeableConceptField
+from fhir_server.elements.complex.humanname import HumanNameField
+from fhir_server.resources.identification.patient import PatientContactField
+
+
+class TestCompositePlans(object):
+    dialect = postgresql.dialect()
+
+    def test_compose_nested_arrays(self):
+        """Patient -> Contact -> relationship[] -> coding[] is composed."""
+        contact_type = PatientContactField()
+        process = contact_type.bind_processor(self.dialect)
+
+        value = {
+            "gender": "female",
+            "relationship": [
+                {"text": "Friend", "coding": [{"code": "friend"}, {}]},
+                None,
+            ],
+            "period": {"start": "2011-05-24"},
+        }
+        contact = process(value)
+
+        assert contact.gender == "female"
+        assert contact.name is None
+        relationship = contact.relationship
+        assert len(relationship) == 1
+        assert relationship[0].text == "Friend"
+        assert [coding.code for coding in relationship[0].coding] == ["friend"]
+        assert relationship[0].coding[0].system is None
+        assert contact.period.start == "2011-05-24"
+        assert contact.period.end is None
+
+        # The values are not modified while they are composed
+        assert value["relationship"][0]["coding"] == [{"code": "friend"}, {}]
+
+    def test_compose_empty_array(self):
+        contact_type = PatientContactField()
+        process = contact_type.bind_processor(self.dialect)
+
+        assert process({"relationship": []}).relationship is None
+
+    def test_compose_composed_value(self):
+        concept_type = CodeableConceptField()
+        concept = concept_type.compose({"text": "text", "coding": [{"code": "a"}]})
+
+        assert concept_type.compose(concept) == concept
+
+    def test_unknown_nested_field(self):
+        contact_type = PatientContactField()
+        process = contact_type.bind_processor(self.dialect)
+
+        with pytest.raises(TypeError) as excinfo:
+            process({"relationship": [{"texts": "Friend"}]})
+        assert "Unknown fields ['texts'] in fhir_codeableconcept" in str(excinfo.value)
+
+    def test_result_processor(self):
+        concept_type = CodeableConceptField()
+        concept = concept_type.type_cls(
+            id=None, extension=None, text="text", coding=None
+        )
+        process = concept_type.result_processor(self.dialect, None)
+
+        assert process(concept) == concept
+        assert isinstance(process(concept), Trusted)
+        assert process(None) is None
+
+    def test_trusted_values_are_not_validated(self):
+        name_type = HumanNameField()
+        bind = name_type.bind_processor(self.dialect)
+        read = name_type.result_processor(self.dialect, None)
+
+        # The text is not composed of the other parts of the name
+        name = {"text": "John Doe", "given": ["Jane"]}
+        with pytest.raises(TypeError):
+            bind(name)
+
+        stored = read(name_type.compose(name))
+        assert bind(stored) == stored
+        assert not isinstance(bind(stored), Trusted)
+
+        # A changed value is validated again
+        changed = stored._replace(given=["Jack"])
+        assert not isinstance(changed, Trusted)
+        with pytest.raises(TypeError):
+            bind(changed)
@@ -1,18 +1,125 @@
+import json
+
 import pytest
 
 from sqlalchemy import Column
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.exc import StatementError
 from sqlalchemy_utils import register_composites
 
-from fhir_server.elements.opentype import OpenType
+from fhir_server.elements.opentype import OpenType, validate_extension_values
 from fhir_server.elements import primitives
-from fhir_server.elements.extension import ElementExtension, Extension as ExtensionDef
+from fhir_server.elements.extension import (
+    ElementExtension,
+    Extension as ExtensionDef,
+    ExtensionArray,
+)
 
 
 def test_opentype_coerced():
     assert OpenType.coerce_compared_value(OpenType(), "=", {"key": "value"})
 
 
+class TestOpenType(object):
+    dialect = postgresql.dialect()
+
+    @pytest.mark.parametrize(
+        "value",
+        [
+            {"valueString": "string val"},
+            {"valueInteger": 1},
+            {"valueBoolean": False},
+            {"valueCoding": {"code": "code"}},
+            {"url": "http://hl7.org/fhir/extensions", "extension": []},
+            "string val",
+            None,
+        ],
+    )
+    def test_valid_values(self, value):
+        validate_extension_values([value])
+        bound = OpenType().process_bind_param(value, self.dialect)
+
+        assert bound == (None if value is None else json.dumps(value))
+
+    @pytest.mark.parametrize(
+        "value",
+        [
+            {"valueGuessType": "string val"},
+            {"valueInteger": "1"},
+            {"valueBoolean": 1},
+            {"valueString": "string val", "url": "http://hl7.org/fhir"},
+            {"url": 1},
+            [{"valueString": "string val"}],
+        ],
+    )
+    def test_invalid_values(self, value):
+        with pytest.raises(ValueError) as excinfo:
+            OpenType().process_bind_param(value, self.dialect)
+        assert "The data provided for the extensions field is invalid" in str(
+            excinfo.value
+        )
+
+    def test_bulk_validation(self):
+        validate_extension_values(
+            [{"valueString": "a"}, None, {"url": "http://hl7.org/fhir"}]
+        )
+        with pytest.raises(ValueError):
+            validate_extension_values([{"valueString": "a"}, {"valueGuess": "b"}])
+
+
+class TestExtensionArray(object):
+    dialect = postgresql.dialect()
+
+    def test_bind(self):
+        process = ExtensionArray(ElementExtension()).bind_processor(self.dialect)
+        extensions = process(
+            [
+                {"url": "http://hl7.org/fhir/a", "value": {"valueString": "a"}},
+                {"url": "http://hl7.org/fhir/b"},
+                None,
+            ]
+        )
+
+        assert extensions[0].url == "http://hl7.org/fhir/a"
+        assert extensions[0].value == '{"valueString": "a"}'
+        assert extensions[1].value is None
+        assert extensions[2] is None
+        assert process(None) is None
+
+    def test_bind_same_as_items(self):
+        """The items are bound as the extension type binds them."""
+        extension_type = ElementExtension()
+        bind_item = extension_type.bind_processor(self.dialect)
+        process = ExtensionArray(extension_type).bind_processor(self.dialect)
+        values = [
+            {"url": "http://hl7.org/fhir/a", "value": {"valueInteger": 1}},
+            {"url": "http://hl7.org/fhir/b", "value": None},
+        ]
+
+        assert process(values) == [bind_item(value) for value in values]
+
+    def test_bind_rejects_invalid_value(self):
+        process = ExtensionArray(ElementExtension()).bind_processor(self.dialect)
+        with pytest.raises(ValueError) as excinfo:
+            process(
+                [
+                    {"url": "http://hl7.org/fhir/a", "value": {"valueString": "a"}},
+                    {"url": "http://hl7.org/fhir/b", "value": {"valueGuess": "b"}},
+                ]
+            )
+        assert "The data provided for the extensions field is invalid" in str(
+            excinfo.value
+        )
+
+    def test_bind_rejects_missing_url(self):
+        process = ExtensionArray(ElementExtension()).bind_processor(self.dialect)
+        with pytest.raises(ValueError) as excinfo:
+            process([{"value": {"valueString": "a"}}])
+        assert "Field url in column fhir_extension not nullable" in str(
+            excinfo.value
+        )
+
+
 class TestExtensions(object):
     @pytest.fixture
     def TestExtensionModel(self, Base):
@@ -1,3 +1,4 @@
+import threading
 from unittest.mock import patch
 
 import pytest
@@ -6,6 +7,8 @@ from sqlalchemy import Column
 from sqlalchemy.exc import StatementError
 from sqlalchemy_utils import register_composites
 from fhir_server.elements import primitives
+from fhir_server.elements.base import xhtml_validator
+from fhir_server.elements.base.xhtml_validator import validate_xhtml
 from fhir_server.elements.complex.narrative import NarrativeField
 
 
@@ -155,3 +158,46 @@ class TestNarrative(object):
         with pytest.raises(StatementError) as excinfo:
             session.commit()
         assert "narrative content must not be an empty string" in str(excinfo.value)
+
+
+class TestXHTMLValidator(object):
+    def test_valid_divs_are_parsed_once(self):
+        div = '<div xmlns="http://www.w3.org/1999/xhtml">Parsed once</div>'
+        xhtml_validator.validated_divs.clear()
+
+        with patch.object(
+            xhtml_validator.XHTMLValidator,
+            "feed",
+            autospec=True,
+            side_effect=xhtml_validator.XHTMLValidator.feed,
+        ) as feed:
+            validate_xhtml(div)
+            validate_xhtml(div)
+        assert feed.call_count == 1
+
+    def test_invalid_divs_are_rejected_every_time(self):
+        div = "<div><script>alert(1)</script></div>"
+        for i in range(2):
+            with pytest.raises(TypeError) as excinfo:
+                validate_xhtml(div)
+            assert "The tag script is not valid" in str(excinfo.value)
+
+        # The parser of the thread is ready for the next div
+        validate_xhtml("<div>Valid</div>")
+
+    def test_threads_have_their_own_parser(self):
+        parsers = []
+
+        def validate():
+            validate_xhtml("<div><p>In a thread</p></div>")
+            parsers.append(xhtml_validator.thread_parser())
+
+        threads = [threading.Thread(target=validate) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(parsers) == 2
+        assert parsers[0] is not parsers[1]
+        assert xhtml_validator.thread_parser() not in parsers
@@ -114,3 +114,26 @@ class TestDateTimeField(object):
         now = datetime(2002, 9, 27, 1, 30, 00, 34525)
         result = primitives.validate_local_times(now)
         assert result is None
+
+    def test_ambiguous_local_times_with_naive_date_obj(self):
+        # 01:30 happened twice in US/Eastern when DST ended
+        now = datetime(2002, 10, 27, 1, 30, 00)
+
+        with pytest.raises(AmbiguousTimeError) as excinfo:
+            primitives.validate_local_times(now)
+        assert "Ambiguous Time Error" in str(excinfo.value)
+
+    def test_non_existent_local_times_with_naive_date_obj(self):
+        # 02:30 never happened in US/Eastern when DST started
+        now = datetime(2002, 4, 7, 2, 30, 00)
+
+        with pytest.raises(AmbiguousTimeError):
+            primitives.validate_local_times(now)
+
+    def test_local_time_index_candidates(self):
+        index = primitives.LocalTimeIndex(zones=["US/Eastern", "UTC"])
+        eastern = pytz.timezone("US/Eastern")
+
+        assert list(index.candidates(datetime(2002, 10, 27, 1, 30))) == [eastern]
+        assert list(index.candidates(datetime(2002, 9, 27, 1, 30))) == []
+        index.check(datetime(2002, 9, 27, 1, 30))
@@ -32,6 +32,24 @@ class TestIdField(object):
         result = primitives.IdField().process_bind_param(None, "postgres")
         assert result is None
 
+    def test_validate_many_ids(self):
+        ids = ["aa3-g26", None, "patient.1"]
+        assert primitives.IdField().validate_many(ids) == ids
+
+    def test_validate_many_lists_all_invalid_ids(self):
+        with pytest.raises(TypeError) as excinfo:
+            primitives.IdField().validate_many(["aa3-g26", "::~", "a b"])
+
+        assert "['::~', 'a b'] are invalid values for the fhir id field" in str(
+            excinfo.value
+        )
+
+    def test_patterns_are_shared_by_fields(self):
+        assert primitives.IdField.pattern is primitives.PRIMITIVE_PATTERNS["id"]
+        assert primitives.PRIMITIVE_PATTERNS["code"].validate_many(["ok", " x"]) == [
+            " x"
+        ]
+
     @pytest.fixture
     def TestDataTypesModel(self, Base, session):
         class TestDataTypesModel(Base):
@@ -0,0 +1,62 @@
+import threading
+import time
+
+from fhir_server.helpers.audit import OutcomeAuditSink
+
+
+class TestOutcomeAuditSink(object):
+    outcome = {"resourceType": "OperationOutcome", "issue": [{"code": "invalid"}]}
+
+    def test_outcomes_are_written_in_batches(self):
+        batches = []
+        sink = OutcomeAuditSink(batches.append, batch_size=2, flush_interval=0.05)
+
+        for _ in range(3):
+            assert sink.submit(self.outcome)
+
+        deadline = time.monotonic() + 5
+        while sink.written < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        sink.stop()
+
+        assert [len(batch) for batch in batches] == [2, 1]
+        assert batches[0][0] == self.outcome
+        assert batches[0][0] is not self.outcome
+
+    def test_stop_waits_for_the_batch_being_written(self):
+        writing = threading.Event()
+        batches = []
+
+        def writer(batch):
+            writing.set()
+            time.sleep(0.2)
+            batches.append(batch)
+
+        sink = OutcomeAuditSink(writer, batch_size=1, flush_interval=0.01)
+        sink.submit(self.outcome)
+        assert writing.wait(5)
+        sink.stop()
+
+        assert batches == [[self.outcome]]
+        assert sink.written == 1
+        assert not sink._thread.is_alive()
+
+    def test_outcomes_are_dropped_when_the_queue_is_full(self):
+        sink = OutcomeAuditSink(lambda batch: None, maxsize=1, flush_interval=60)
+        sink._ensure_started = lambda: None
+
+        assert sink.submit(self.outcome)
+        assert not sink.submit(self.outcome)
+        assert sink.dropped == 1
+
+    def test_failed_batches_are_counted(self):
+        def writer(batch):
+            raise ValueError("database is down")
+
+        sink = OutcomeAuditSink(writer, flush_interval=60)
+        sink._ensure_started = lambda: None
+        sink.submit(self.outcome)
+        sink.flush()
+
+        assert sink.failed == 1
+        assert sink.written == 0
@@ -0,0 +1,56 @@
+import json
+import os
+
+import pytest
+
+from fhir_server.helpers.export import BulkExporter, ExportError
+from fhir_server.resources import Organization
+
+
+def run_now(function, *args):
+    """An executor stand-in running the parts of an export in process."""
+    return function(*args)
+
+
+class TestBulkExporter(object):
+    @pytest.fixture
+    def exporter(self, app, tmpdir):
+        return BulkExporter(app, submit=run_now, directory=str(tmpdir))
+
+    def test_parts_are_written_as_ndjson(self, session, exporter):
+        Organization.create(id="1", name="First")
+        Organization.create(id="2", name="Second")
+
+        job_id = exporter.kick_off(["Organization", "Patient"], "http://x/$export")
+        done, total, parts = exporter.status(job_id)
+        manifest = exporter.manifest(job_id, lambda name: "/files/" + name)
+
+        assert (done, total) == (2, 2)
+        assert manifest["output"] == [
+            {"type": "Organization", "url": "/files/Organization.ndjson", "count": 2},
+            {"type": "Patient", "url": "/files/Patient.ndjson", "count": 0},
+        ]
+
+        with open(exporter.file_path(job_id, "Organization.ndjson")) as ndjson:
+            lines = [json.loads(line) for line in ndjson]
+        assert [line["name"] for line in lines] == ["First", "Second"]
+        assert lines[0]["resourceType"] == "Organization"
+
+    def test_status_of_a_running_job(self, tmpdir, app):
+        exporter = BulkExporter(app, submit=lambda *args: None, directory=str(tmpdir))
+        job_id = exporter.kick_off(["Organization"], "http://x/$export")
+
+        assert exporter.status(job_id) == (0, 1, [])
+
+    def test_cancel_removes_the_job(self, session, exporter):
+        job_id = exporter.kick_off(["Organization"], "http://x/$export")
+
+        assert exporter.cancel(job_id)
+        assert exporter.status(job_id) is None
+        assert not os.path.exists(exporter.job_dir(job_id))
+
+    def test_job_ids_can_not_leave_the_export_dir(self, exporter):
+        with pytest.raises(ExportError):
+            exporter.status("../etc")
+
+        assert exporter.file_path("job", "../job.json") is None
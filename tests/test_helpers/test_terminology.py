@@ -0,0 +1,145 @@
+from unittest.mock import patch
+
+import pytest
+import requests
+
+from fhir_server.configs import ADDRESS_USE_URL, ADDRESS_TYPE_URL, DAYS_OF_WEEK
+from fhir_server.helpers.terminology import (
+    TerminologyCache,
+    fetch_valueset_codes_in,
+    valueset_urls,
+    valueset_name,
+    local_valueset_contains,
+    load_local_valueset_codes,
+)
+from fhir_server.helpers.validations import validate_valuesets
+
+
+class TestTerminologyCache(object):
+    valuesets_data = {"count": 2, "data": [{"code": "home"}, {"code": "work"}]}
+
+    @patch("fhir_server.helpers.terminology.requests.get")
+    def test_valueset_is_fetched_once(self, mock_get):
+        mock_get.return_value.json.return_value = self.valuesets_data
+        cache = TerminologyCache()
+
+        assert cache.contains(ADDRESS_USE_URL + "?code=home", "home")
+        assert cache.contains(ADDRESS_USE_URL + "?code=work", "work")
+        assert not cache.contains(ADDRESS_USE_URL + "?code=temp", "temp")
+
+        mock_get.assert_called_once_with(ADDRESS_USE_URL)
+        assert cache.stats()["hits"] == 2
+        assert cache.stats()["misses"] == 1
+
+    @patch("fhir_server.helpers.terminology.requests.get")
+    def test_failed_fetch_is_not_cached(self, mock_get):
+        mock_get.return_value.status_code = 500
+        mock_get.return_value.raise_for_status.side_effect = requests.HTTPError()
+        cache = TerminologyCache()
+
+        with pytest.raises(TypeError) as excinfo:
+            cache.contains(ADDRESS_USE_URL, "home")
+
+        assert "returned a 500 status code" in str(excinfo.value)
+        assert ADDRESS_USE_URL not in cache
+
+        mock_get.return_value.raise_for_status.side_effect = None
+        mock_get.return_value.json.return_value = self.valuesets_data
+        assert cache.contains(ADDRESS_USE_URL, "home")
+
+    @patch("fhir_server.helpers.terminology.requests.get")
+    def test_response_without_data_is_not_cached(self, mock_get):
+        mock_get.return_value.json.return_value = {"message": "Not Found"}
+        cache = TerminologyCache()
+
+        with pytest.raises(TypeError) as excinfo:
+            cache.contains(ADDRESS_USE_URL, "home")
+
+        assert "did not return a valueset" in str(excinfo.value)
+        assert ADDRESS_USE_URL not in cache
+
+    @patch("fhir_server.helpers.terminology.requests.get")
+    def test_failed_lookup_of_codes(self, mock_get):
+        mock_get.return_value.status_code = 404
+        mock_get.return_value.raise_for_status.side_effect = requests.HTTPError()
+
+        with pytest.raises(TypeError):
+            fetch_valueset_codes_in(ADDRESS_USE_URL, {"home"})
+
+    def test_preload_valuesets(self):
+        cache = TerminologyCache(loader=lambda url: ["home"])
+        loaded = cache.preload([ADDRESS_USE_URL, ADDRESS_TYPE_URL])
+
+        assert loaded == 2
+        assert ADDRESS_USE_URL in cache
+        assert ADDRESS_TYPE_URL in cache
+        assert cache.contains(ADDRESS_TYPE_URL, "home")
+        assert cache.stats()["misses"] == 0
+
+    def test_expired_valuesets_are_reloaded(self):
+        loads = []
+
+        def loader(url):
+            loads.append(url)
+            return ["home"]
+
+        cache = TerminologyCache(ttl=-1, loader=loader)
+        cache.contains(ADDRESS_USE_URL, "home")
+        cache.contains(ADDRESS_USE_URL, "home")
+
+        assert len(loads) == 2
+        assert cache.stats()["evictions"] == 1
+
+    def test_least_recently_used_valueset_is_evicted(self):
+        cache = TerminologyCache(maxsize=1, loader=lambda url: ["home"])
+        cache.contains(ADDRESS_USE_URL, "home")
+        cache.contains(ADDRESS_TYPE_URL, "home")
+
+        assert len(cache) == 1
+        assert ADDRESS_TYPE_URL in cache
+        assert ADDRESS_USE_URL not in cache
+
+    def test_valueset_urls_are_read_from_constants(self):
+        urls = valueset_urls()
+
+        assert ADDRESS_USE_URL in urls
+        assert DAYS_OF_WEEK in urls
+
+    @patch("fhir_server.helpers.validations.requests.get")
+    def test_validate_valuesets_with_code_not_in_valueset(self, mock_get):
+        mock_get.return_value.json.return_value = self.valuesets_data
+
+        validate_valuesets("home", ADDRESS_USE_URL + "?code=home", "address use")
+        with pytest.raises(TypeError) as excinfo:
+            validate_valuesets("temp", ADDRESS_USE_URL + "?code=temp", "address use")
+
+        assert "The address use must be defined in" in str(excinfo.value)
+
+    def test_local_valueset_lookups(self):
+        assert valueset_name(ADDRESS_TYPE_URL + "?code=postal") == "address_type"
+        assert local_valueset_contains(ADDRESS_TYPE_URL + "?code=postal", "postal")
+        assert not local_valueset_contains(ADDRESS_TYPE_URL, "home")
+        assert load_local_valueset_codes(ADDRESS_TYPE_URL) == {
+            "postal",
+            "physical",
+            "both",
+        }
+
+    @patch("fhir_server.helpers.terminology.requests.get")
+    def test_valuesets_not_shipped_locally_are_fetched(self, mock_get):
+        mock_get.return_value.json.return_value = self.valuesets_data
+
+        assert local_valueset_contains(ADDRESS_USE_URL + "?code=home", "home")
+        assert not local_valueset_contains(ADDRESS_USE_URL + "?code=temp", "temp")
+        assert load_local_valueset_codes(ADDRESS_USE_URL) == {"home", "work"}
+
+    @patch("fhir_server.helpers.validations.VALUESETS_BACKEND", "local")
+    @patch("fhir_server.helpers.terminology.requests.get")
+    def test_unavailable_local_valueset_is_a_validation_error(self, mock_get):
+        mock_get.return_value.status_code = 404
+        mock_get.return_value.raise_for_status.side_effect = requests.HTTPError()
+
+        with pytest.raises(TypeError) as excinfo:
+            validate_valuesets("home", ADDRESS_USE_URL + "?code=home", "address use")
+
+        assert "returned a 404 status code" in str(excinfo.value)
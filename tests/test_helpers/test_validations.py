@@ -0,0 +1,84 @@
+from unittest.mock import patch
+
+import pytest
+
+from fhir_server.configs import ADDRESS_USE_URL, ADMINISTRATIVE_GENDER_URL
+from fhir_server.helpers.validations import CodeValidationBatch, validate_valuesets
+
+
+class TestCodeValidationBatch(object):
+    valuesets_data = {
+        "count": 3,
+        "data": [{"code": "home"}, {"code": "work"}, {"code": "female"}],
+    }
+
+    @patch("fhir_server.helpers.validations.requests.get")
+    def test_codes_are_resolved_once_per_valueset(self, mock_get):
+        mock_get.return_value.json.return_value = self.valuesets_data
+
+        with CodeValidationBatch() as batch:
+            validate_valuesets("home", ADDRESS_USE_URL + "?code=home", "address use")
+            validate_valuesets("work", ADDRESS_USE_URL + "?code=work", "address use")
+            validate_valuesets("home", ADDRESS_USE_URL + "?code=home", "address use")
+            validate_valuesets(
+                "female", ADMINISTRATIVE_GENDER_URL + "?code=female", "gender"
+            )
+
+            assert len(batch) == 3
+            assert mock_get.call_count == 0
+
+        assert mock_get.call_count == 2
+
+    @patch("fhir_server.helpers.validations.requests.get")
+    def test_all_failures_are_reported_together(self, mock_get):
+        mock_get.return_value.json.return_value = self.valuesets_data
+
+        with pytest.raises(TypeError) as excinfo:
+            with CodeValidationBatch():
+                validate_valuesets(
+                    "temp", ADDRESS_USE_URL + "?code=temp", "address use"
+                )
+                validate_valuesets(
+                    "male", ADMINISTRATIVE_GENDER_URL + "?code=male", "patient gender"
+                )
+                validate_valuesets(
+                    "male",
+                    ADMINISTRATIVE_GENDER_URL + "?code=male",
+                    "patient contact gender",
+                )
+
+        errors = str(excinfo.value).split("; ")
+        assert len(errors) == 3
+        assert "The address use must be defined in" in errors[0]
+        assert "The patient gender must be defined in" in errors[1]
+        assert "The patient contact gender must be defined in" in errors[2]
+
+    @patch("fhir_server.helpers.validations.requests.get")
+    def test_single_failure_is_a_plain_message(self, mock_get):
+        mock_get.return_value.json.return_value = self.valuesets_data
+
+        with pytest.raises(TypeError) as excinfo:
+            with CodeValidationBatch():
+                validate_valuesets(
+                    "temp", ADDRESS_USE_URL + "?code=temp", "address use"
+                )
+
+        assert str(excinfo.value) == (
+            "The address use must be defined in " + ADDRESS_USE_URL + "?code=temp"
+        )
+
+    @patch("fhir_server.helpers.validations.requests.get")
+    def test_nested_batches_resolve_with_the_outer_batch(self, mock_get):
+        mock_get.return_value.json.return_value = self.valuesets_data
+
+        with CodeValidationBatch() as outer:
+            with CodeValidationBatch() as inner:
+                validate_valuesets(
+                    "temp", ADDRESS_USE_URL + "?code=temp", "address use"
+                )
+
+            assert inner is outer
+            assert len(outer) == 1
+            outer.lookups.clear()
+
+        assert CodeValidationBatch.active() is None
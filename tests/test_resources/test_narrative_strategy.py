@@ -0,0 +1,73 @@
+import pytest
+
+from fhir_server.configs import constants
+from fhir_server.resources import gen_default
+from fhir_server.resources.identification.organization import Organization
+
+DIV = '<div xmlns="http://www.w3.org/1999/xhtml">\'Test Organization\'</div>'
+
+
+class TestNarrativeStrategy(object):
+    def test_generated_narrative(self):
+        organization = Organization(name="Test Organization")
+        assert organization.generated_narrative() == {
+            "div": DIV,
+            "status": "generated",
+        }
+
+    @pytest.mark.parametrize("strategy", ["eager", "cached"])
+    def test_narrative_is_written(self, monkeypatch, strategy):
+        monkeypatch.setattr(constants, "NARRATIVE_STRATEGY", strategy)
+        organization = Organization(name="Test Organization")
+
+        gen_default(None, None, organization)
+        assert organization.text == {"div": DIV, "status": "generated"}
+
+        organization.name = "Renamed"
+        gen_default(None, None, organization)
+        assert "Renamed" in organization.text["div"]
+
+    @pytest.mark.parametrize("strategy, kept", [("eager", False), ("cached", True)])
+    def test_unchanged_narrative(self, monkeypatch, strategy, kept):
+        monkeypatch.setattr(constants, "NARRATIVE_STRATEGY", strategy)
+        text = {"div": DIV, "status": "generated"}
+        organization = Organization(name="Test Organization", text=text)
+
+        gen_default(None, None, organization)
+        assert organization.text == text
+        assert (organization.text is text) == kept
+
+    def test_lazy_narrative(self, monkeypatch):
+        monkeypatch.setattr(constants, "NARRATIVE_STRATEGY", "lazy")
+        organization = Organization(name="Test Organization")
+
+        gen_default(None, None, organization)
+        assert organization.text is None
+        assert organization._to_dict()["text"] == {
+            "div": DIV,
+            "status": "generated",
+        }
+
+        # A narrative given by the client is kept
+        text = {"div": "<div>Custom</div>", "status": "additional"}
+        organization.text = text
+        assert organization._to_dict()["text"] == text
+
+        organization.text = None
+        organization.render_narrative = False
+        assert organization._to_dict()["text"] is None
+
+    def test_lazy_narrative_follows_updates(self, monkeypatch):
+        monkeypatch.setattr(constants, "NARRATIVE_STRATEGY", "cached")
+        organization = Organization(name="Test Organization")
+        gen_default(None, None, organization)
+        assert organization.text["div"] == DIV
+
+        monkeypatch.setattr(constants, "NARRATIVE_STRATEGY", "lazy")
+        # Rows written before the switch still hold a generated narrative
+        organization.name = "Renamed"
+        assert "Renamed" in organization._to_dict()["text"]["div"]
+
+        gen_default(None, None, organization)
+        assert organization.text is None
+        assert "Renamed" in organization._to_dict()["text"]["div"]
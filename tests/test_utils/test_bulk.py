@@ -0,0 +1,75 @@
+import json
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal
+
+from fhir_server.resources import Organization
+from fhir_server.utils.bulk import bulk_import, copy_line, literal
+
+Coding = namedtuple("fhir_coding", ["system", "code", "display"])
+Concept = namedtuple("fhir_codeableconcept", ["coding", "text"])
+
+
+class TestLiterals(object):
+    def test_scalars(self):
+        assert literal(None) is None
+        assert literal(True) == "t"
+        assert literal(Decimal("1.50")) == "1.50"
+        assert literal(datetime(2016, 1, 2, 3, 4)) == "2016-01-02T03:04:00"
+
+    def test_composite_fields_are_quoted(self):
+        value = Coding("http://x", 'a "b"', "")
+
+        assert literal(value) == '(http://x,"a ""b""","")'
+        assert literal(Coding(None, "c", None)) == "(,c,)"
+
+    def test_nested_arrays_of_composites(self):
+        value = Concept([Coding("s", "c", None), None], "some text")
+
+        assert literal(value) == '("{""(s,c,)"",NULL}","some text")'
+
+    def test_array_elements(self):
+        assert literal(["a", "b c", "NULL", None, 'd"']) == (
+            '{a,"b c","NULL",NULL,"d\\""}'
+        )
+
+    def test_copy_line_escapes(self):
+        assert copy_line(["a\tb", None, "c\\d\n"]) == "a\\tb\t\\N\tc\\\\d\\n\n"
+
+
+class TestBulkImport(object):
+    def line(self, key, name):
+        return json.dumps({"resourceType": "Organization", "id": key, "name": name})
+
+    def test_creates_and_updates(self, session):
+        lines = [self.line("bulk-1", "First"), self.line("bulk-2", "Second")]
+        result = bulk_import(lines)
+
+        assert (result.created, result.updated, result.errors) == (2, 0, [])
+        assert Organization.query.get("bulk-2").name == "Second"
+
+        result = bulk_import([self.line("bulk-2", "New")])
+        history = Organization.get_history_page(key="bulk-2")[0]
+
+        assert (result.created, result.updated) == (0, 1)
+        assert [version.name for version in history] == ["Second", "New"]
+
+    def test_batches_are_not_merged_again(self, session):
+        lines = [self.line("bulk-3", "Third"), self.line("bulk-4", "Fourth")]
+        result = bulk_import(lines, batch_size=1)
+
+        # Each batch only merges its own record
+        assert (result.created, result.updated) == (2, 0)
+        assert len(Organization.get_history_page(key="bulk-3")[0]) == 1
+
+    def test_rejects_invalid_records(self, session):
+        lines = [
+            self.line("bulk-5", "Fifth"),
+            json.dumps({"resourceType": "Organization", "id": "not valid!"}),
+            json.dumps({"resourceType": "Unknown"}),
+            "",
+        ]
+        result = bulk_import(lines, batch_size=1)
+
+        assert result.created == 1
+        assert [line for line, error in result.errors] == [2, 3]
@@ -0,0 +1,92 @@
+from datetime import datetime
+
+import pytest
+
+from fhir_server.resources import Organization
+from fhir_server.utils.crud import (
+    PageStream,
+    decode_history_cursor,
+    encode_history_cursor,
+)
+
+
+class TestPageStream(object):
+    def stream(self, rows, count=2):
+        return PageStream(
+            rows, count, lambda row: row * 10, lambda row: "after-%s" % row
+        )
+
+    def test_next_cursor_is_set_once_read(self):
+        stream = self.stream([1, 2, 3])
+
+        assert stream.next_cursor is None
+        assert list(stream) == [10, 20]
+        assert stream.next_cursor == "after-2"
+
+    def test_last_page(self):
+        stream = self.stream([1, 2])
+
+        assert list(stream) == [10, 20]
+        assert stream.next_cursor is None
+
+    def test_is_empty_reads_ahead_the_first_row(self):
+        rows = iter([1, 2, 3])
+        stream = self.stream(rows)
+
+        assert not stream.is_empty()
+        assert list(stream) == [10, 20]
+        assert self.stream([]).is_empty()
+
+    def test_finish_is_called_after_the_rows(self):
+        calls = []
+        stream = PageStream(
+            [1], 2, lambda row: row, lambda row: row, finish=calls.append
+        )
+
+        assert list(stream) == [1]
+        assert calls == [stream]
+
+
+class TestHistoryCursor(object):
+    def test_round_trip(self):
+        changed = datetime(2016, 12, 31, 10, 0, 5, 120)
+        cursor = encode_history_cursor(changed, 2, "id|with|bars")
+
+        assert decode_history_cursor(cursor) == (changed, 2, "id|with|bars")
+
+    def test_invalid_cursor(self):
+        with pytest.raises(ValueError):
+            decode_history_cursor("not-a-cursor")
+
+
+class TestSearch(object):
+    @pytest.fixture
+    def organizations(self, session):
+        for key in ["1", "2", "3"]:
+            session.add(Organization(id="search-" + key, name="Searched " + key))
+        session.commit()
+
+    def test_first_page(self, organizations):
+        result, total, next_cursor = Organization.search(per_page=2, name="Searched")
+
+        assert [organization.id for organization in result] == ["search-1", "search-2"]
+        assert total == 3
+        assert next_cursor == "search-2"
+
+    def test_page_number(self, organizations):
+        result, total, next_cursor = Organization.search(
+            per_page=2, page=2, name="Searched"
+        )
+
+        assert [organization.id for organization in result] == ["search-3"]
+        assert total == 3
+        assert next_cursor is None
+
+    def test_first_page_without_total(self, organizations):
+        result, total, next_cursor = Organization.search(
+            per_page=2, total="none", name="Searched"
+        )
+
+        assert [organization.id for organization in result] == ["search-1", "search-2"]
+        assert total is None
+        assert next_cursor == "search-2"
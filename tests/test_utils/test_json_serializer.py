@@ -0,0 +1,56 @@
+from collections import namedtuple
+from datetime import date, datetime
+
+from fhir_server.resources import Patient
+from fhir_server.utils.json_serializer import (
+    compile_serializer,
+    isoformat,
+    to_primitive,
+)
+
+Coding = namedtuple("fhir_coding", ["system", "code"])
+Meta = namedtuple("fhir_meta", ["versionId", "lastUpdated", "tag"])
+
+
+class TestElementSerializer(object):
+    def test_plan_skips_bookkeeping_columns(self):
+        fields = dict(compile_serializer(Patient))
+
+        assert "id" in fields and "meta" in fields and "name" in fields
+        for field in ["is_deleted", "created_at", "resource_version"]:
+            assert field not in fields
+
+        assert fields["id"] is None
+        assert fields["birthDate"] is isoformat
+        assert fields["name"] is to_primitive
+        assert compile_serializer(Patient) is compile_serializer(Patient)
+
+    def test_composites_are_converted_recursively(self):
+        meta = Meta(
+            "1",
+            datetime(2016, 8, 4, 15, 13, 29),
+            [Coding("http://tags", "a"), Coding("http://tags", "b")],
+        )
+
+        assert to_primitive(meta) == {
+            "versionId": "1",
+            "lastUpdated": "2016-08-04T15:13:29",
+            "tag": [
+                {"system": "http://tags", "code": "a"},
+                {"system": "http://tags", "code": "b"},
+            ],
+        }
+
+    def test_to_dict(self):
+        patient = Patient(
+            id="1",
+            birthDate=date(1990, 11, 11),
+            meta=Meta("1", None, None),
+            is_deleted=False,
+        )
+        data = patient._to_dict()
+
+        assert data["id"] == "1"
+        assert data["birthDate"] == "1990-11-11"
+        assert data["meta"] == {"versionId": "1", "lastUpdated": None, "tag": None}
+        assert "is_deleted" not in data
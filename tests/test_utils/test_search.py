@@ -0,0 +1,115 @@
+import pytest
+from sqlalchemy.sql.expression import text
+
+from fhir_server.resources import Organization, Patient, all_resources
+from fhir_server.utils.search import (
+    SearchError,
+    SearchQuery,
+    date_range,
+    search_clauses,
+    search_parameters,
+)
+
+
+class TestSearchParameters(object):
+    def compile(self, resource, name, value, modifier=None):
+        query = SearchQuery()
+        param = search_parameters(resource)[name]
+        return param.clause(resource.__tablename__, value, query, modifier), query
+
+    def test_token_over_identifiers(self):
+        clause, query = self.compile(Patient, "identifier", "http://ids|123")
+
+        assert 'fhir_identifier_tokens("Patient"."identifier") @> ARRAY[' in clause
+        assert list(query.params.values()) == ["http://ids|123"]
+
+    def test_string_matches_the_start_of_any_part(self):
+        clause, query = self.compile(Patient, "family", "Smi")
+
+        assert "fhir_humanname_text(\"Patient\".\"name\", 'family') LIKE" in clause
+        assert list(query.params.values()) == ["%\x1fsmi%"]
+
+    def test_string_modifiers(self):
+        clause, query = self.compile(Patient, "name", "Smith", "exact")
+        assert list(query.params.values()) == ["%\x1fsmith\x1f%"]
+
+        clause, query = self.compile(Patient, "name", "mit", "contains")
+        assert list(query.params.values()) == ["%mit%"]
+
+        with pytest.raises(SearchError):
+            self.compile(Patient, "name", "Smith", "below")
+
+    def test_reference_ids_are_qualified_by_their_target(self):
+        clause, query = self.compile(Organization, "partof", "1")
+        assert list(query.params.values()) == ["Organization/1"]
+
+        clause, query = self.compile(
+            Organization, "partof", "http://example.com/fhir/Organization/2"
+        )
+        assert list(query.params.values()) == ["Organization/2"]
+
+    def test_string_over_a_text_column(self):
+        clause, query = self.compile(Organization, "name", "Acme")
+
+        assert 'fhir_text_parts(ARRAY["Organization"."name"]) LIKE' in clause
+        assert list(query.params.values()) == ["%\x1facme%"]
+
+    def test_date_prefixes_compare_with_the_precision_range(self):
+        clause, query = self.compile(Patient, "birthdate", "2016-02")
+
+        assert clause.count("CAST(") == 2
+        assert list(query.params.values()) == ["2016-02-01", "2016-03-01"]
+
+        clause, query = self.compile(Patient, "birthdate", "lt2016")
+        assert list(query.params.values()) == ["2016-01-01"]
+
+    def test_date_ranges(self):
+        assert date_range("2016") == ("2016-01-01T00:00:00", "2017-01-01T00:00:00")
+        assert date_range("2016-12-31T10:00:05Z") == (
+            "2016-12-31T10:00:05Z",
+            "2016-12-31T10:00:06Z",
+        )
+        with pytest.raises(SearchError):
+            date_range("31-12-2016")
+
+    @pytest.mark.parametrize(
+        "value", ["2016-13-01", "2016-02-30", "2016-01-01T25:00", "2016-01-01T10:00:61"]
+    )
+    def test_dates_that_do_not_exist(self, value):
+        with pytest.raises(SearchError) as excinfo:
+            date_range(value)
+        assert "{0} is not a valid date".format(value) in str(excinfo.value)
+
+    def test_search_clauses_and_repeated_params_or_comma_values(self):
+        clauses = search_clauses(
+            Patient, {"gender": ["male,female"], "_format": ["json"], "active": "true"}
+        )
+
+        assert len(clauses) == 1
+        assert " OR " in clauses[0].text
+        assert '"Patient"."active" = :search_2' in clauses[0].text
+
+    def test_indexes_are_declared_on_the_resource_table(self):
+        index_names = [index.name for index in Patient.__table__.indexes]
+
+        assert "ix_Patient_search_identifier" in index_names
+        assert "ix_Patient_search_name" in index_names
+        assert "ix_Patient_search_active" not in index_names
+
+    def test_indexes_can_be_created(self, session):
+        """Index expressions only use IMMUTABLE functions."""
+        for resource in all_resources:
+            table = resource.__tablename__
+            for param in search_parameters(resource).values():
+                if not param.indexed:
+                    continue
+
+                session.execute(
+                    text('DROP INDEX IF EXISTS "{0}";'.format(param.index_name(table)))
+                )
+                session.execute(text(param.index_ddl(table)))
+
+        names = session.execute(
+            text("SELECT indexname FROM pg_indexes WHERE tablename = 'Organization'")
+        ).fetchall()
+        assert ("ix_Organization_search_name",) in names
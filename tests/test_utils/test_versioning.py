@@ -20,12 +20,14 @@ from sqlalchemy.orm import (
     deferred,
     relationship,
     column_property,
+    attributes,
 )
 from sqlalchemy.testing import AssertsCompiledSQL, eq_, assert_raises
 from sqlalchemy.testing.entities import ComparableEntity
 from sqlalchemy.orm import exc as orm_exc
 from sqlalchemy_utils import remove_composite_listeners
 
+from fhir_server.utils import history_tables
 from fhir_server.utils.history_tables import Versioned, versioned_session
 
 
@@ -850,3 +852,72 @@ class TestVersioning(AssertsCompiledSQL):
             DROP TABLE document_history CASCADE;"""
         )
         session1.commit()
+
+    @pytest.mark.parametrize("backend", ["sql", "orm"])
+    def test_history_backends(self, Document, session1, monkeypatch, backend):
+        monkeypatch.setattr(history_tables, "HISTORY_BACKEND", backend)
+        Document.metadata.create_all(session1.connection())
+
+        versioned_session(session1)
+
+        documents = [Document(name="v1-%s" % i) for i in range(3)]
+        session1.add_all(documents)
+        session1.commit()
+
+        documents[0].name = "v2-0"
+        documents[1].name = "v2-1"
+        documents[2].name = "temp"
+        documents[2].name = "v1-2"
+        session1.commit()
+        session1.delete(documents[1])
+        session1.commit()
+
+        DocumentHistory = Document.__history_mapper__.class_
+        history = (
+            session1.query(DocumentHistory)
+            .order_by(DocumentHistory.name, DocumentHistory.resource_version)
+            .all()
+        )
+
+        assert [(h.name, h.resource_version) for h in history] == [
+            ("v1-0", 1),
+            ("v1-1", 1),
+            ("v2-1", 2),
+        ]
+        assert [d.resource_version for d in (documents[0], documents[2])] == [2, 1]
+
+        session1.execute(
+            """
+            DROP TABLE document CASCADE;
+            DROP TABLE document_history CASCADE;"""
+        )
+        session1.commit()
+
+    @pytest.mark.parametrize("backend", ["sql", "orm"])
+    def test_set_without_old_value(self, Document, session1, monkeypatch, backend):
+        monkeypatch.setattr(history_tables, "HISTORY_BACKEND", backend)
+        Document.metadata.create_all(session1.connection())
+
+        versioned_session(session1)
+
+        document = Document(name="Foo")
+        session1.add(document)
+        session1.commit()
+
+        # the expired value is not loaded by the set
+        document.name = "Bar"
+        state = attributes.instance_state(document)
+        assert state.committed_state["name"] is attributes.NO_VALUE
+        session1.commit()
+
+        DocumentHistory = Document.__history_mapper__.class_
+        history = session1.query(DocumentHistory).all()
+        assert [(h.name, h.resource_version) for h in history] == [("Foo", 1)]
+        assert document.resource_version == 2
+
+        session1.execute(
+            """
+            DROP TABLE document CASCADE;
+            DROP TABLE document_history CASCADE;"""
+        )
+        session1.commit()
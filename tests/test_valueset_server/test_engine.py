@@ -0,0 +1,40 @@
+import pytest
+
+from valueset_server.engine import ValuesetEngine
+
+
+class TestValuesetEngine(object):
+    @pytest.fixture
+    def engine(self):
+        return ValuesetEngine()
+
+    def test_load_valueset(self, engine):
+        data = engine.load("address_type")
+        assert [entry["code"] for entry in data] == ["postal", "physical", "both"]
+        assert engine.load("address_type") is data
+
+    def test_lookup_single_value(self, engine):
+        result = engine.lookup("address_type", "code", "postal")
+        assert result == [
+            {
+                "code": "postal",
+                "display": "Postal",
+                "definition": "Mailing addresses - PO Boxes and care-of addresses.",
+            }
+        ]
+
+    def test_lookup_many_values(self, engine):
+        result = engine.lookup("units_of_time", "code", ["s", "min", "unknown"])
+        assert [entry["code"] for entry in result] == ["s", "min"]
+
+    def test_lookup_without_field_returns_all_entries(self, engine):
+        assert engine.lookup("address_type") == engine.load("address_type")
+
+    def test_contains(self, engine):
+        assert engine.contains("address_type", "both")
+        assert not engine.contains("address_type", "home")
+        assert set(engine.codes("address_type")) == {"postal", "physical", "both"}
+
+    def test_unknown_valueset(self, engine):
+        with pytest.raises(FileNotFoundError):
+            engine.load("not_a_valueset")
@@ -0,0 +1,102 @@
+import json
+import os
+import threading
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+class ValuesetEngine(object):
+    """In-process lookups over the valueset json files.
+
+    Each valueset file is read once, on first use, and indexed by
+    (valueset, field, value) so a lookup is a dict access instead of a scan
+    over every entry. The HTTP app in `run.py` and the FHIR server can share
+    the same engine.
+
+    Example usage::
+        engine = ValuesetEngine()
+        engine.lookup('address_type', 'code', ['postal'])
+        engine.contains('address_type', 'postal')
+    """
+
+    def __init__(self, data_dir=DATA_DIR):
+        self.data_dir = data_dir
+
+        self._valuesets = {}
+        self._indexes = {}
+        self._lock = threading.RLock()
+
+    def _read(self, file_path):
+        with open(file_path, "rb") as file_open:
+            return json.load(file_open)
+
+    def load(self, valueset):
+        """Return all the entries of a valueset, reading its file once.
+
+        :param valueset: Name of the valueset e.g `address_type`
+        :return list of the valueset entries:
+        """
+        data = self._valuesets.get(valueset)
+        if data is not None:
+            return data
+
+        with self._lock:
+            if valueset not in self._valuesets:
+                file_path = os.path.join(self.data_dir, valueset + ".json")
+                self._valuesets[valueset] = self._read(file_path)
+            return self._valuesets[valueset]
+
+    def index(self, valueset, field):
+        """Map every value of `field` to the entries holding it."""
+        key = (valueset, field)
+        index = self._indexes.get(key)
+        if index is not None:
+            return index
+
+        with self._lock:
+            if key not in self._indexes:
+                index = {}
+                for entry in self.load(valueset):
+                    try:
+                        index.setdefault(entry[field], []).append(entry)
+                    except (KeyError, TypeError):
+                        # The entry has no such field or its value is not
+                        # hashable e.g a nested concept
+                        continue
+                self._indexes[key] = index
+            return self._indexes[key]
+
+    def lookup(self, valueset, field=None, values=None):
+        """Get the valueset entries whose `field` matches any of `values`.
+
+        :param valueset: Name of the valueset
+        :param field: The entry field to match on. Returns all entries if None
+        :param values: A value or a list of values to match
+        :return list of matching entries:
+        """
+        if field is None:
+            return self.load(valueset)
+
+        if not isinstance(values, (list, tuple, set, frozenset)):
+            values = [values]
+
+        index = self.index(valueset, field)
+        results = []
+        for value in values:
+            results.extend(index.get(value, []))
+        return results
+
+    def codes(self, valueset):
+        """All the codes defined in a valueset."""
+        return self.index(valueset, "code").keys()
+
+    def contains(self, valueset, code):
+        return code in self.index(valueset, "code")
+
+    def clear(self):
+        with self._lock:
+            self._valuesets.clear()
+            self._indexes.clear()
+
+
+valueset_engine = ValuesetEngine()
@@ -1,27 +1,16 @@
-import json
 import os
 import logging
 
 from flask import Flask, request, jsonify
 
+from valueset_server.engine import ValuesetEngine
+
 
 valueset_app = Flask(__name__)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-
-def get_data_from_json(file_path):
-    """
-    Extract data from json files.
-
-    :param file_path:
-    :return:
-    """
-    try:
-        with open(file_path, "r") as file_open:
-            data = json.load(file_open)
-            return data
-    except FileNotFoundError:
-        raise
+# Valueset files are loaded and indexed once and shared by all requests
+engine = ValuesetEngine(data_dir=BASE_DIR + "/valueset_server/data")
 
 
 @valueset_app.route("/", methods=["GET"])
@@ -31,23 +20,14 @@ def home():
 
 @valueset_app.route("/<valueset>/", methods=["GET"])
 def valueset_type(valueset):
-    valueset += ".json"
-    data = get_data_from_json(BASE_DIR + f"/valueset_server/data/{valueset}")
+    get_data = engine.load(valueset)
 
-    get_data = data
     if request.args:
-        # Get the lookup parameter from the url
-        request_param_key = list(dict(request.args).keys())[0]
-        request_param_val = list(dict(request.args).values())[0]
-        # Brute-force search implementation for dicts in python
-        get_data = []
-
-        for value in data:
-            try:
-                if value[request_param_key] == request_param_val[0]:
-                    get_data.append(value)
-
-            except AttributeError:
-                raise  # TODO pass through some error handler
+        # Get the lookup parameter from the url. A parameter can be repeated
+        # to look up several values at once e.g ?code=home&code=work
+        request_param_key = list(request.args.keys())[0]
+        request_param_val = request.args.getlist(request_param_key)
+
+        get_data = engine.lookup(valueset, request_param_key, request_param_val)
 
     return jsonify({"data": get_data, "count": len(get_data)})